@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Assembles an anthology (e.g. "My Personal Dua Compilation") from component
+PDFs that have already been typeset on their own, such as Hizb al-Bahr,
+instead of rebuilding the whole compilation from Markdown.
+
+Only the front matter (cover and table of contents) is typeset, with
+templates/tex/anthology.tex, and it is cached by content in build/, so
+re-assembling with unchanged titles and page counts runs no LaTeX at all.
+The components are copied in as they are. The result gets continuous page
+labels (roman numerals for the front matter, then 1, 2, 3, ... across all
+components) and a merged outline: one entry per component, with each
+component's own bookmarks nested beneath it.
+
+Components can be listed on the command line or in a YAML manifest:
+
+  title: My Personal Dua Compilation
+  subtitle: Selected litanies and supplications
+  author: Silsilah Sacra
+  output: My Personal Dua Compilation.pdf      # optional, relative to published/
+  components:
+    - pdf: published/Hizb al-Bahr.pdf
+      title: Hizb al-Bahr                      # optional, defaults to the file name
+    - published/Shaykh Full Dua.pdf
+
+How to run this script:
+  python3 scripts/anthology.py compilation.yaml
+  python3 scripts/anthology.py --title "My Compilation" "published/Hizb al-Bahr.pdf" "published/Shaykh Full Dua.pdf"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import BUILD_DIR, OUTPUT_DIR, REPO_ROOT, TEMPLATES_DIR, limits
+
+TEMPLATE_FILE = os.path.join(TEMPLATES_DIR, "tex", "anthology.tex")
+FRONT_MATTER_CACHE = os.path.join(BUILD_DIR, "anthology")
+
+
+def load_manifest(path):
+    import yaml  # You must run 'pip install PyYAML' for this to work
+
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = yaml.safe_load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    components = []
+    for item in manifest.get("components", []):
+        if isinstance(item, str):
+            item = {"pdf": item}
+        pdf = item["pdf"]
+        if not os.path.isabs(pdf):
+            # Relative to the manifest first, then to the repository.
+            candidate = os.path.join(base_dir, pdf)
+            pdf = candidate if os.path.exists(candidate) else os.path.join(REPO_ROOT, pdf)
+        components.append({"pdf": pdf, "title": item.get("title")})
+    manifest["components"] = components
+    return manifest
+
+
+def build_front_matter(metadata):
+    """
+    Returns the path of the cover + contents PDF for `metadata`, typesetting
+    it only if this exact front matter has not been built before.
+    """
+    digest = hashlib.sha256(json.dumps(metadata, sort_keys=True).encode("utf-8"))
+    with open(TEMPLATE_FILE, "rb") as f:
+        digest.update(f.read())
+    key = digest.hexdigest()[:20]
+    cached_pdf = os.path.join(FRONT_MATTER_CACHE, f"front-{key}.pdf")
+    if os.path.exists(cached_pdf):
+        print("♻️  Reusing cached cover and contents pages.")
+        return cached_pdf
+
+    import yaml
+
+    os.makedirs(FRONT_MATTER_CACHE, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="anthology-") as tmp:
+        metadata_file = os.path.join(tmp, "metadata.yaml")
+        with open(metadata_file, "w", encoding="utf-8") as f:
+            yaml.safe_dump(metadata, f, allow_unicode=True)
+        tmp_pdf = os.path.join(tmp, "front.pdf")
+        command = [
+            "pandoc",
+            "--from",
+            "markdown",
+            "--metadata-file",
+            metadata_file,
+            "--template",
+            TEMPLATE_FILE,
+            "--pdf-engine=lualatex",
+            "-o",
+            tmp_pdf,
+        ]
+        print("📝 Typesetting cover and contents pages...")
+        limits.run(command, input="", check=True, capture_output=True, text=True)
+        os.replace(tmp_pdf, cached_pdf)
+    return cached_pdf
+
+
+def assemble(title, components, output_path, subtitle=None, author=None, date=None):
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        print("❌ Error: The 'pypdf' package is required. Run 'pip install pypdf'.")
+        sys.exit(1)
+
+    # --- 1. Open the components and work out where each one starts ---
+    readers = []
+    entries = []
+    body_page = 1
+    for component in components:
+        if not os.path.isfile(component["pdf"]):
+            print(f"❌ Error: Component PDF not found: {component['pdf']}")
+            sys.exit(1)
+        reader = PdfReader(component["pdf"])
+        name = component.get("title") or os.path.splitext(os.path.basename(component["pdf"]))[0]
+        readers.append((name, reader))
+        entries.append({"title": name, "page": str(body_page)})
+        print(f"  -> {name}: {len(reader.pages)} pages, starting on page {body_page}")
+        body_page += len(reader.pages)
+
+    # --- 2. Cover and table of contents ---
+    metadata = {"title": title, "entries": entries}
+    for field, value in (("subtitle", subtitle), ("author", author), ("date", date)):
+        if value:
+            metadata[field] = value
+    front_pdf = build_front_matter(metadata)
+
+    # --- 3. Merge ---
+    writer = PdfWriter()
+    writer.append(PdfReader(front_pdf), import_outline=False)
+    front_pages = len(writer.pages)
+    # The cover is one page and the contents follow it. A front matter of a
+    # single page has both on it (and is padded with a blank page below).
+    contents_page = min(1, front_pages - 1)
+    # Start the first component on a right-hand (odd) page, as in print.
+    if front_pages % 2:
+        writer.add_blank_page()
+        front_pages += 1
+
+    writer.add_outline_item("Contents", contents_page)
+    for name, reader in readers:
+        # One outline entry per component; its own bookmarks nest beneath it.
+        writer.append(reader, outline_item=name, import_outline=True)
+
+    # --- 4. Continuous page labels: i, ii, ... then 1, 2, 3, ... ---
+    writer.set_page_label(0, front_pages - 1, style="/r", start=1)
+    writer.set_page_label(front_pages, len(writer.pages) - 1, style="/D", start=1)
+    writer.add_metadata({"/Title": title, **({"/Author": author} if author else {})})
+
+    # --- 5. Write atomically so a failed run never leaves half a PDF behind ---
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        writer.write(f)
+    os.replace(tmp_path, output_path)
+    return len(writer.pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Assemble an anthology PDF from already-built component PDFs.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="A YAML manifest, or the component PDFs in order."
+    )
+    parser.add_argument("--title", help="Anthology title (overrides the manifest).")
+    parser.add_argument("--subtitle", help="Subtitle for the cover.")
+    parser.add_argument("--author", help="Author or compiler for the cover.")
+    parser.add_argument("--date", help="Date line for the cover.")
+    parser.add_argument(
+        "-o", "--output", help="Output PDF. Default: '<title>.pdf' in published/."
+    )
+    args = parser.parse_args()
+
+    if len(args.inputs) == 1 and args.inputs[0].lower().endswith((".yaml", ".yml")):
+        manifest = load_manifest(args.inputs[0])
+    else:
+        manifest = {"components": [{"pdf": os.path.abspath(p), "title": None} for p in args.inputs]}
+
+    title = args.title or manifest.get("title")
+    if not title:
+        parser.error("an anthology needs a title (--title or 'title:' in the manifest)")
+    output = args.output or os.path.join(OUTPUT_DIR, manifest.get("output") or f"{title}.pdf")
+
+    print(f"📚 Assembling '{title}' from {len(manifest['components'])} components:")
+    try:
+        pages = assemble(
+            title,
+            manifest["components"],
+            output,
+            subtitle=args.subtitle or manifest.get("subtitle"),
+            author=args.author or manifest.get("author"),
+            date=args.date or manifest.get("date"),
+        )
+    except limits.ResourceLimitError as e:
+        limits.report(e)
+        sys.exit(limits.EXIT_CODE)
+    except subprocess.CalledProcessError as e:
+        print("❌ Error: Typesetting the cover and contents failed.")
+        print("\n--- Pandoc Error Log ---")
+        print(e.stderr)
+        sys.exit(1)
+    except FileNotFoundError:
+        print("❌ Error: 'pandoc' command not found.")
+        sys.exit(1)
+
+    print(f"\n✅ Success! {pages}-page anthology created at: {output}")
+
+
+if __name__ == "__main__":
+    main()
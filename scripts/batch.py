@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Runs a batch of scriptorium builds across several workers, starting the
+longest expected builds first so that a big Tafsir book does not begin last
+and stretch the whole batch.
+
+The batch file lists one build per line, exactly as it would be given to
+scriptorium ('#' starts a comment):
+
+  tafsir ~/Documents/Yasin_Tafsir
+  study-notes ~/Documents/Courses/Fiqh
+  publish "notes/Hizb al-Bahr.md" --template litany.tex
+
+Expected durations come from the build history (common/history.py), which
+every scriptorium build adds to. With --plan nothing is built: the schedule
+and the predicted wall time are printed for each worker count asked for.
+
+How to run this script:
+  python3 scripts/scriptorium.py batch nightly.txt --workers 4
+  python3 scripts/scriptorium.py plan nightly.txt --workers 1,2,4,8
+"""
+
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import SCRIPTS_DIR, history, limits, lint
+
+SCRIPTORIUM = os.path.join(SCRIPTS_DIR, "scriptorium.py")
+
+
+def read_batch(path):
+    """Returns the builds in the batch file as lists of scriptorium arguments."""
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            words = shlex.split(line, comments=True)
+            if words:
+                jobs.append([os.path.expanduser(w) for w in words])
+    return jobs
+
+
+def format_seconds(seconds):
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def plan(jobs, estimates, worker_counts):
+    print(f"📋 {len(jobs)} builds, longest expected first:\n")
+    order, _ = history.schedule([seconds for seconds, _ in estimates], 1)
+    for i in order:
+        seconds, basis = estimates[i]
+        print(f"  {format_seconds(seconds):>10}  {shlex.join(jobs[i])}   ({basis})")
+
+    total = sum(seconds for seconds, _ in estimates)
+    longest = max((seconds for seconds, _ in estimates), default=0)
+    print(f"\nTotal build time: {format_seconds(total)}\n")
+    print("Workers   Predicted wall time")
+    for workers in worker_counts:
+        _, makespan = history.schedule([seconds for seconds, _ in estimates], workers)
+        print(f"{workers:>7}   {format_seconds(makespan)}")
+    print(f"\nNo worker count can finish in less than the longest build: {format_seconds(longest)}")
+
+
+def run(jobs, estimates, workers):
+    from concurrent.futures import ThreadPoolExecutor
+
+    order, predicted = history.schedule([seconds for seconds, _ in estimates], workers)
+    print(f"🚀 Running {len(jobs)} builds on {workers} workers "
+          f"(predicted wall time {format_seconds(predicted)}) ...")
+
+    # One runaway build must not starve the others: unless configured, each
+    # build's tools get an equal share of the memory (common/limits.py).
+    env = dict(os.environ)
+    if "SCRIPTORIUM_MEMORY_MB" not in env and limits.memory_share(workers):
+        env["SCRIPTORIUM_MEMORY_MB"] = str(limits.memory_share(workers))
+
+    def run_job(i):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, SCRIPTORIUM] + jobs[i], capture_output=True, text=True, env=env
+        )
+        duration = time.perf_counter() - started
+        status = {0: "✅", limits.EXIT_CODE: "🛑"}.get(result.returncode, "❌")
+        print(f"  {status} {format_seconds(duration):>10}  {shlex.join(jobs[i])}", flush=True)
+        return result
+
+    started = time.perf_counter()
+    # The pool hands jobs to workers in submission order, so submitting them
+    # longest-first gives longest-processing-time-first scheduling.
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(order, pool.map(run_job, order)))
+    wall_time = time.perf_counter() - started
+
+    failed = [i for i in order if results[i].returncode != 0]
+    for i in failed:
+        print(f"\n--- Output of failed build: {shlex.join(jobs[i])} ---")
+        print(results[i].stdout[-4000:])
+        print(results[i].stderr[-4000:])
+    print(f"\nWall time: {format_seconds(wall_time)} (predicted {format_seconds(predicted)})")
+    if failed:
+        print(f"❌ {len(failed)} of {len(jobs)} builds failed.")
+        stopped = sum(1 for i in failed if results[i].returncode == limits.EXIT_CODE)
+        if stopped:
+            print(f"🛑 {stopped} of them were stopped by a resource limit (see common/limits.py).")
+        linted = sum(1 for i in failed if results[i].returncode == lint.EXIT_CODE)
+        if linted:
+            print(f"🔎 {linted} of them were stopped by the lint before building (see common/lint.py).")
+        return 1
+    print(f"✅ All {len(jobs)} builds succeeded.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a batch of builds longest-expected-first, or predict its wall time.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("batch_file", help="File with one scriptorium build per line.")
+    parser.add_argument(
+        "--workers",
+        default=str(os.cpu_count() or 1),
+        help="Concurrent builds. With --plan, a comma-separated list to compare (e.g. 1,2,4,8).",
+    )
+    parser.add_argument(
+        "--plan", action="store_true", help="Only print the schedule and predicted wall time."
+    )
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.batch_file):
+        print(f"❌ Error: Batch file not found at '{args.batch_file}'")
+        sys.exit(1)
+    try:
+        worker_counts = [int(w) for w in args.workers.split(",")]
+    except ValueError:
+        parser.error("--workers takes a number, or a comma-separated list with --plan")
+    if min(worker_counts) < 1 or (len(worker_counts) > 1 and not args.plan):
+        parser.error("--workers must be positive, and a list is only allowed with --plan")
+
+    jobs = read_batch(args.batch_file)
+    if not jobs:
+        print("⚠️ Warning: The batch file lists no builds.")
+        return 0
+
+    with history.connect() as db:
+        estimates = [history.expected_duration(db, job[0], job[1:]) for job in jobs]
+
+    if args.plan:
+        plan(jobs, estimates, worker_counts)
+        return 0
+    return run(jobs, estimates, worker_counts[0])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
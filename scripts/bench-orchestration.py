@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks and stress-tests the Python orchestration of the builders against
+the fake toolchain in scripts/fake-toolchain/, so no pandoc or LaTeX is needed.
+
+Every job gets its own small synthetic source (a note or a notes folder) and
+runs the chosen builder through the `scriptorium` entry point, exactly as a
+user would. The fake tools log every invocation to the job's own log (the
+engine runs in a scratch workspace, so its arguments do not say which job
+it belongs to), which lets the report split
+each job's wall time into injected tool time and orchestration overhead
+(interpreter start-up, imports, file preparation, fallbacks and retries).
+
+How to run this script:
+  python3 scripts/bench-orchestration.py --builder publish --jobs 200 --workers 16
+  python3 scripts/bench-orchestration.py --builder study-notes --jobs 2000 --workers 64 \\
+      --latency 0.05-0.2 --missing-fonts Amiri --fail-rate 0.01
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTORIUM = os.path.join(SCRIPTS_DIR, "scriptorium.py")
+FAKE_TOOLCHAIN_DIR = os.path.join(SCRIPTS_DIR, "fake-toolchain")
+
+SAMPLE_PARAGRAPH = (
+    "The Prophet ﷺ said: إِنَّمَا الأَعْمَالُ بِالنِّيَّاتِ (actions are by intentions), "
+    "as related by al-Bukhari (d. 256/870) and Muslim.\n\n"
+)
+
+OVERVIEW_FRONTMATTER = """---
+course_name: Benchmark Course
+instructor: Shaykh Example
+institute: Example Institute
+matn: Nur al-Idah
+author: al-Shurunbulali
+created: 2024-01-01
+---
+
+"""
+
+
+def make_note(path, paragraphs):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# {os.path.splitext(os.path.basename(path))[0]}\n\n")
+        f.write(SAMPLE_PARAGRAPH * paragraphs)
+
+
+def make_folder(path, notes, paragraphs, with_overview):
+    os.makedirs(path, exist_ok=True)
+    if with_overview:
+        with open(os.path.join(path, "00 Overview.md"), "w", encoding="utf-8") as f:
+            f.write(OVERVIEW_FRONTMATTER + SAMPLE_PARAGRAPH)
+    for i in range(1, notes + 1):
+        make_note(os.path.join(path, f"{i:02d} Lesson {i}.md"), paragraphs)
+
+
+# builder -> function(job_dir, args) returning the scriptorium arguments.
+def _single_note(command):
+    def prepare(job_dir, args):
+        note = os.path.join(job_dir, "note.md")
+        make_note(note, args.paragraphs)
+        extra = {
+            "html-pdf": ["-o", os.path.join(job_dir, "note.pdf")],
+            "indesign-xml": [os.path.join(job_dir, "note.xml")],
+        }.get(command, [])
+        return [command, note] + extra
+
+    return prepare
+
+
+def _notes_folder(command, with_overview):
+    def prepare(job_dir, args):
+        folder = os.path.join(job_dir, "notes")
+        make_folder(folder, args.notes, args.paragraphs, with_overview)
+        return [command, folder]
+
+    return prepare
+
+
+BUILDERS = {
+    "build": _single_note("build"),
+    "publish": _single_note("publish"),
+    "html-pdf": _single_note("html-pdf"),
+    "indesign-xml": _single_note("indesign-xml"),
+    "tafsir": _notes_folder("tafsir", with_overview=False),
+    "study-notes": _notes_folder("study-notes", with_overview=True),
+}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the builders' orchestration against the fake toolchain.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("--builder", choices=sorted(BUILDERS), default="publish")
+    parser.add_argument("--jobs", type=int, default=100, help="Number of build jobs. Default: 100.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Concurrent jobs.")
+    parser.add_argument("--notes", type=int, default=10, help="Notes per folder job. Default: 10.")
+    parser.add_argument("--paragraphs", type=int, default=20, help="Paragraphs per note. Default: 20.")
+    parser.add_argument("--latency", default="0", help="Injected tool latency, e.g. '0.1' or '0.05-0.2'.")
+    parser.add_argument("--fail-rate", default="0", help="Probability that a tool run fails.")
+    parser.add_argument("--missing-fonts", default="", help="Fonts that fail with font-not-found.")
+    parser.add_argument("--output-size", default="4096", help="Bytes per fake PDF, or 'input'.")
+    parser.add_argument("--run-filters", action="store_true", help="Have fake pandoc run --filter scripts.")
+    parser.add_argument("--seed", default="0", help="Seed for latency and failure randomness.")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark workspace.")
+    args = parser.parse_args()
+
+    workspace = tempfile.mkdtemp(prefix="bench-orchestration-")
+    env = dict(os.environ)
+    env.update(
+        {
+            "PATH": FAKE_TOOLCHAIN_DIR + os.pathsep + env.get("PATH", ""),
+            "FAKE_TOOLCHAIN_LATENCY": args.latency,
+            "FAKE_TOOLCHAIN_FAIL_RATE": args.fail_rate,
+            "FAKE_TOOLCHAIN_MISSING_FONTS": args.missing_fonts,
+            "FAKE_TOOLCHAIN_OUTPUT_SIZE": args.output_size,
+            "FAKE_TOOLCHAIN_RUN_FILTERS": "1" if args.run_filters else "0",
+            "FAKE_TOOLCHAIN_SEED": args.seed,
+            # Keep benchmark output and caches out of the repository.
+            "SCRIPTORIUM_OUTPUT_DIR": os.path.join(workspace, "published"),
+            "SCRIPTORIUM_BUILD_DIR": os.path.join(workspace, "build"),
+        }
+    )
+
+    print(f"🔧 Preparing {args.jobs} '{args.builder}' jobs in {workspace} ...")
+    jobs = []
+    for i in range(args.jobs):
+        job_dir = os.path.join(workspace, "jobs", f"job-{i:05d}")
+        os.makedirs(job_dir)
+        jobs.append((job_dir, BUILDERS[args.builder](job_dir, args)))
+
+    def run_job(job):
+        job_dir, scriptorium_args = job
+        job_env = dict(env, FAKE_TOOLCHAIN_LOG=os.path.join(job_dir, "toolchain.jsonl"))
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, SCRIPTORIUM] + scriptorium_args,
+            env=job_env,
+            cwd=job_dir,
+            capture_output=True,
+            text=True,
+        )
+        # Some builders report failure on stdout with a zero exit code.
+        failed = result.returncode != 0 or "ERROR" in result.stdout or "❌" in result.stdout
+        return job_dir, time.perf_counter() - started, failed
+
+    print(f"🚀 Running with {args.workers} workers ...")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(run_job, jobs))
+    wall_time = time.perf_counter() - started
+
+    # --- Sum each job's tool time from its own log ---
+    tool_time = {job_dir: 0.0 for job_dir, _ in jobs}
+    tool_runs = {}
+    for job_dir in tool_time:
+        log_path = os.path.join(job_dir, "toolchain.jsonl")
+        if not os.path.exists(log_path):
+            continue
+        with open(log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                tool_runs[entry["tool"]] = tool_runs.get(entry["tool"], 0) + 1
+                tool_time[job_dir] += entry["duration"]
+
+    durations = [duration for _, duration, _ in results]
+    overheads = [duration - tool_time[job_dir] for job_dir, duration, _ in results]
+    failures = sum(1 for _, _, failed in results if failed)
+
+    print("\n--- Orchestration Benchmark ---")
+    print(f"Builder:            {args.builder}")
+    print(f"Jobs / workers:     {args.jobs} / {args.workers}")
+    print(f"Failed jobs:        {failures}")
+    print(f"Wall time:          {wall_time:.2f} s")
+    print(f"Throughput:         {args.jobs / wall_time:.1f} jobs/s")
+    print(
+        f"Job time:           p50 {percentile(durations, 0.5) * 1000:.0f} ms, "
+        f"p95 {percentile(durations, 0.95) * 1000:.0f} ms, max {max(durations) * 1000:.0f} ms"
+    )
+    print(
+        f"Overhead per job:   mean {statistics.mean(overheads) * 1000:.0f} ms, "
+        f"p95 {percentile(overheads, 0.95) * 1000:.0f} ms (job time minus tool time)"
+    )
+    print(f"Tool invocations:   {', '.join(f'{t} {n}' for t, n in sorted(tool_runs.items())) or 'none'}")
+
+    if args.keep:
+        print(f"\nWorkspace kept at: {workspace}")
+    else:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return 1 if failures and args.fail_rate == "0" and not args.missing_fonts else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks Arabic shaping under each luaotfload renderer (node mode and
+HarfBuzz) with each Arabic font, to pick the fastest setup that still shapes
+correctly for each kind of publication (see common/renderer.py).
+
+Every combination typesets the same Arabic-heavy corpus in one LuaLaTeX
+pass. The corpus is the Arabic text of a notes folder, or a built-in sample
+of Quranic and hadith text, repeated up to --paragraphs. Each combination
+runs once untimed, so luaotfload's font cache is warm, and then --repeat
+times. The report gives the median time, the page count and the characters
+the font lacks ("Missing character" in the log). To check correctness, it
+also rasterizes each node-mode PDF and counts the pages that look different
+from the HarfBuzz PDF of the same font (common/visual.py, needs pdftoppm).
+The PDFs are kept in build/shaping/ for a closer look.
+
+How to run this script:
+  python3 scripts/scriptorium.py bench-shaping
+  python3 scripts/scriptorium.py bench-shaping ~/Documents/Yasin_Tafsir --repeat 5
+  python3 scripts/scriptorium.py bench-shaping --fonts "Scheherazade New,Amiri" --renderers node,harfbuzz
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import BUILD_DIR, latex, limits, renderer
+from common.arabic import script_runs
+from common.workspace import Workspace
+
+# --- CONFIGURATION ---
+# The Arabic fonts the publications use.
+FONTS = ["KFGQPC HAFS Uthmanic Script", "Scheherazade New", "Amiri", "DecoType Thuluth"]
+
+# Where the PDFs and results.json go.
+RESULTS_DIR = os.path.join(BUILD_DIR, "shaping")
+
+# Page hash bits that may differ before two renderings count as different.
+THRESHOLD = 2
+
+# Used when no notes folder is given: al-Fatiha and a hadith, fully vowelled.
+SAMPLE_PARAGRAPHS = [
+    "بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ ٱلْحَمْدُ لِلَّهِ رَبِّ ٱلْعَٰلَمِينَ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ "
+    "مَٰلِكِ يَوْمِ ٱلدِّينِ إِيَّاكَ نَعْبُدُ وَإِيَّاكَ نَسْتَعِينُ ٱهْدِنَا ٱلصِّرَٰطَ ٱلْمُسْتَقِيمَ "
+    "صِرَٰطَ ٱلَّذِينَ أَنْعَمْتَ عَلَيْهِمْ غَيْرِ ٱلْمَغْضُوبِ عَلَيْهِمْ وَلَا ٱلضَّآلِّينَ",
+    "إِنَّمَا الأَعْمَالُ بِالنِّيَّاتِ، وَإِنَّمَا لِكُلِّ امْرِئٍ مَا نَوَى، فَمَنْ كَانَتْ هِجْرَتُهُ "
+    "إِلَى اللَّهِ وَرَسُولِهِ فَهِجْرَتُهُ إِلَى اللَّهِ وَرَسُولِهِ",
+]
+
+DOCUMENT = r"""\documentclass[12pt]{article}
+\usepackage{fontspec}
+\usepackage[margin=1in]{geometry}
+\newfontfamily\benchfont[Script=Arabic, Renderer=RENDERER]{FONT}
+\tracinglostchars=1
+\begin{document}
+\pardir TRT \textdir TRT
+\benchfont
+BODY
+\end{document}
+"""
+# --- END CONFIGURATION ---
+
+MISSING_CHAR_REGEX = re.compile(r"^Missing character: There is no (\S+)", re.MULTILINE)
+PAGES_REGEX = re.compile(r"Output written on .*?\((\d+) pages?")
+
+
+def load_corpus(folder, paragraphs):
+    """The Arabic runs of the notes in `folder` (or the sample), as `paragraphs` paragraphs."""
+    found = []
+    for path in (sorted(glob.glob(os.path.join(folder, "*.md"))) if folder else []):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                text = " ".join(run.strip() for is_arabic, run in script_runs(line) if is_arabic)
+                if len(text) >= 20:
+                    found.append(text)
+    found = found or SAMPLE_PARAGRAPHS
+    return [found[i % len(found)] for i in range(paragraphs)]
+
+
+def typeset(font, mode, body, output_pdf):
+    """One pass over the corpus. Returns (seconds, pages or None, missing characters)."""
+    tex = (
+        DOCUMENT.replace("RENDERER", renderer.RENDERERS[mode])
+        .replace("FONT", font)
+        .replace("BODY", body)
+    )
+    with Workspace(f"shaping-{mode}") as ws:
+        started = time.perf_counter()
+        latex.compile_pdf(tex, output_pdf, quiet=True, max_runs=1, workspace=ws, reuse_toc=False)
+        seconds = time.perf_counter() - started
+        log = ""
+        if os.path.exists(ws.file("input.log")):
+            with open(ws.file("input.log"), "r", encoding="utf-8", errors="replace") as f:
+                log = f.read()
+    pages = PAGES_REGEX.search(log)
+    return seconds, int(pages.group(1)) if pages else None, sorted(set(MISSING_CHAR_REGEX.findall(log)))
+
+
+def differing_pages(pdf_a, pdf_b):
+    """Pages that look different in the two PDFs, or None if they cannot be compared."""
+    if shutil.which("pdftoppm") is None:
+        return None
+    from common import visual
+
+    try:
+        count_a, count_b = visual.page_count(pdf_a), visual.page_count(pdf_b)
+    except ImportError:
+        return None
+    if count_a != count_b:
+        return max(count_a, count_b)  # Reflowed: every page counts as different.
+    hashes_a = visual.hash_pages(pdf_a, 1, count_a)
+    hashes_b = visual.hash_pages(pdf_b, 1, count_b)
+    return sum(1 for a, b in zip(hashes_a, hashes_b) if visual.distance(a, b) > THRESHOLD)
+
+
+def output_name(font, mode):
+    return os.path.join(RESULTS_DIR, f"{re.sub(r'[^A-Za-z0-9]+', '-', font).strip('-')}-{mode}.pdf")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time Arabic shaping under each luaotfload renderer and font.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument(
+        "corpus", nargs="?", help="A notes folder whose Arabic text is typeset.\nDefault: a built-in sample."
+    )
+    parser.add_argument(
+        "--fonts", default=",".join(FONTS), help=f"Comma-separated font names.\nDefault: {', '.join(FONTS)}."
+    )
+    parser.add_argument(
+        "--renderers",
+        default=",".join(sorted(renderer.RENDERERS)),
+        help="Comma-separated renderers (node, harfbuzz). Default: both.",
+    )
+    parser.add_argument("--paragraphs", type=int, default=400, help="Paragraphs in the corpus. Default: 400.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per combination. Default: 3.")
+    args = parser.parse_args()
+
+    if args.corpus and not os.path.isdir(args.corpus):
+        print(f"❌ Error: Notes folder not found at '{args.corpus}'")
+        sys.exit(1)
+    font_names = [f.strip() for f in args.fonts.split(",") if f.strip()]
+    modes = [m.strip() for m in args.renderers.split(",") if m.strip()]
+    unknown = [m for m in modes if m not in renderer.RENDERERS]
+    if unknown:
+        parser.error(f"unknown renderer(s): {', '.join(unknown)}")
+
+    corpus = load_corpus(args.corpus, args.paragraphs)
+    body = "\n\n".join(corpus)
+    print(f"🔬 Typesetting {len(corpus)} paragraphs ({len(body):,} characters) of Arabic "
+          f"with {len(font_names)} fonts x {len(modes)} renderers, {args.repeat} timed runs each ...")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+
+    results = []
+    for font in font_names:
+        for mode in modes:
+            output_pdf = output_name(font, mode)
+            entry = {"font": font, "renderer": mode, "pdf": output_pdf}
+            try:
+                typeset(font, mode, body, output_pdf)  # Warms luaotfload's cache.
+                runs = [typeset(font, mode, body, output_pdf) for _ in range(max(1, args.repeat))]
+            except (latex.EngineError, limits.ResourceLimitError) as e:
+                entry["error"] = str(e)
+                print(f"  ❌ {font} / {mode}: {e}")
+                results.append(entry)
+                continue
+            entry["seconds"] = statistics.median(seconds for seconds, _, _ in runs)
+            entry["pages"] = runs[-1][1]
+            entry["missing"] = runs[-1][2]
+            results.append(entry)
+            print(f"  ✅ {font} / {mode}: {entry['seconds']:.2f}s", flush=True)
+
+    # Node mode is checked against HarfBuzz, the reference shaper.
+    for entry in results:
+        if entry["renderer"] == "harfbuzz" or "error" in entry:
+            continue
+        reference = next(
+            (r for r in results if r["font"] == entry["font"] and r["renderer"] == "harfbuzz" and "error" not in r),
+            None,
+        )
+        if reference:
+            entry["pages_differing_from_harfbuzz"] = differing_pages(entry["pdf"], reference["pdf"])
+
+    print(f"\n{'Font':<30} {'Renderer':<9} {'Median':>8} {'Pages':>6} {'Missing':>8} {'≠ HarfBuzz':>11}")
+    for entry in results:
+        if "error" in entry:
+            print(f"{entry['font'][:30]:<30} {entry['renderer']:<9} {'failed':>8}")
+            continue
+        differing = entry.get("pages_differing_from_harfbuzz")
+        print(
+            f"{entry['font'][:30]:<30} {entry['renderer']:<9} {entry['seconds']:>7.2f}s "
+            f"{entry['pages'] if entry['pages'] is not None else '?':>6} {len(entry['missing']):>8} "
+            f"{'-' if differing is None else differing:>11}"
+        )
+
+    print("\nFastest setup per font (without missing characters):")
+    for font in font_names:
+        candidates = [
+            r for r in results if r["font"] == font and "error" not in r and not r["missing"]
+        ]
+        if not candidates:
+            print(f"  ⚠️  {font}: no renderer typeset the corpus without missing characters.")
+            continue
+        best = min(candidates, key=lambda r: r["seconds"])
+        line = f"  {font}: Renderer={renderer.RENDERERS[best['renderer']]} ({best['seconds']:.2f}s)"
+        if best.get("pages_differing_from_harfbuzz"):
+            line += (
+                f", but {best['pages_differing_from_harfbuzz']} page(s) look different from HarfBuzz;"
+                f" compare the PDFs in {RESULTS_DIR} before choosing it"
+            )
+        print(line)
+
+    results_path = os.path.join(RESULTS_DIR, "results.json")
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"corpus": args.corpus, "paragraphs": len(corpus), "repeat": args.repeat, "results": results},
+            f,
+            ensure_ascii=False,
+            indent=1,
+        )
+    print(f"\nResults saved to: {results_path}")
+    return 1 if any("error" in r for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,13 @@
 # combined-md.py
 
+import argparse
 import os
+import sys
 import glob
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import obsidian, workspace
+
 # --- CONFIGURATION ---
 # IMPORTANT: Update this path to the folder where your Markdown notes are stored.
 NOTES_FOLDER_PATH = "/Users/viz1er/Codebase/obsidian-vault/05 Projects/Silsila Sacra - Publishing Services/Manuscripts for Publication/Arabic to English Translated Texts/40 Hadith of Imam An-Nawawi"
@@ -12,17 +17,17 @@ COMBINED_FILENAME = "combined-output.md"
 # --- END CONFIGURATION ---
 
 
-def combine_markdown_files():
+def combine_markdown_files(notes_folder_path=NOTES_FOLDER_PATH):
     """
     Finds all Markdown files in the specified folder, combines them into a
     single Markdown file, and uses each source filename as a Level 1 heading.
     It automatically strips YAML frontmatter from each file.
     """
     # Construct the full path for the output file
-    combined_md_filepath = os.path.join(NOTES_FOLDER_PATH, COMBINED_FILENAME)
+    combined_md_filepath = os.path.join(notes_folder_path, COMBINED_FILENAME)
 
     # Find all Markdown files in the directory
-    all_md_files = sorted(glob.glob(os.path.join(NOTES_FOLDER_PATH, "*.md")))
+    all_md_files = sorted(glob.glob(os.path.join(notes_folder_path, "*.md")))
 
     # Filter out the output file itself to avoid it being included in subsequent runs
     files_to_combine = [
@@ -35,40 +40,50 @@ def combine_markdown_files():
 
     print(f"Found {len(files_to_combine)} lesson files to combine.")
 
+    # Resolves [[wikilinks]], ![[embeds]] and callouts against the whole vault.
+    resolver = obsidian.resolver_for(notes_folder_path)
+
     try:
-        # Open the output file in write mode
-        with open(combined_md_filepath, "w", encoding="utf-8") as outfile:
-            # Loop through each file to be combined
-            for filepath in files_to_combine:
-                # Get the filename without the extension to use as the title
-                filename = os.path.basename(filepath)
-                title = os.path.splitext(filename)[0]
-
-                print(f"  -> Adding: {filename}")
-
-                # Write the title as a Level 1 Markdown heading
-                outfile.write(f"# {title}\n\n")
-
-                # Open the lesson file and read its content
-                with open(filepath, "r", encoding="utf-8") as infile:
-                    content = infile.read()
-                    main_content = content
-
-                    # Check for and strip YAML frontmatter
-                    if content.startswith("---"):
-                        # Split content by '---' at most twice
-                        parts = content.split("---", 2)
-                        # A valid YAML block will result in 3 parts
-                        if len(parts) >= 3:
-                            # The actual content is the last part.
-                            # .lstrip() removes leading blank lines.
-                            main_content = parts[2].lstrip()
-
-                    # Write the processed content to the output file
-                    outfile.write(main_content)
-
-                # Add two newlines for separation between files
-                outfile.write("\n\n")
+        # Written in a private scratch workspace and moved into the folder
+        # when complete, so Obsidian (or a build) never reads half a file.
+        job = os.path.basename(os.path.normpath(notes_folder_path))
+        with workspace.Workspace(job) as ws:
+            with open(ws.file(COMBINED_FILENAME), "w", encoding="utf-8") as outfile:
+                # Loop through each file to be combined
+                for filepath in files_to_combine:
+                    # Get the filename without the extension to use as the title
+                    filename = os.path.basename(filepath)
+                    title = os.path.splitext(filename)[0]
+
+                    print(f"  -> Adding: {filename}")
+
+                    # Write the title as a Level 1 Markdown heading
+                    outfile.write(f"# {title}\n\n")
+
+                    # Open the lesson file and read its content
+                    with open(filepath, "r", encoding="utf-8") as infile:
+                        content = infile.read()
+                        main_content = content
+
+                        # Check for and strip YAML frontmatter
+                        if content.startswith("---"):
+                            # Split content by '---' at most twice
+                            parts = content.split("---", 2)
+                            # A valid YAML block will result in 3 parts
+                            if len(parts) >= 3:
+                                # The actual content is the last part.
+                                # .lstrip() removes leading blank lines.
+                                main_content = parts[2].lstrip()
+
+                        # Write the processed content to the output file
+                        outfile.write(resolver.resolve(main_content))
+
+                    # Add two newlines for separation between files
+                    outfile.write("\n\n")
+            ws.publish(COMBINED_FILENAME, combined_md_filepath)
+
+        for warning in resolver.warnings:
+            print(f"⚠️  WARNING: {warning}")
 
         print(f"\n✅ Successfully combined all notes into: {combined_md_filepath}")
 
@@ -78,4 +93,14 @@ def combine_markdown_files():
 
 # This allows the script to be run from the command line
 if __name__ == "__main__":
-    combine_markdown_files()
+    parser = argparse.ArgumentParser(
+        description="Combine all Markdown notes in a folder into a single Markdown file."
+    )
+    parser.add_argument(
+        "notes_folder",
+        nargs="?",
+        default=NOTES_FOLDER_PATH,
+        help="The folder containing the notes. Default: the configured NOTES_FOLDER_PATH.",
+    )
+    args = parser.parse_args()
+    combine_markdown_files(args.notes_folder)
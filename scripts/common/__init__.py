@@ -0,0 +1,42 @@
+"""
+Shared helpers for the scriptorium scripts.
+
+The individual scripts under `scripts/` stay runnable on their own; anything
+they have in common (repository paths, toolchain probing, ...) lives here so
+that the `scriptorium` entry point and the standalone scripts agree.
+"""
+
+import hashlib
+import os
+
+# The repository root, derived from this file so that nothing depends on where
+# the scripts are invoked from.
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCRIPTS_DIR = os.path.join(REPO_ROOT, "scripts")
+TEMPLATES_DIR = os.path.join(REPO_ROOT, "templates")
+SHARED_DIR = os.path.join(REPO_ROOT, "shared")
+FONTS_DIR = os.path.join(REPO_ROOT, "fonts")
+
+# Both can be redirected, e.g. so that benchmarks never touch published/.
+OUTPUT_DIR = os.environ.get("SCRIPTORIUM_OUTPUT_DIR", os.path.join(REPO_ROOT, "published"))
+
+# Temporary build files and caches (ignored by git).
+BUILD_DIR = os.environ.get("SCRIPTORIUM_BUILD_DIR", os.path.join(REPO_ROOT, "build"))
+
+
+def write_header_file(prefix, content):
+    """
+    Writes a LaTeX preamble snippet to build/ for pandoc's --include-in-header
+    and returns its path. Files are named by content, so concurrent builds
+    never overwrite each other's snippets.
+    """
+    digest = hashlib.sha1(content.encode("utf-8")).hexdigest()[:16]
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    path = os.path.join(BUILD_DIR, f"{prefix}-{digest}.tex")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content + "\n")
+        os.replace(tmp_path, path)
+    return path
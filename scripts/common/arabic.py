@@ -0,0 +1,116 @@
+"""
+Arabic script detection, shared by the Arabic filter and the preflight checks
+so that both agree on what counts as Arabic text.
+"""
+
+import functools
+import re
+import unicodedata
+
+# The Arabic block (U+0600-U+06FF), including the Quranic annotation marks.
+ARABIC_RANGE = "\u0600-\u06FF"
+
+ARABIC_CHAR_REGEX = re.compile(f"[{ARABIC_RANGE}]")
+
+# Runs of Arabic text, keeping the spaces between Arabic words inside the run.
+ARABIC_RUN_REGEX = re.compile(f"([{ARABIC_RANGE}\\s]+)")
+
+
+def script_runs(text):
+    """Yields (is_arabic, run) pairs covering `text` in order."""
+    for part in ARABIC_RUN_REGEX.split(text):
+        if part:
+            yield bool(ARABIC_CHAR_REGEX.search(part)), part
+
+
+# --- Normalization ---
+# Text pasted from websites and PDFs mixes presentation forms (the shaped
+# glyphs of old encodings, outside the Arabic block, so the regexes above
+# miss them), decorative tatweel, stray joiners and marks in any order. The
+# font's shaper copes with most of it, but slowly and sometimes through font
+# fallback. normalize_run() rewrites each Arabic run to plain NFC text.
+
+# Everything that can be part of an Arabic run: the Arabic, Supplement and
+# Extended-A blocks, and both presentation form blocks.
+ARABIC_ANY = "\u0600-\u06FF\u0750-\u077F\u08A0-\u08FF\uFB50-\uFDFF\uFE70-\uFEFC"
+JOINERS = "\u200C\u200D"  # ZWNJ, ZWJ
+
+# An Arabic run with the joiners on either side of it. Joiners elsewhere (as
+# in emoji sequences) are never touched.
+NORMALIZE_RUN_REGEX = re.compile(f"[{JOINERS}]*[{ARABIC_ANY}][{ARABIC_ANY}{JOINERS}]*")
+
+# Combining marks that may sit on a tatweel (e.g. the dagger alif in
+# Uthmani text, "ـٰ"), which is then a mark carrier and is kept.
+ARABIC_MARKS = "\u064B-\u065F\u0670\u06D6-\u06ED\u08D3-\u08FF"
+TATWEEL_REGEX = re.compile(f"\u0640+(?![{ARABIC_MARKS}])")
+REPEATED_JOINERS_REGEX = re.compile(f"([{JOINERS}])[{JOINERS}]+")
+
+
+def _presentation_form_table():
+    """
+    Maps each presentation form to its base letters (its NFKC decomposition).
+    Left alone: the word ligatures (U+FDF0-U+FDFF, e.g. ﷺ and ﷲ), which
+    are written on purpose, and the isolated forms of marks, which
+    decompose to a space plus the mark.
+    """
+    table = {}
+    for code in list(range(0xFB50, 0xFDF0)) + list(range(0xFE70, 0xFEFD)):
+        base = unicodedata.normalize("NFKC", chr(code))
+        if base != chr(code) and all("\u0600" <= c <= "\u06FF" for c in base):
+            table[code] = base
+    return table
+
+
+PRESENTATION_FORMS = _presentation_form_table()
+
+# The kinds of change normalize_run() counts, in report order.
+CHANGE_KINDS = (
+    "presentation forms",
+    "tatweel",
+    "stray joiners",
+    "runs recomposed (NFC)",
+)
+
+
+@functools.lru_cache(maxsize=65536)
+def normalize_run(run):
+    """
+    Normalizes one Arabic run. Returns (text, changes), where changes counts
+    each kind in CHANGE_KINDS. Memoized: most runs are words that repeat.
+    """
+    text = run.translate(PRESENTATION_FORMS)
+    forms = sum(1 for c in run if ord(c) in PRESENTATION_FORMS)
+
+    text, tatweels = TATWEEL_REGEX.subn("", text)
+
+    # Joiners at the edges of a run join nothing; doubled ones are one too many.
+    stripped = text.strip(JOINERS)
+    joiners = len(text) - len(stripped)
+    text = REPEATED_JOINERS_REGEX.sub(r"\1", stripped)
+    joiners += len(stripped) - len(text)
+
+    # Canonical composition and mark order (e.g. shadda after the vowel).
+    composed = unicodedata.normalize("NFC", text)
+    recomposed = int(composed != text)
+    return composed, (forms, tatweels, joiners, recomposed)
+
+
+class Normalizer:
+    """Normalizes Arabic text and keeps count of what it changed."""
+
+    def __init__(self):
+        self.counts = [0] * len(CHANGE_KINDS)
+
+    def _replace(self, match):
+        text, changes = normalize_run(match.group())
+        for i, n in enumerate(changes):
+            self.counts[i] += n
+        return text
+
+    def normalize(self, text):
+        return NORMALIZE_RUN_REGEX.sub(self._replace, text)
+
+    def summary(self):
+        """One line describing the changes made so far, or "" if there were none."""
+        parts = [f"{kind}: {n}" for kind, n in zip(CHANGE_KINDS, self.counts) if n]
+        return f"Normalized Arabic text ({', '.join(parts)})" if parts else ""
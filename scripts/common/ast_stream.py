@@ -0,0 +1,188 @@
+"""
+Streaming mode for the panflute filters, for very large documents.
+
+pf.run_filter() loads pandoc's whole JSON AST into a tree of panflute objects
+before the filter runs. For a combined tafsir volume that tree takes hundreds
+of MB and most of the filter's run time. Our filters only ever look at one
+top-level block at a time (plus the metadata), so run_filter() below parses
+the AST incrementally instead: the metadata first, then one block at a time,
+each filtered and written out before the next is read. Peak memory is that
+of the largest single block, whatever the size of the book.
+
+The result is the same as pf.run_filter()'s, with two limits: the filter
+cannot look at other blocks (doc.content only ever holds the current one),
+and the metadata is written before the blocks, so finalize() must not
+change it.
+
+Turn it on with SCRIPTORIUM_STREAM_FILTERS=1; the filter scripts, their
+warm-server clients and common.pandoc_server all honour it.
+"""
+
+import io
+import json
+import os
+import sys
+
+# Characters read from the input at a time.
+CHUNK_SIZE = 1 << 16
+
+WHITESPACE = " \t\r\n"
+
+
+def enabled():
+    return os.environ.get("SCRIPTORIUM_STREAM_FILTERS", "").lower() in ("1", "true", "yes")
+
+
+class _Reader:
+    """Pulls JSON values one at a time out of a text stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size):
+        # Drop what has been consumed, so the buffer never holds more than
+        # the value being decoded and one read ahead.
+        if self.pos:
+            self.buffer = self.buffer[self.pos :]
+            self.pos = 0
+        data = self.stream.read(size)
+        if not data:
+            self.eof = True
+        self.buffer += data
+        return bool(data)
+
+    def peek(self):
+        """The next non-whitespace character, not consumed."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill(CHUNK_SIZE):
+                raise ValueError("Unexpected end of the JSON AST")
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Malformed JSON AST: expected '{char}', found '{found}'")
+        self.pos += 1
+
+    def value(self, decoder):
+        """Decodes the next value, reading more input until it is complete."""
+        self.peek()
+        size = CHUNK_SIZE
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                # Not all of it is here yet. Read ever larger pieces, so a
+                # huge block is decoded a few times, not once per chunk.
+                self._fill(size)
+                size *= 2
+                continue
+            self.pos = end
+            return value
+
+
+def _dumps(value):
+    # As pf.dump() writes it: compact, and not ASCII-escaped, like pandoc.
+    return json.dumps(
+        value,
+        default=lambda elem: elem.to_json(),
+        check_circular=False,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+
+
+def run_filter(
+    action,
+    prepare=None,
+    finalize=None,
+    input_stream=None,
+    output_stream=None,
+    output_format=None,
+    metadata=None,
+):
+    """
+    Streams a JSON AST from `input_stream` to `output_stream` (text streams;
+    default stdin and stdout), applying `action` to every element, as
+    pf.run_filter() would. `metadata` (string values) is set on the document
+    first, as `--metadata` would.
+    """
+    import panflute as pf
+
+    own_streams = []
+    if input_stream is None:
+        input_stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+        own_streams.append(input_stream)
+    if output_stream is None:
+        output_stream = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8")
+        own_streams.append(output_stream)
+    if output_format is None:
+        output_format = sys.argv[1] if len(sys.argv) > 1 else "html"
+
+    plain = json.JSONDecoder()
+    elements = json.JSONDecoder(object_hook=pf.elements.from_json)
+    reader = _Reader(input_stream)
+
+    # {"pandoc-api-version": [...], "meta": {...}, "blocks": [...]}
+    reader.expect("{")
+    header = {}
+    while True:
+        key = reader.value(plain)
+        reader.expect(":")
+        if key == "blocks":
+            break
+        header[key] = reader.value(elements if key == "meta" else plain)
+        reader.expect(",")
+    if "pandoc-api-version" not in header or "meta" not in header:
+        raise ValueError("Malformed JSON AST: 'blocks' comes before the metadata")
+
+    doc = pf.Doc(api_version=header["pandoc-api-version"], metadata=header["meta"], format=output_format)
+    for key, value in (metadata or {}).items():
+        doc.metadata[key] = pf.MetaString(value)
+    if prepare is not None:
+        prepare(doc)
+    # No blocks yet: this walks the metadata only.
+    doc = doc.walk(action, doc)
+
+    head = doc.to_json()
+    output_stream.write(
+        f'{{"pandoc-api-version":{_dumps(head["pandoc-api-version"])},'
+        f'"meta":{_dumps(head["meta"])},"blocks":['
+    )
+
+    reader.expect("[")
+    first = True
+    if reader.peek() == "]":
+        reader.pos += 1
+    else:
+        while True:
+            doc.content = [reader.value(elements)]
+            # Through the container, so the action can replace or drop the block.
+            doc.content = doc.content.walk(action, doc)
+            for block in doc.content:
+                output_stream.write(("" if first else ",") + _dumps(block))
+                first = False
+            doc.content = []
+            separator = reader.peek()
+            reader.pos += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise ValueError(f"Malformed JSON AST: expected ',' or ']', found '{separator}'")
+    reader.expect("}")
+    output_stream.write("]}")
+
+    if finalize is not None:
+        finalize(doc)
+    output_stream.flush()
+    for stream in own_streams:
+        # Leave sys.stdin and sys.stdout open for the caller.
+        stream.detach()
@@ -0,0 +1,116 @@
+"""
+Draft previews for proofreading.
+
+A draft keeps everything that decides line and page breaks (class, fonts,
+sizes, margins, spacing) and drops the rest:
+
+  * only the selected chapters are included;
+  * the document class gets the `draft` option, so images are set as
+    frames of their real size (and not read or embedded), and overfull
+    lines are marked with a black rule;
+  * there is no table of contents, and LuaLaTeX runs once instead of up
+    to three times;
+  * the PDF streams are not compressed;
+  * with a page range, pages before it are typeset but not written out,
+    and the run stops right after its last page.
+
+The fonts stay as they are, since substituting them would move every break.
+luaotfload already caches them between runs.
+"""
+
+import argparse
+
+
+def parse_selection(spec):
+    """Parses "3", "2-5" or "1,4-6" into a sorted list of 1-based numbers."""
+    numbers = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        low, _, high = part.partition("-")
+        try:
+            low = int(low)
+            high = int(high) if high else low
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"'{spec}' is not a list of numbers or ranges")
+        if low < 1 or high < low:
+            raise argparse.ArgumentTypeError(f"'{part}' is not a valid range")
+        numbers.update(range(low, high + 1))
+    if not numbers:
+        raise argparse.ArgumentTypeError("the selection is empty")
+    return sorted(numbers)
+
+
+def page_range(spec):
+    """Parses "40-60" (or "40") into a (first, last) pair of page numbers."""
+    pages = parse_selection(spec)
+    if pages != list(range(pages[0], pages[-1] + 1)):
+        raise argparse.ArgumentTypeError("a page range must be contiguous, e.g. 40-60")
+    return pages[0], pages[-1]
+
+
+def select_chapters(files, chapters):
+    """Returns the files numbered in `chapters` (1-based), or all of them for None."""
+    if not chapters:
+        return list(files)
+    missing = [n for n in chapters if n > len(files)]
+    if missing:
+        raise ValueError(
+            f"there are only {len(files)} chapters, so {', '.join(map(str, missing))} "
+            "cannot be selected"
+        )
+    return [files[n - 1] for n in chapters]
+
+
+def add_arguments(parser):
+    """Adds --draft, --chapters and --pages to a builder's argument parser."""
+    parser.add_argument(
+        "--draft",
+        action="store_true",
+        help="Fast proofreading preview: one LaTeX pass, no TOC, image frames\n"
+        "instead of images; line and page breaks stay as in the final book.",
+    )
+    parser.add_argument(
+        "--chapters",
+        type=parse_selection,
+        help="Only these chapters (notes, in file order), e.g. '3' or '2-4,7'.\n"
+        "Implies --draft.",
+    )
+    parser.add_argument(
+        "--pages",
+        type=page_range,
+        help="Only write out these pages of the (selected) document, e.g. '40-60'.\n"
+        "Implies --draft.",
+    )
+
+
+def latex_header(pages=None):
+    """LaTeX for the preamble of a draft, limited to `pages` (first, last) if given."""
+    header = (
+        r"\ifdefined\pdfvariable"
+        r"\pdfvariable compresslevel=0 "
+        r"\pdfvariable objcompresslevel=0 "
+        r"\fi"
+    )
+    if pages:
+        first, last = pages
+        # A counter of our own: the kernel's shipout counter does not count
+        # discarded pages. \end is not allowed inside the output routine, so
+        # LuaTeX's tex.finish() ends the run (and closes the PDF) after the
+        # last page; other engines discard the remaining pages instead.
+        header += (
+            r"\newcount\scriptoriumdraftpage"
+            r"\AddToHook{shipout/before}{\global\advance\scriptoriumdraftpage 1 "
+            rf"\ifnum\scriptoriumdraftpage<{first} \DiscardShipoutBox\fi"
+            rf"\ifnum\scriptoriumdraftpage>{last} \DiscardShipoutBox\fi}}"
+            r"\ifdefined\directlua\AddToHook{shipout/after}{"
+            rf"\ifnum\scriptoriumdraftpage>{last - 1} \directlua{{tex.finish()}}\fi}}\fi"
+        )
+    return header
+
+
+def output_name(pdf_path):
+    """Drafts never overwrite the final PDF: 'Book.pdf' -> 'Book-draft.pdf'."""
+    base, ext = pdf_path.rsplit(".", 1)
+    return f"{base}-draft.{ext}"
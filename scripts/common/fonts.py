@@ -0,0 +1,359 @@
+"""
+Glyph coverage of the fonts under fonts/, and the preflight check built on it.
+
+Reads the `cmap` (character to glyph) and `name` tables of every .ttf/.otf
+file directly, with no font library, and caches the result in build/ keyed
+by each file's path, size and mtime. Later runs only re-read fonts that
+changed. Coverage is stored as sorted codepoint ranges, so each lookup is a
+binary search.
+"""
+
+import bisect
+import json
+import os
+import re
+import struct
+import unicodedata
+
+from common import BUILD_DIR, FONTS_DIR
+from common.arabic import script_runs
+
+CACHE_FILE = os.path.join(BUILD_DIR, "font-coverage.json")
+
+FONT_EXTENSIONS = (".ttf", ".otf")
+
+# Preferred cmap subtables: (platform, encoding). Full Unicode first.
+CMAP_PREFERENCE = [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0), (3, 0)]
+
+
+def _tables(data):
+    """Returns {tag: (offset, length)} from an sfnt table directory."""
+    num_tables = struct.unpack_from(">H", data, 4)[0]
+    tables = {}
+    for i in range(num_tables):
+        tag, _, offset, length = struct.unpack_from(">4sIII", data, 12 + 16 * i)
+        tables[tag.decode("latin-1")] = (offset, length)
+    return tables
+
+
+def _parse_format4(data, offset):
+    seg_count = struct.unpack_from(">H", data, offset + 6)[0] // 2
+    ends_at = offset + 14
+    starts_at = ends_at + 2 * seg_count + 2
+    deltas_at = starts_at + 2 * seg_count
+    range_offsets_at = deltas_at + 2 * seg_count
+    ends = struct.unpack_from(f">{seg_count}H", data, ends_at)
+    starts = struct.unpack_from(f">{seg_count}H", data, starts_at)
+    deltas = struct.unpack_from(f">{seg_count}h", data, deltas_at)
+    range_offsets = struct.unpack_from(f">{seg_count}H", data, range_offsets_at)
+
+    codepoints = set()
+    for i in range(seg_count):
+        start, end = starts[i], ends[i]
+        if start == 0xFFFF:
+            continue
+        if range_offsets[i] == 0:
+            # Every code in the segment maps to a glyph unless it lands on .notdef.
+            codepoints.update(c for c in range(start, end + 1) if (c + deltas[i]) & 0xFFFF)
+            continue
+        for c in range(start, end + 1):
+            glyph_at = range_offsets_at + 2 * i + range_offsets[i] + 2 * (c - start)
+            if glyph_at + 2 <= len(data) and struct.unpack_from(">H", data, glyph_at)[0]:
+                codepoints.add(c)
+    return codepoints
+
+
+def _parse_format12(data, offset):
+    num_groups = struct.unpack_from(">I", data, offset + 12)[0]
+    codepoints = set()
+    for i in range(num_groups):
+        start, end, start_glyph = struct.unpack_from(">III", data, offset + 16 + 12 * i)
+        first = start if start_glyph else start + 1
+        codepoints.update(range(first, end + 1))
+    return codepoints
+
+
+def _read_cmap(data, tables):
+    cmap_offset = tables["cmap"][0]
+    num_subtables = struct.unpack_from(">H", data, cmap_offset + 2)[0]
+    subtables = {}
+    for i in range(num_subtables):
+        platform, encoding, offset = struct.unpack_from(">HHI", data, cmap_offset + 4 + 8 * i)
+        subtables.setdefault((platform, encoding), cmap_offset + offset)
+
+    for key in CMAP_PREFERENCE:
+        if key not in subtables:
+            continue
+        offset = subtables[key]
+        fmt = struct.unpack_from(">H", data, offset)[0]
+        if fmt == 4:
+            return _parse_format4(data, offset)
+        if fmt == 12:
+            return _parse_format12(data, offset)
+    return set()
+
+
+def _read_family(data, tables):
+    """Returns the typographic (ID 16) or legacy (ID 1) family name."""
+    if "name" not in tables:
+        return None
+    name_offset = tables["name"][0]
+    count, strings_offset = struct.unpack_from(">HH", data, name_offset + 2)
+    names = {}
+    for i in range(count):
+        platform, encoding, _, name_id, length, offset = struct.unpack_from(
+            ">6H", data, name_offset + 6 + 12 * i
+        )
+        if name_id not in (1, 16):
+            continue
+        raw = data[name_offset + strings_offset + offset :][:length]
+        if platform == 3 or platform == 0:
+            value = raw.decode("utf-16-be", errors="replace")
+        elif platform == 1 and encoding == 0:
+            value = raw.decode("mac-roman", errors="replace")
+        else:
+            continue
+        # Prefer Windows/Unicode names over Macintosh ones for the same ID.
+        if name_id not in names or platform != 1:
+            names[name_id] = value
+    return names.get(16) or names.get(1)
+
+
+def _to_ranges(codepoints):
+    ranges = []
+    for c in sorted(codepoints):
+        if ranges and ranges[-1][1] == c - 1:
+            ranges[-1][1] = c
+        else:
+            ranges.append([c, c])
+    return ranges
+
+
+def read_font(path):
+    """Returns (family, coverage ranges) for one font file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    tables = _tables(data)
+    if "cmap" not in tables:
+        return None, []
+    return _read_family(data, tables), _to_ranges(_read_cmap(data, tables))
+
+
+class CoverageIndex:
+    """Which codepoints each font family under fonts/ can display."""
+
+    def __init__(self, fonts_dir=FONTS_DIR):
+        self.fonts_dir = fonts_dir
+        self.families = {}  # lowercased family -> {"name", "starts", "ends", "files"}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(CACHE_FILE, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+
+        entries = {}
+        changed = False
+        for directory, _, filenames in os.walk(self.fonts_dir):
+            for filename in sorted(filenames):
+                if not filename.lower().endswith(FONT_EXTENSIONS):
+                    continue
+                path = os.path.join(directory, filename)
+                stat = os.stat(path)
+                key = f"{path}@{stat.st_size}@{stat.st_mtime_ns}"
+                if key not in cache:
+                    try:
+                        family, ranges = read_font(path)
+                    except (struct.error, KeyError, OSError):
+                        family, ranges = None, []
+                    cache[key] = {"path": path, "family": family, "ranges": ranges}
+                    changed = True
+                entries[key] = cache[key]
+
+        if changed or len(entries) != len(cache):
+            os.makedirs(BUILD_DIR, exist_ok=True)
+            tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, CACHE_FILE)
+
+        # Merge the styles of a family (Regular, Bold, ...) into one coverage.
+        merged = {}
+        for entry in entries.values():
+            if not entry["family"]:
+                continue
+            family = merged.setdefault(
+                entry["family"].lower(), {"name": entry["family"], "codepoints": [], "files": []}
+            )
+            family["files"].append(entry["path"])
+            family["codepoints"].extend(entry["ranges"])
+        for key, family in merged.items():
+            ranges = []
+            for start, end in sorted(family.pop("codepoints")):
+                if ranges and start <= ranges[-1][1] + 1:
+                    ranges[-1][1] = max(ranges[-1][1], end)
+                else:
+                    ranges.append([start, end])
+            family["starts"] = [r[0] for r in ranges]
+            family["ends"] = [r[1] for r in ranges]
+            self.families[key] = family
+
+    def has_family(self, family):
+        return family.lower() in self.families
+
+    def covers(self, family, char):
+        """True if `family` has a glyph for `char`."""
+        entry = self.families[family.lower()]
+        i = bisect.bisect_right(entry["starts"], ord(char)) - 1
+        return i >= 0 and ord(char) <= entry["ends"][i]
+
+    def missing(self, family, chars):
+        """Returns the characters of `chars` that `family` cannot display."""
+        return sorted(c for c in chars if not self.covers(family, c))
+
+    def fallbacks_for(self, chars, exclude=()):
+        """Families that cover all of `chars`, in alphabetical order."""
+        excluded = {e.lower() for e in exclude}
+        return [
+            family["name"]
+            for key, family in sorted(self.families.items())
+            if key not in excluded and all(self.covers(key, c) for c in chars)
+        ]
+
+
+_index = None
+
+
+def coverage_index():
+    """Returns the shared CoverageIndex, built (or loaded from cache) on first use."""
+    global _index
+    if _index is None:
+        _index = CoverageIndex()
+    return _index
+
+
+# Characters that are never looked up in a font: spaces, line breaks and
+# format controls such as ZWJ/ZWNJ, which the shaper consumes.
+IGNORED_CATEGORIES = {"Zs", "Zl", "Zp", "Cc", "Cf"}
+
+
+def template_fonts(template_path):
+    """
+    Returns (main font, Arabic font, Arabic font options) as configured by
+    `\\setmainfont` and `\\newfontfamily\\arabicfont` in a LaTeX template.
+    """
+    with open(template_path, "r", encoding="utf-8") as f:
+        tex = f.read()
+    main = re.search(r"^\\setmainfont(?:\[[^\]]*\])?\{([^}]+)\}", tex, re.MULTILINE)
+    arabic = re.search(
+        r"^\\newfontfamily\\arabicfont(?:\[([^\]]*)\])?\{([^}]+)\}", tex, re.MULTILINE
+    )
+    return (
+        main.group(1) if main else None,
+        arabic.group(2) if arabic else None,
+        arabic.group(1) if arabic else "",
+    )
+
+
+def check_coverage(text, main_font, arabic_font=None):
+    """
+    Checks every character of `text` against the font that will render it:
+    Arabic runs (as detected by autotag-arabic.py) against `arabic_font`,
+    everything else against `main_font`.
+
+    Returns (problems, skipped): one problem dict per missing character with
+    {"font", "char", "count", "line"}, and the fonts that are not under fonts/
+    and so could not be checked.
+    """
+    index = coverage_index()
+    chars_by_font = {}
+    for is_arabic, run in script_runs(text):
+        font = arabic_font if is_arabic and arabic_font else main_font
+        chars_by_font.setdefault(font, set()).update(run)
+
+    problems = []
+    skipped = []
+    for font, chars in chars_by_font.items():
+        if not font:
+            continue
+        if not index.has_family(font):
+            skipped.append(font)
+            continue
+        chars = {c for c in chars if unicodedata.category(c) not in IGNORED_CATEGORIES}
+        for char in index.missing(font, chars):
+            problems.append(
+                {
+                    "font": font,
+                    "char": char,
+                    "count": text.count(char),
+                    "line": text.count("\n", 0, text.find(char)) + 1,
+                }
+            )
+    return problems, skipped
+
+
+def fallback_header(problems, main_font, arabic_font=None, arabic_options="", main_options=""):
+    """
+    Returns LaTeX that gives each font with missing glyphs a luaotfload
+    fallback chain of repo fonts that cover them, or "" if none is needed.
+    The fonts keep their `arabic_options` and `main_options` (e.g. the renderer).
+    """
+    index = coverage_index()
+    lines = []
+    for font in sorted({p["font"] for p in problems}):
+        chars = [p["char"] for p in problems if p["font"] == font]
+        fallbacks = index.fallbacks_for(chars, exclude=[font])
+        if not fallbacks:
+            # No single font covers everything; chain those that cover some.
+            fallbacks = [f for c in chars for f in index.fallbacks_for([c], exclude=[font])[:1]]
+            fallbacks = list(dict.fromkeys(fallbacks))
+        if not fallbacks:
+            continue
+
+        chain = "sss" + re.sub(r"[^a-z]", "", font.lower()) + "fallback"
+        entries = ", ".join(f'"{f}:mode=harf;"' for f in fallbacks[:3])
+        lines.append(rf'\directlua{{luaotfload.add_fallback("{chain}", {{{entries}}})}}')
+        if font == arabic_font:
+            options = f"{arabic_options}, " if arabic_options else ""
+            lines.append(rf"\renewfontfamily\arabicfont[{options}RawFeature={{fallback={chain}}}]{{{font}}}")
+        if font == main_font:
+            options = f"{main_options}, " if main_options else ""
+            lines.append(rf"\setmainfont{{{font}}}[{options}RawFeature={{fallback={chain}}}]")
+    return "\n".join(lines)
+
+
+def report(problems):
+    """Prints one line per missing glyph."""
+    print(f"⚠️  Glyph preflight: {len(problems)} character(s) have no glyph in their font:")
+    for p in problems:
+        name = unicodedata.name(p["char"], "UNKNOWN")
+        print(
+            f"   U+{ord(p['char']):04X} {name} ({p['char']}) in '{p['font']}': "
+            f"{p['count']}x, first on line {p['line']}"
+        )
+
+
+def preflight(text, main_font, arabic_font=None, arabic_options="", fallback=False, main_options=""):
+    """
+    Runs check_coverage() and prints a report. Returns the LaTeX fallback
+    header when `fallback` is set and one is needed, otherwise "".
+    """
+    problems, skipped = check_coverage(text, main_font, arabic_font)
+    for font in skipped:
+        print(f"ℹ️  Glyph preflight: '{font}' is not under fonts/, so it was not checked.")
+    if not problems:
+        return ""
+
+    report(problems)
+    if not fallback:
+        print("   Re-run with --font-fallback to fill them from other fonts under fonts/.")
+        return ""
+
+    header = fallback_header(problems, main_font, arabic_font, arabic_options, main_options)
+    if header:
+        print("   Using fallback fonts for the missing glyphs.")
+    else:
+        print("   No font under fonts/ covers them; they will be missing from the PDF.")
+    return header
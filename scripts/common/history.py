@@ -0,0 +1,210 @@
+"""
+Build history, for scheduling batches and sizing the build box.
+
+Every build run through the scriptorium entry point is recorded in
+build/history.sqlite: command, target (the resolved paths it was given),
+wall time, number of TeX engine passes, peak memory, input size and exit
+code. expected_duration() turns that history into an estimate for the next
+run, which the batch runner uses to start the longest builds first.
+
+Engine passes are counted without touching the builders: while a build runs,
+PATH starts with a folder of small lualatex/xelatex shims that note each run
+and then exec the real engine with the original PATH.
+"""
+
+import os
+import sqlite3
+import statistics
+import time
+
+from common import BUILD_DIR
+
+DB_PATH = os.path.join(BUILD_DIR, "history.sqlite")
+SHIM_DIR = os.path.join(BUILD_DIR, "engine-shims")
+
+# The engines whose runs are counted as passes.
+ENGINES = ["lualatex", "xelatex"]
+
+# Recent successful runs of one target used for its estimate.
+RECENT_RUNS = 5
+
+# Estimate for a command that has never been built at all (seconds).
+DEFAULT_ESTIMATE = 30.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id          INTEGER PRIMARY KEY,
+    command     TEXT NOT NULL,
+    target      TEXT NOT NULL,
+    started     REAL NOT NULL,
+    duration    REAL NOT NULL,
+    passes      INTEGER NOT NULL,
+    peak_rss_kb INTEGER NOT NULL,
+    input_bytes INTEGER NOT NULL,
+    exit_code   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS builds_by_target ON builds (command, target, started);
+"""
+
+SHIM = """#!/bin/sh
+# Counts TeX engine passes for the build history, then runs the real engine.
+[ -n "$SCRIPTORIUM_PASS_LOG" ] && echo x >> "$SCRIPTORIUM_PASS_LOG"
+PATH="$SCRIPTORIUM_ENGINE_PATH" exec {engine} "$@"
+"""
+
+
+def connect():
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    # Several builds of a batch finish at once; wait for the lock instead of failing.
+    db = sqlite3.connect(DB_PATH, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+def target_key(args):
+    """
+    The identity of a build: its arguments, with paths made absolute so that
+    the same book built from different folders shares one history.
+    """
+    parts = []
+    for arg in args:
+        path = os.path.expanduser(arg)
+        parts.append(os.path.realpath(path) if os.path.exists(path) else arg)
+    return " ".join(parts)
+
+
+def input_bytes(args):
+    """Total size of the files (and Markdown under the folders) named in `args`."""
+    total = 0
+    for arg in args:
+        path = os.path.expanduser(arg)
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                total += sum(
+                    os.path.getsize(os.path.join(root, f)) for f in files if f.endswith(".md")
+                )
+    return total
+
+
+def _install_shims():
+    """Creates the engine shims and returns the PATH that puts them first."""
+    original_path = os.environ.get("PATH", "")
+    os.makedirs(SHIM_DIR, exist_ok=True)
+    import shutil
+
+    for engine in ENGINES:
+        shim_path = os.path.join(SHIM_DIR, engine)
+        # Only shadow engines that exist, so missing ones are still reported as missing.
+        if shutil.which(engine, path=original_path) is None or os.path.exists(shim_path):
+            continue
+        tmp_path = f"{shim_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(SHIM.format(engine=engine))
+        os.chmod(tmp_path, 0o755)
+        os.replace(tmp_path, shim_path)
+    return SHIM_DIR + os.pathsep + original_path
+
+
+def run_recorded(command, args, build):
+    """
+    Calls build() (which may raise SystemExit, as the scripts do), recording
+    the run in the history. Returns the exit code.
+    """
+    import resource
+    import tempfile
+
+    if SHIM_DIR in os.environ.get("PATH", "").split(os.pathsep):
+        # Already inside a recorded build, whose shims are on the PATH: recording
+        # again would count the same run twice.
+        return _exit_code(build)
+
+    fd, pass_log = tempfile.mkstemp(prefix="scriptorium-passes-")
+    os.close(fd)
+    os.environ["SCRIPTORIUM_ENGINE_PATH"] = os.environ.get("PATH", "")
+    os.environ["SCRIPTORIUM_PASS_LOG"] = pass_log
+    os.environ["PATH"] = _install_shims()
+
+    started = time.time()
+    try:
+        code = _exit_code(build)
+    finally:
+        duration = time.time() - started
+        os.environ["PATH"] = os.environ.pop("SCRIPTORIUM_ENGINE_PATH")
+        os.environ.pop("SCRIPTORIUM_PASS_LOG", None)
+        with open(pass_log, "r", encoding="utf-8") as f:
+            passes = len(f.readlines())
+        os.remove(pass_log)
+
+    # ru_maxrss is in kilobytes on Linux; the children figure is the largest
+    # descendant that was waited for, i.e. usually the TeX engine.
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    try:
+        with connect() as db:
+            db.execute(
+                "INSERT INTO builds (command, target, started, duration, passes,"
+                " peak_rss_kb, input_bytes, exit_code) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (command, target_key(args), started, duration, passes, peak,
+                 input_bytes(args), code),
+            )
+    except sqlite3.Error as e:
+        print(f"⚠️ Warning: Could not record the build in {DB_PATH}: {e}")
+    return code
+
+
+def _exit_code(build):
+    try:
+        build()
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    return 0
+
+
+def expected_duration(db, command, args):
+    """
+    Returns (seconds, basis) for the next build of `command args`. In order of
+    preference: the median of this target's recent successful runs, the
+    command's seconds per input byte scaled to this input, the command's
+    median, or DEFAULT_ESTIMATE.
+    """
+    rows = db.execute(
+        "SELECT duration FROM builds WHERE command = ? AND target = ? AND exit_code = 0"
+        " ORDER BY started DESC LIMIT ?",
+        (command, target_key(args), RECENT_RUNS),
+    ).fetchall()
+    if rows:
+        return statistics.median(r[0] for r in rows), f"{len(rows)} previous runs"
+
+    rows = db.execute(
+        "SELECT duration, input_bytes FROM builds WHERE command = ? AND exit_code = 0",
+        (command,),
+    ).fetchall()
+    if not rows:
+        return DEFAULT_ESTIMATE, "no history"
+    size = input_bytes(args)
+    total_bytes = sum(r[1] for r in rows)
+    if size and total_bytes:
+        return sum(r[0] for r in rows) / total_bytes * size, f"{command} rate x input size"
+    return statistics.median(r[0] for r in rows), f"{command} median"
+
+
+def schedule(durations, workers):
+    """
+    Longest-processing-time-first list scheduling. Returns (order, makespan):
+    the job indices in start order, and the predicted wall time when each job
+    goes to the first free worker.
+    """
+    import heapq
+
+    order = sorted(range(len(durations)), key=lambda i: durations[i], reverse=True)
+    free_at = [0.0] * max(1, workers)
+    for i in order:
+        heapq.heapreplace(free_at, free_at[0] + durations[i])
+    return order, max(free_at)
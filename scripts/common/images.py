@@ -0,0 +1,219 @@
+"""
+Cached, right-sized derivatives of the images the documents embed.
+
+Photos and scans in the notes are often 3000+ pixels wide and several MB,
+but they are printed a few inches wide. LuaLaTeX and WeasyPrint decode (and
+embed) them in full on every build. derivative() makes each one once per
+output profile:
+
+  * scaled down to the profile's resolution at the width it is shown at;
+  * flat-colour images (logos, diagrams) as palette PNGs, photos as JPEGs,
+    which LuaTeX embeds as they are, without decoding;
+  * WebP, GIF and BMP, which LaTeX cannot include, as PNG or JPEG;
+  * SVG as PDF for LaTeX (with rsvg-convert, as pandoc itself would do).
+
+Derivatives live in build/images/, named by the hash of the source bytes and
+the profile, so an edited image gets a new derivative and an unchanged one is
+never converted twice. Where a derivative would be no better, the source is
+used as it is. Without Pillow, raster images are left alone.
+
+The image-derivatives pandoc filter rewrites the image paths in the AST.
+"""
+
+import hashlib
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+from common import BUILD_DIR
+
+CACHE_DIR = os.path.join(BUILD_DIR, "images")
+
+# Bump when the conversion changes, so old derivatives are not reused.
+VERSION = 1
+
+# Output profiles: resolution, the widest an image is ever shown (the text
+# width), and the JPEG quality for photos.
+PROFILES = {
+    "print": {"dpi": 300, "max_width_in": 6.5, "jpeg_quality": 90},  # LaTeX PDFs
+    "screen": {"dpi": 150, "max_width_in": 7.5, "jpeg_quality": 85},  # HTML, WeasyPrint
+}
+
+# Formats each kind of output can include without conversion.
+NATIVE_FORMATS = {
+    "print": {".png", ".jpg", ".jpeg", ".pdf"},
+    "screen": {".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp"},
+}
+
+RASTER_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".bmp", ".tif", ".tiff"}
+
+# A width attribute as pandoc keeps it: "300px", "50%", "3in", "5cm", "300".
+WIDTH_REGEX = re.compile(r"^\s*([\d.]+)\s*(px|%|in|cm|mm|pt)?\s*$")
+INCHES_PER_UNIT = {"px": 1 / 96, "in": 1, "cm": 1 / 2.54, "mm": 1 / 25.4, "pt": 1 / 72.27}
+
+# (path, size, mtime, profile, width) -> derivative path, for this process.
+_resolved = {}
+_warned = set()
+
+
+def locate(url, search_dirs):
+    """Returns the existing file an image URL refers to, or None (e.g. for web URLs)."""
+    if "://" in url or url.startswith("data:"):
+        return None
+    if os.path.isabs(url):
+        return url if os.path.isfile(url) else None
+    for directory in search_dirs:
+        path = os.path.join(directory, url)
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+
+def display_inches(width, profile):
+    """The width, in inches, an image is shown at, from its width attribute."""
+    max_width = PROFILES[profile]["max_width_in"]
+    match = WIDTH_REGEX.match(width or "")
+    if not match:
+        return max_width
+    value, unit = float(match.group(1)), match.group(2) or "px"
+    if unit == "%":
+        return max_width * value / 100
+    return min(max_width, value * INCHES_PER_UNIT[unit])
+
+
+def _warn_once(message):
+    if message not in _warned:
+        _warned.add(message)
+        # stderr: inside a pandoc filter, stdout carries the document.
+        print(f"⚠️  WARNING: {message}", file=sys.stderr)
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _convert_svg(path, target):
+    if shutil.which("rsvg-convert") is None:
+        _warn_once("rsvg-convert not found; SVG images are passed to pandoc as they are.")
+        return False
+    result = subprocess.run(
+        ["rsvg-convert", "--format=pdf", f"--output={target}", path], capture_output=True
+    )
+    return result.returncode == 0
+
+
+def _convert_raster(path, target_base, profile, pixels_wide):
+    """
+    Writes the derivative next to `target_base` and returns its path, None
+    if the source is as good as a derivative would be, or False without Pillow.
+    """
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        _warn_once("Pillow is not installed; images are embedded at full size.")
+        return False
+
+    settings = PROFILES[profile]
+    extension = os.path.splitext(path)[1].lower()
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.width > pixels_wide:
+            height = max(1, round(image.height * pixels_wide / image.width))
+            image = image.resize((pixels_wide, height), Image.Resampling.LANCZOS)
+
+        has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+        # JPEG sources are photos, even grey ones with few enough colours.
+        colors = None if extension in (".jpg", ".jpeg") else image.getcolors(256)
+        if colors is not None or has_alpha:
+            # Logos, diagrams and anything transparent: PNG, with a palette
+            # when there are few enough colours.
+            output_path = target_base + ".png"
+            if colors is not None and image.mode not in ("P", "1", "L"):
+                method = Image.Quantize.FASTOCTREE if has_alpha else Image.Quantize.MEDIANCUT
+                image = image.convert("RGBA" if has_alpha else "RGB")
+                image = image.quantize(colors=len(colors), method=method)
+            image.save(output_path, optimize=True)
+        else:
+            output_path = target_base + ".jpg"
+            image.convert("RGB").save(
+                output_path, quality=settings["jpeg_quality"], optimize=True, progressive=False
+            )
+
+    # Keep the source if it is natively usable and still the smaller file.
+    native = extension in NATIVE_FORMATS[profile]
+    if native and os.path.getsize(output_path) >= os.path.getsize(path):
+        os.remove(output_path)
+        return None
+    return output_path
+
+
+def derivative(path, profile="print", width=None):
+    """
+    Returns the path of the derivative of the image at `path` for `profile`,
+    shown `width` wide (a pandoc width attribute, or None for the text width).
+    Returns `path` itself when no derivative is needed or possible.
+    """
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns, profile, width)
+    if key in _resolved:
+        return _resolved[key]
+
+    extension = os.path.splitext(path)[1].lower()
+    settings = PROFILES[profile]
+    pixels_wide = math.ceil(display_inches(width, profile) * settings["dpi"])
+
+    name = hashlib.sha256(
+        f"{_file_hash(path)}:{profile}:{sorted(settings.items())}:{pixels_wide}:{VERSION}".encode()
+    ).hexdigest()[:24]
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    base = os.path.join(CACHE_DIR, name)
+
+    # A previous build's result: a derivative, or a note that the source is best.
+    result = next(
+        (base + ext for ext in (".png", ".jpg", ".pdf") if os.path.exists(base + ext)), None
+    )
+    if result is None and not os.path.exists(base + ".source"):
+        # Converted under a temporary name, then renamed, so that builds
+        # running side by side never see half a file.
+        # `converted` is the new file, None if the source is best, or False
+        # if it cannot be converted here (a missing tool), which is not cached.
+        tmp_base = f"{base}.{os.getpid()}.tmp"
+        converted = None
+        if extension == ".svg" and profile == "print":
+            converted = _convert_svg(path, tmp_base + ".pdf") and tmp_base + ".pdf"
+        elif extension in RASTER_EXTENSIONS:
+            try:
+                converted = _convert_raster(path, tmp_base, profile, pixels_wide)
+            except OSError as e:
+                _warn_once(f"Could not convert '{path}': {e}")
+                converted = False
+        if converted:
+            result = base + os.path.splitext(converted)[1]
+            os.replace(converted, result)
+        elif converted is None:
+            open(base + ".source", "w").close()
+
+    _resolved[key] = result or path
+    return _resolved[key]
+
+
+def pandoc_args(search_dirs, profile="print"):
+    """The pandoc options that run the image-derivatives filter for a build."""
+    from common import warm_filter
+
+    search_path = os.pathsep.join(os.path.abspath(d) for d in search_dirs)
+    return [
+        "--filter",
+        warm_filter.CLIENTS["image-derivatives"],
+        "--metadata",
+        f"image-search-path:{search_path}",
+        "--metadata",
+        f"image-profile:{profile}",
+    ]
@@ -0,0 +1,252 @@
+"""
+A build queue in a shared directory, for spreading a batch over several
+builder processes, on one host or on several hosts that mount the same
+filesystem.
+
+Every job is one JSON file, and its state is the folder it is in:
+
+  pending/   waiting to be claimed (claimed in name order)
+  running/   claimed; the file's mtime is the worker's heartbeat
+  done/      built, with the published outputs and their hashes
+  failed/    gave up after MAX_ATTEMPTS attempts
+
+Every state change is a rename(), which is atomic on POSIX filesystems
+(NFS included), so when two workers race for the same file only one rename
+succeeds. No lock server or database is needed. A worker touches its running
+file every few seconds. If it has not been touched for the lease period, the
+worker is presumed dead: any other worker may take the job back and put it
+in pending/ again (or in failed/, once the attempts run out).
+
+Leases are compared against file mtimes set by the file server, so hosts need
+only roughly synchronised clocks: keep the lease well above any clock skew.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import socket
+import time
+import uuid
+
+STATES = ("pending", "running", "done", "failed")
+
+# Attempts (including ones abandoned by dead workers) before a job fails.
+MAX_ATTEMPTS = 3
+
+# Seconds between heartbeats, and without one before a job is taken back.
+HEARTBEAT_INTERVAL = 10
+LEASE_SECONDS = 60
+
+
+def worker_id():
+    """A name for this worker process that is unique across hosts."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{worker_id()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class JobQueue:
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        for state in STATES:
+            os.makedirs(os.path.join(self.root, state), exist_ok=True)
+
+    def _path(self, state, name):
+        return os.path.join(self.root, state, name)
+
+    def _names(self, state):
+        # In-flight temporary files carry a suffix after ".json".
+        return sorted(n for n in os.listdir(os.path.join(self.root, state)) if n.endswith(".json"))
+
+    # --- Submitting ---
+
+    def submit(self, jobs):
+        """
+        Adds jobs (lists of scriptorium arguments) in the order given; jobs
+        are claimed in that order. Returns the new job ids.
+        """
+        batch = f"{int(time.time()):010d}-{uuid.uuid4().hex[:6]}"
+        ids = []
+        for index, args in enumerate(jobs):
+            job_id = f"{batch}-{index:05d}"
+            _write_json(
+                self._path("pending", f"{job_id}.json"),
+                {"id": job_id, "args": args, "attempts": 0, "submitted": time.time(), "errors": []},
+            )
+            ids.append(job_id)
+        return ids
+
+    # --- Claiming and leases ---
+
+    def claim(self, worker):
+        """Claims the first pending job and returns it, or None if there is none."""
+        for name in self._names("pending"):
+            pending_path = self._path("pending", name)
+            running_path = self._path("running", name)
+            try:
+                # Touch first: rename keeps the mtime, and an old mtime in
+                # running/ would look like an expired lease.
+                os.utime(pending_path)
+                os.rename(pending_path, running_path)
+            except FileNotFoundError:
+                continue  # Another worker got there first.
+            job = _read_json(running_path)
+            job["attempts"] += 1
+            job["worker"] = worker
+            job["claimed"] = time.time()
+            _write_json(running_path, job)
+            return job
+
+        return None
+
+    def heartbeat(self, job):
+        """Renews the lease. Returns False if the job was taken back meanwhile."""
+        try:
+            os.utime(self._path("running", f"{job['id']}.json"))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _take(self, name, worker, purpose):
+        """Moves a running job aside so that only this worker acts on it."""
+        private_path = f"{self._path('running', name)}.{worker}.{purpose}"
+        try:
+            os.rename(self._path("running", name), private_path)
+        except FileNotFoundError:
+            return None, None
+        return _read_json(private_path), private_path
+
+    def _retry_or_fail(self, job, private_path, error):
+        job["errors"].append(error)
+        job.pop("worker", None)
+        state = "failed" if job["attempts"] >= MAX_ATTEMPTS else "pending"
+        _write_json(self._path(state, f"{job['id']}.json"), job)
+        os.remove(private_path)
+        return state
+
+    def reap(self, worker, lease=LEASE_SECONDS):
+        """Takes back jobs whose lease has expired. Returns their ids."""
+        reaped = []
+        now = time.time()
+        for name in self._names("running"):
+            try:
+                if now - os.stat(self._path("running", name)).st_mtime < lease:
+                    continue
+            except FileNotFoundError:
+                continue
+            job, private_path = self._take(name, worker, "reap")
+            if job is None:
+                continue
+            self._retry_or_fail(
+                job, private_path, f"lease expired: worker {job.get('worker')} stopped responding"
+            )
+            reaped.append(job["id"])
+        return reaped
+
+    # --- Finishing ---
+
+    def complete(self, job, result):
+        """Moves the job to done/. Returns False if the job was taken back meanwhile."""
+        name = f"{job['id']}.json"
+        try:
+            os.rename(self._path("running", name), self._path("done", name))
+        except FileNotFoundError:
+            return False
+        job.update(result, finished=time.time())
+        _write_json(self._path("done", name), job)
+        return True
+
+    def fail(self, job, worker, error):
+        """
+        Records a failed attempt. Returns "pending" if the job will be retried,
+        "failed" if it is out of attempts, or None if it was taken back meanwhile.
+        """
+        current, private_path = self._take(f"{job['id']}.json", worker, "release")
+        if current is None:
+            return None
+        return self._retry_or_fail(current, private_path, error)
+
+    def retry_failed(self):
+        """Moves every failed job back to pending/ with fresh attempts."""
+        retried = []
+        for name in self._names("failed"):
+            try:
+                job = _read_json(self._path("failed", name))
+                os.rename(self._path("failed", name), self._path("pending", name))
+            except FileNotFoundError:
+                continue
+            job["attempts"] = 0
+            _write_json(self._path("pending", name), job)
+            retried.append(job["id"])
+        return retried
+
+    # --- Inspection ---
+
+    def jobs(self, state):
+        found = []
+        for name in self._names(state):
+            try:
+                job = _read_json(self._path(state, name))
+                job["heartbeat"] = os.stat(self._path(state, name)).st_mtime
+            except (FileNotFoundError, ValueError):
+                continue  # Changed state while we looked.
+            found.append(job)
+        return found
+
+    def counts(self):
+        return {state: len(self._names(state)) for state in STATES}
+
+
+def publish(staging_dir, output_dir):
+    """
+    Moves the files a job wrote to `staging_dir` into `output_dir`.
+
+    Each file is stored once under output_dir/.objects/ by its SHA-256. Its
+    published name is then a hard link to that object (a copy where links are
+    not possible), put in place with an atomic rename, so readers only ever
+    see a complete file. Returns [{"path", "sha256"}] for the published files.
+    """
+    objects_dir = os.path.join(output_dir, ".objects")
+    os.makedirs(objects_dir, exist_ok=True)
+    published = []
+    for root, _, files in os.walk(staging_dir):
+        for file_name in sorted(files):
+            source = os.path.join(root, file_name)
+            relative = os.path.relpath(source, staging_dir)
+            digest = hashlib.sha256()
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            sha256 = digest.hexdigest()
+
+            object_path = os.path.join(objects_dir, sha256 + os.path.splitext(file_name)[1])
+            if not os.path.exists(object_path):
+                tmp_path = f"{object_path}.{worker_id()}.tmp"
+                shutil.copyfile(source, tmp_path)
+                os.replace(tmp_path, object_path)
+
+            target = os.path.join(output_dir, relative)
+            published.append({"path": relative, "sha256": sha256})
+            if os.path.exists(target) and os.path.samefile(target, object_path):
+                # Already published (a rebuild after a lost lease). Renaming a
+                # link onto the same file would do nothing and leave it behind.
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_target = f"{target}.{worker_id()}.tmp"
+            try:
+                os.link(object_path, tmp_target)
+            except OSError:
+                shutil.copyfile(object_path, tmp_target)
+            os.replace(tmp_target, target)
+    return published
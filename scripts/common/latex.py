@@ -0,0 +1,348 @@
+"""
+Runs the TeX engine directly, streaming its output, instead of letting pandoc
+run it and hand back the whole log at the end.
+
+The builders convert Markdown to LaTeX with pandoc and then call compile_pdf().
+That function reads the engine's output line by line. On the first fatal
+error ("! ..." or "file:line: ..."), it stops the engine and raises
+EngineError.
+
+To say where the error came from, the builders pass their Markdown through
+mark_sources() before conversion. It puts a raw LaTeX comment with the note
+name and line number in front of each top-level block:
+
+  % scriptorium-source: 03 Lesson.md:42
+
+The error's line in the generated .tex is traced back to the nearest marker.
+"""
+
+import collections
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+from common import BUILD_DIR, limits, toc
+from common.workspace import Workspace
+
+MARKER_PREFIX = "% scriptorium-source: "
+
+# Blocks that must not be separated from the block before them, since a
+# marker in between would split a list, block quote or definition list, or
+# part a table from its caption ("Table: ..." or ": ...").
+CONTINUATION_REGEX = re.compile(r"^(?:[-*+>:]\s|\d+[.)]\s|\[\^|Table:)")
+# The lines a table block starts with, or the second line for pipe and
+# simple tables (after the header row). A caption may come before a table
+# as well as after it, so tables get no marker of their own either.
+GRID_TABLE_REGEX = re.compile(r"^\+[-=:+]+\+\s*$")
+PIPE_RULE_REGEX = re.compile(r"^\|?\s*:?-+:?\s*(?:\|\s*:?-+:?\s*)+\|?\s*$|^\|\s*:?-+:?\s*\|\s*$")
+DASH_RULE_REGEX = re.compile(r"^\s*-{3,}(?:\s+-{3,})+\s*$")
+MULTILINE_RULE_REGEX = re.compile(r"^-{3,}\s*$")
+FENCE_REGEX = re.compile(r"^(`{3,}|~{3,})")
+
+# "! Undefined control sequence." or, with -file-line-error,
+# "./input.tex:123: Undefined control sequence."
+TEX_ERROR_REGEX = re.compile(r"^!\s*(.*)$")
+FILE_LINE_ERROR_REGEX = re.compile(r"^(.*?\.(?:tex|sty|cls|ltx|def)):(\d+):\s*(.*)$")
+CONTEXT_LINE_REGEX = re.compile(r"^l\.(\d+)")
+
+# TeX prints "[12]" (or "[12{...}]") as it ships out page 12.
+PAGE_REGEX = re.compile(r"\[(\d+)[\]{ ]")
+
+FONT_NOT_FOUND_REGEX = re.compile(
+    r'fontspec error: "font-not-found"|Package fontspec Error: The font "[^"]*" cannot be found'
+)
+
+# Lines of the engine log kept for error reports.
+LOG_TAIL = 40
+
+
+class EngineError(subprocess.CalledProcessError):
+    """
+    A failed engine run. `message` is TeX's error, `source` the (note, line)
+    it was traced to (or None), and `output`/`stderr` hold the end of the log.
+    """
+
+    def __init__(self, returncode, cmd, message, log, tex_line=None, source=None):
+        super().__init__(returncode, cmd, output=log, stderr=log)
+        self.message = message
+        self.tex_line = tex_line
+        self.source = source
+        # Where compile_pdf() kept the generated LaTeX, if it did.
+        self.tex_path = None
+
+    def __str__(self):
+        if self.source:
+            note, line = self.source
+            return f"LaTeX error in '{note}' near line {line}: {self.message}"
+        if self.tex_line:
+            return f"LaTeX error at line {self.tex_line} of the generated LaTeX: {self.message}"
+        return f"LaTeX error: {self.message}"
+
+
+def report(error):
+    """Prints an EngineError the way the builders report failures."""
+    print(f"🔴 {error}")
+    if error.tex_path:
+        print(f"   The generated LaTeX was kept at: {error.tex_path}")
+    print("\n--- End of the LaTeX Log ---")
+    print(error.output)
+
+
+def font_not_found(log):
+    """Returns True if `log` shows fontspec failing to find a font."""
+    return bool(log and FONT_NOT_FOUND_REGEX.search(log))
+
+
+def mark_sources(text, source_name, first_line=1):
+    """
+    Returns `text` with a source marker (a raw LaTeX block) before each
+    top-level block, numbering lines from `first_line`. Fenced code, YAML
+    front matter, tables, table captions and blocks that continue a list or
+    quote are left alone.
+    """
+    lines = text.split("\n")
+    output = []
+    fence = None
+    in_frontmatter = first_line == 1 and lines[:1] == ["---"]
+    previous_blank = True
+    for index, line in enumerate(lines):
+        number = index + first_line
+        stripped = line.lstrip()
+        if in_frontmatter:
+            output.append(line)
+            if number > first_line and line.strip() in ("---", "..."):
+                in_frontmatter = False
+            continue
+        if fence:
+            output.append(line)
+            if stripped.startswith(fence):
+                fence = None
+            continue
+        if (
+            previous_blank
+            and line
+            and not line[0].isspace()
+            and not CONTINUATION_REGEX.match(line)
+            and not _starts_table(line, lines[index + 1] if index + 1 < len(lines) else "")
+        ):
+            output += ["```{=latex}", f"{MARKER_PREFIX}{source_name}:{number}", "```", ""]
+        match = FENCE_REGEX.match(stripped)
+        if match:
+            fence = match.group(1)
+        output.append(line)
+        previous_blank = not line.strip()
+    return "\n".join(output)
+
+
+def _starts_table(line, next_line):
+    """Returns True if a block starting with `line`, `next_line` is a table."""
+    if GRID_TABLE_REGEX.match(line) or DASH_RULE_REGEX.match(line):
+        return True
+    if MULTILINE_RULE_REGEX.match(line):
+        # A lone rule is a horizontal rule; one with rows under it, a table.
+        return bool(next_line.strip())
+    if line.startswith("|") or PIPE_RULE_REGEX.match(next_line):
+        return True
+    return bool(DASH_RULE_REGEX.match(next_line))
+
+
+def source_for(tex_path, tex_line):
+    """Returns the (note, line) of the last source marker at or before `tex_line`."""
+    found = None
+    with open(tex_path, "r", encoding="utf-8", errors="replace") as f:
+        for number, line in enumerate(f, start=1):
+            if number > tex_line:
+                break
+            if line.startswith(MARKER_PREFIX):
+                note, _, source_line = line[len(MARKER_PREFIX):].strip().rpartition(":")
+                found = (note, int(source_line)) if source_line.isdigit() else None
+    return found
+
+
+def run_engine(engine, tex_path, env=None, on_page=None):
+    """
+    Runs one engine pass over `tex_path` in its folder. Returns normally on
+    success and raises EngineError as soon as the first fatal error is read.
+    The pass runs under the limits of common/limits.py; hitting one raises
+    limits.ResourceLimitError instead.
+    """
+    tex_name = os.path.basename(tex_path)
+    command = [engine, "-interaction=nonstopmode", "-halt-on-error", "-file-line-error", tex_name]
+    run_limits = limits.current()
+    limits.cancel_on_sigterm()
+    process = subprocess.Popen(
+        limits.limited(command, run_limits, env),
+        cwd=os.path.dirname(os.path.abspath(tex_path)),
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        # Its own group, so that stopping it also stops luaotfload's font scans.
+        **limits.popen_options(run_limits),
+    )
+    # Stops the group when the pass runs too long; reading its output then ends.
+    timed_out = threading.Event()
+
+    def on_timeout():
+        timed_out.set()
+        limits.stop(process)
+
+    watchdog = threading.Timer(run_limits.timeout, on_timeout) if run_limits.timeout else None
+    if watchdog:
+        watchdog.daemon = True
+        watchdog.start()
+    tail = collections.deque(maxlen=LOG_TAIL)
+    message = None
+    tex_line = None
+    context_lines = 0
+    try:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            tail.append(line)
+            if message is None:
+                match = FILE_LINE_ERROR_REGEX.match(line)
+                if match:
+                    message = match.group(3)
+                    if os.path.basename(match.group(1)) == tex_name:
+                        tex_line = int(match.group(2))
+                    # The "l.N" context line still follows; it helps with
+                    # errors raised inside packages, so keep reading briefly.
+                    continue
+                match = TEX_ERROR_REGEX.match(line)
+                if match:
+                    message = match.group(1)
+                    continue
+                if on_page:
+                    for page in PAGE_REGEX.findall(line):
+                        on_page(int(page))
+            else:
+                context_lines += 1
+                match = CONTEXT_LINE_REGEX.match(line)
+                if match:
+                    tex_line = tex_line or int(match.group(1))
+                    break
+                if context_lines >= 10:
+                    break
+    except BaseException:
+        # Cancelled (Ctrl-C, SIGTERM): take the engine down too.
+        limits.stop(process)
+        raise
+    finally:
+        if watchdog:
+            watchdog.cancel()
+        if message is not None:
+            limits.stop(process)
+        returncode = process.wait()
+
+    if timed_out.is_set():
+        raise limits.ResourceLimitError(
+            "time", run_limits.timeout, returncode, command, "\n".join(tail)
+        )
+    kind = limits.exceeded(returncode, "\n".join(tail), run_limits)
+    if kind:
+        limit = run_limits.cpu_seconds if kind == "cpu" else run_limits.memory_mb
+        raise limits.ResourceLimitError(kind, limit, returncode, command, "\n".join(tail))
+    if message is not None or returncode != 0:
+        if message is None:
+            message = f"{engine} exited with code {returncode}"
+        source = source_for(tex_path, tex_line) if tex_line else None
+        raise EngineError(returncode or 1, command, message, "\n".join(tail), tex_line, source)
+
+
+def compile_pdf(
+    latex,
+    output_pdf,
+    engine="lualatex",
+    resource_dirs=(),
+    env=None,
+    quiet=False,
+    max_runs=3,
+    workspace=None,
+    profile=None,
+    reuse_toc=True,
+):
+    """
+    Compiles a standalone LaTeX document to `output_pdf`, rerunning the engine
+    (at most `max_runs` times) until the .aux and .toc files settle, as pandoc does.
+    With `reuse_toc`, the first pass starts from the state the last build of
+    `output_pdf` ended with (common/toc.py), so an unchanged table of contents
+    costs no extra pass; the state it ends with is cached for the next build.
+    Returns the number of passes run.
+    Raises EngineError on the first fatal error, or limits.ResourceLimitError
+    when a pass hits a resource limit; the generated LaTeX is then kept in
+    build/ for inspection.
+
+    The engine runs in the job's scratch `workspace` (common/workspace.py),
+    or in one of its own, and only the finished PDF is moved to `output_pdf`.
+    With a common.profiling.Profile as `profile`, the document is instrumented
+    and the profile filled in after every pass.
+    """
+    if workspace is None:
+        with Workspace(os.path.splitext(os.path.basename(output_pdf))[0]) as own:
+            return compile_pdf(
+                latex, output_pdf, engine, resource_dirs, env, quiet, max_runs, own, profile, reuse_toc
+            )
+    if profile is not None:
+        latex = profile.instrument(latex, workspace.path)
+
+    env = workspace.environment(env)
+    # Relative image paths resolve against the source folders; the trailing
+    # empty entry keeps TeX's default search path.
+    env["TEXINPUTS"] = os.pathsep.join(
+        [os.path.abspath(d) for d in resource_dirs] + [env.get("TEXINPUTS", "")]
+    )
+    show_progress = not quiet and os.isatty(1)
+
+    tex_path = workspace.file("input.tex")
+    with open(tex_path, "w", encoding="utf-8") as f:
+        f.write(latex)
+
+    seeded = toc.seed(workspace.path, "input", latex, output_pdf, engine) if reuse_toc else None
+
+    def state():
+        contents = []
+        for ext in toc.EXTENSIONS:
+            path = workspace.file("input" + ext)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    contents.append(f.read())
+        return contents
+
+    for run in range(1, max_runs + 1):
+        before = state()
+
+        def on_page(page):
+            if show_progress:
+                print(f"\r   {engine} pass {run}: page {page}", end="", flush=True)
+
+        started = time.monotonic()
+        try:
+            run_engine(engine, tex_path, env=env, on_page=on_page)
+        except (EngineError, limits.ResourceLimitError) as e:
+            os.makedirs(BUILD_DIR, exist_ok=True)
+            e.tex_path = os.path.join(
+                BUILD_DIR, f"failed-{os.path.splitext(os.path.basename(output_pdf))[0]}.tex"
+            )
+            shutil.copyfile(tex_path, e.tex_path)
+            raise
+        finally:
+            if show_progress:
+                print()
+        if profile is not None:
+            profile.read_pass(workspace.path, time.monotonic() - started)
+        if state() == before:
+            break
+
+    if seeded and not quiet:
+        print(
+            f"♻️  Started from the table of contents of the last build "
+            f"(headings {seeded}); {run} LaTeX pass(es)."
+        )
+    toc.store(workspace.path, "input", latex, output_pdf, engine)
+    workspace.publish("input.pdf", output_pdf)
+    return run
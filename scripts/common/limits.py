@@ -0,0 +1,238 @@
+"""
+Resource limits for the tools the builders run: pandoc, the TeX engines and
+WeasyPrint.
+
+A malformed note (unbalanced braces in an Arabic paragraph, say) can make
+LuaLaTeX loop for ever or eat all the memory of the machine. In a batch that
+stalls one worker and starves the others. Every tool is therefore started in
+its own process group (session), with:
+
+  * a wall-clock timeout, after which the whole group is stopped: SIGTERM,
+    then SIGKILL if it does not exit within a few seconds;
+  * a CPU-time limit (RLIMIT_CPU), for a loop that keeps a core busy;
+  * a memory cap (RLIMIT_DATA). The cap is on data, not address space,
+    because pandoc's runtime reserves a huge address range up front.
+
+The rlimits are set by a small wrapper that then execs the tool (limited()).
+Limits also apply to the processes a tool starts (pandoc's filters,
+luaotfload's font scans). Hitting one raises ResourceLimitError. The builders
+report it apart from ordinary failures and exit with EXIT_CODE, so a batch
+can tell a runaway manuscript from a broken one. A builder that is itself
+cancelled (Ctrl-C, or SIGTERM from a batch or queue worker) stops the group
+of the tool it was running before exiting.
+
+Configuration, read when each tool starts (0 turns a limit off):
+  SCRIPTORIUM_TIMEOUT       wall-clock seconds per tool run (default 1800)
+  SCRIPTORIUM_CPU_SECONDS   CPU seconds per tool run (default 0)
+  SCRIPTORIUM_MEMORY_MB     memory cap per tool run, in MB (default 0)
+
+`scriptorium batch` and `queue worker` give each concurrent build an equal
+share of the machine's memory unless SCRIPTORIUM_MEMORY_MB is set.
+"""
+
+import collections
+import errno
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+
+# The exit code of a build stopped by a resource limit, as timeout(1) uses.
+EXIT_CODE = 124
+
+# Seconds a stopped process group gets between SIGTERM and SIGKILL.
+GRACE_SECONDS = 5
+
+# How the tools say that an allocation failed: GHC (pandoc), Lua and TeX,
+# Python (WeasyPrint), C and C++.
+MEMORY_REGEX = re.compile(
+    r"out of memory|not enough memory|MemoryError|Cannot allocate memory"
+    r"|memory exhausted|std::bad_alloc",
+    re.IGNORECASE,
+)
+
+Limits = collections.namedtuple("Limits", "timeout cpu_seconds memory_mb")
+
+
+def _setting(name, default):
+    try:
+        return max(0, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+def current():
+    """The configured limits; 0 means none."""
+    return Limits(
+        _setting("SCRIPTORIUM_TIMEOUT", 1800),
+        _setting("SCRIPTORIUM_CPU_SECONDS", 0),
+        _setting("SCRIPTORIUM_MEMORY_MB", 0),
+    )
+
+
+def memory_share(jobs):
+    """MB of physical memory per job when `jobs` run at once, or 0 if unknown."""
+    try:
+        total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (AttributeError, ValueError, OSError):
+        return 0
+    return total // (1024 * 1024) // max(1, jobs)
+
+
+class ResourceLimitError(subprocess.CalledProcessError):
+    """A tool stopped by a limit. `kind` is "time", "cpu" or "memory"."""
+
+    def __init__(self, kind, limit, returncode, cmd, output=None, stderr=None):
+        super().__init__(returncode, cmd, output=output, stderr=stderr)
+        self.kind = kind
+        self.limit = limit
+
+    def __str__(self):
+        tool = os.path.basename(str(self.cmd[0] if isinstance(self.cmd, (list, tuple)) else self.cmd))
+        if self.kind == "time":
+            return f"{tool} was stopped after running for {self.limit}s (SCRIPTORIUM_TIMEOUT)"
+        if self.kind == "cpu":
+            return f"{tool} used up its {self.limit}s of CPU time (SCRIPTORIUM_CPU_SECONDS)"
+        return f"{tool} ran out of its {self.limit} MB of memory (SCRIPTORIUM_MEMORY_MB)"
+
+
+def report(error):
+    """Prints a ResourceLimitError the way the builders report failures."""
+    print(f"🛑 Resource limit: {error}.")
+    print("   The note being built is probably malformed; raise the limit if it is just big.")
+    if getattr(error, "tex_path", None):
+        print(f"   The generated LaTeX was kept at: {error.tex_path}")
+    tail = _text(error.stderr) or _text(error.output)
+    if tail:
+        print("\n--- End of the Tool's Output ---")
+        print("\n".join(tail.splitlines()[-20:]))
+
+
+def limited(command, limits, env=None):
+    """
+    `command`, run through this module (as a script) when `limits` include
+    rlimits: it sets them and then execs the tool. That is done in a fresh
+    interpreter rather than in a preexec_fn, which is unsafe while other
+    threads run (the builders convert several files at once from thread
+    pools). Raises FileNotFoundError for a tool that is not on the PATH of
+    `env` (default: this process's), as Popen would.
+    """
+    if not (limits.cpu_seconds or limits.memory_mb):
+        return list(command)
+    if shutil.which(command[0], path=(env if env is not None else os.environ).get("PATH")) is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), command[0])
+    return [
+        # -I -S: nothing from scripts/common/ or site-packages can shadow the stdlib.
+        sys.executable, "-I", "-S", os.path.abspath(__file__),
+        str(limits.cpu_seconds), str(limits.memory_mb), "--",
+    ] + list(command)
+
+
+def popen_options(limits):
+    """Popen keyword arguments starting a tool in its own group (session)."""
+    return {"start_new_session": True}
+
+
+def stop(process):
+    """Stops `process` and everything in its group: SIGTERM, then SIGKILL."""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    try:
+        process.wait(timeout=GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+
+
+def _on_sigterm(signum, frame):
+    # Unwinds like Ctrl-C, so the running tool's group is stopped on the way out.
+    raise SystemExit(128 + signum)
+
+
+def cancel_on_sigterm():
+    """
+    Makes SIGTERM end this process through SystemExit. Tools run in their
+    own sessions, so a signal to the builder's group no longer reaches them;
+    the exception lets run() and run_engine() stop them first.
+    """
+    if threading.current_thread() is threading.main_thread():
+        if signal.getsignal(signal.SIGTERM) is signal.SIG_DFL:
+            signal.signal(signal.SIGTERM, _on_sigterm)
+
+
+def _text(output):
+    if isinstance(output, bytes):
+        return output.decode("utf-8", "replace")
+    return output or ""
+
+
+def exceeded(returncode, output, limits):
+    """The limit a finished tool ran into ("cpu" or "memory"), or None."""
+    if returncode == 0:
+        return None
+    # Only SIGXCPU is the CPU limit: a SIGKILL may as well come from the OOM
+    # killer or from stop().
+    if limits.cpu_seconds and returncode == -signal.SIGXCPU:
+        return "cpu"
+    if limits.memory_mb and output and MEMORY_REGEX.search(output):
+        return "memory"
+    return None
+
+
+def run(command, input=None, check=False, capture_output=False, **kwargs):
+    """
+    subprocess.run() under the configured limits. Raises ResourceLimitError
+    when the tool hits one, before `check` is considered.
+    """
+    limits = current()
+    cancel_on_sigterm()
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    with subprocess.Popen(limited(command, limits, kwargs.get("env")), **popen_options(limits), **kwargs) as process:
+        try:
+            stdout, stderr = process.communicate(input, timeout=limits.timeout or None)
+        except subprocess.TimeoutExpired:
+            stop(process)
+            stdout, stderr = process.communicate()
+            raise ResourceLimitError(
+                "time", limits.timeout, process.returncode, command, stdout, stderr
+            ) from None
+        except BaseException:
+            stop(process)
+            raise
+    returncode = process.returncode
+    kind = exceeded(returncode, _text(stderr) + "\n" + _text(stdout), limits)
+    if kind:
+        limit = limits.cpu_seconds if kind == "cpu" else limits.memory_mb
+        raise ResourceLimitError(kind, limit, returncode, command, stdout, stderr)
+    if check and returncode:
+        raise subprocess.CalledProcessError(returncode, command, output=stdout, stderr=stderr)
+    return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+
+def _exec_limited(argv):
+    """The wrapper of limited(): `cpu_seconds memory_mb -- command...`."""
+    import resource
+
+    cpu_seconds, memory_mb, command = int(argv[0]), int(argv[1]), argv[3:]
+    if cpu_seconds:
+        # SIGXCPU at the soft limit; SIGKILL at the hard one if it is ignored.
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + GRACE_SECONDS))
+    if memory_mb:
+        size = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (size, size))
+    os.execvp(command[0], command)
+
+
+if __name__ == "__main__":
+    _exec_limited(sys.argv[1:])
@@ -0,0 +1,376 @@
+"""
+Checks notes for content that breaks a build, before the build starts.
+
+Most failed builds come from the notes rather than the templates, and each
+problem used to show up only when a long LaTeX run failed. These checks take
+a fraction of a second and give the note and line:
+
+  * inline math: pandoc sets the text between two `$` as math (a `$` before
+    a non-space up to a `$` after one, not followed by a digit). A `#`, `&`
+    or `%` in it stops LaTeX, and math fonts have no Arabic (errors). Plain
+    words between two dollar signs are probably prices (a warning).
+  * raw LaTeX: pandoc escapes `%`, `&` and `#` in prose, but passes the
+    arguments of commands such as \\textit{...} to LaTeX as they are.
+  * parentheses: italicize.py italicizes `(...)` line by line without
+    nesting, so nested or unclosed parentheses pair wrongly (warnings).
+  * images: a `![](path)` that is not found stops LaTeX. An `![[embed]]` of
+    a missing image or note only prints its name (a warning).
+  * the '00' overview of a course, which study-notes.py builds the title
+    page from: its YAML frontmatter must parse, and its `matn` goes into
+    \\textit{} as it is. Missing keys are printed as "N/A" (warnings).
+
+Code blocks, inline code and YAML frontmatter are not checked. With enough
+files, the checks run in a pool of processes, one per CPU.
+
+The builders run the checks before pandoc with --lint, or whenever
+SCRIPTORIUM_LINT=1 is set. Errors stop the build with EXIT_CODE; warnings are
+only printed. scripts/lint-notes.py runs them on their own.
+"""
+
+import collections
+import os
+import re
+import time
+from datetime import datetime
+from urllib.parse import unquote
+
+from common.arabic import ARABIC_ANY
+from common.images import locate
+from common.obsidian import IMAGE_EXTENSIONS, WIKILINK_REGEX, VaultIndex, find_vault_root
+
+# The exit code of a build stopped by the lint: sysexits' EX_DATAERR.
+EXIT_CODE = 65
+
+# Below this many files, starting a process pool costs more than it saves.
+PARALLEL_MIN_FILES = 200
+
+# The overview keys study-notes.py prints on the title page.
+OVERVIEW_KEYS = ("course_name", "instructor", "institute", "matn", "author")
+
+# Commands whose first argument is a URL or path, where `#`, `%` and `&` are fine.
+URL_COMMANDS = {"url", "href", "path", "includegraphics", "input", "include"}
+
+ERROR, WARNING = "error", "warning"
+
+Diagnostic = collections.namedtuple("Diagnostic", "path line severity message")
+
+FRONTMATTER_REGEX = re.compile(r"\A---\n.*?^(?:---|\.\.\.)[ \t]*$", re.MULTILINE | re.DOTALL)
+# Fenced code, and raw LaTeX environments (tabular, align, ...), which may use & and # freely.
+SKIPPED_BLOCK_REGEX = re.compile(
+    r"^[ \t]*(?:(`{3,}|~{3,}).*?(?:^[ \t]*\1[^\n]*|\Z)|\\begin\{([^}\n]+)\}.*?(?:\\end\{\2\}[^\n]*|\Z))",
+    re.MULTILINE | re.DOTALL,
+)
+INLINE_CODE_REGEX = re.compile(r"(`+).+?\1")
+DISPLAY_MATH_REGEX = re.compile(r"\$\$.*?\$\$")
+# pandoc's tex_math_dollars: no space inside either `$`, no digit after the closing one.
+INLINE_MATH_REGEX = re.compile(r"(?<![\\$])\$(?=[^\s$])((?:\\.|[^$\\\n])*?[^\s\\$])\$(?![\d$])")
+MATH_SPECIAL_REGEX = re.compile(r"(?<!\\)[#&%]")
+ARABIC_REGEX = re.compile(f"[{ARABIC_ANY}]")
+PROSE_REGEX = re.compile(r"(?<![\\A-Za-z])[A-Za-z]{2,}(?:[\s,]+[A-Za-z]{2,}){2,}")
+COMMAND_REGEX = re.compile(r"(?<!\\)\\([A-Za-z]+)\*?\s*(?:\[[^\]]*\]\s*)?\{")
+RAW_SPECIAL_REGEX = re.compile(r"(?<!\\)[#&%]")
+# The target of an `![[embed]]`, without its heading, block or size.
+EMBED_REGEX = re.compile(r"!\[\[([^\[\]\n#^|]*)[^\[\]\n]*\]\]")
+# A link or image target, with one level of parentheses inside it.
+LINK_TARGET_REGEX = re.compile(r"\]\((?:<[^>\n]*>|[^()\s]*(?:\([^()\s]*\)[^()\s]*)*)(?:[ \t]+\"[^\"\n]*\")?\)")
+IMAGE_REGEX = re.compile(r"!\[[^\]\n]*\]\([ \t]*(<[^>\n]*>|[^)\s]+)")
+# Two `(` without a `)` between them; a line whose last parenthesis is a `(`.
+NESTED_PAREN_REGEX = re.compile(r"\([^()\n]*\(")
+UNCLOSED_PAREN_REGEX = re.compile(r"\([^()\n]*$", re.MULTILINE)
+
+
+def add_argument(parser):
+    """Adds the builders' --lint option to an argparse parser."""
+    parser.add_argument(
+        "--lint",
+        action="store_true",
+        help="Check the notes for content that would break the build before\n"
+        "running pandoc, and stop on errors (see common/lint.py).\n"
+        "Also enabled when SCRIPTORIUM_LINT=1 is set.",
+    )
+
+
+def enabled(flag=False):
+    """Returns True if this build should be linted first."""
+    return flag or os.environ.get("SCRIPTORIUM_LINT", "") not in ("", "0")
+
+
+def _blank(match):
+    # Keeps the line breaks, so later matches still know their line.
+    return "\n" * match.group().count("\n")
+
+
+def _line(text, position):
+    return text.count("\n", 0, position) + 1
+
+
+def _arguments(text, start):
+    """The text of the brace group opening at text[start - 1], or None if it does not close on its line."""
+    depth = 1
+    index = start
+    while index < len(text):
+        char = text[index]
+        if char == "\\":
+            index += 2
+            continue
+        if char == "\n":
+            return None
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:index]
+        index += 1
+    return None
+
+
+def _check_math(text, report):
+    for match in INLINE_MATH_REGEX.finditer(text):
+        math = match.group(1)
+        shown = match.group()[:40]
+        special = MATH_SPECIAL_REGEX.search(math)
+        if special:
+            report(_line(text, match.start()), ERROR, f"`{special.group()}` inside the math `{shown}` "
+                   "stops LaTeX; if the `$` are dollar signs, write \\$")
+        elif ARABIC_REGEX.search(math):
+            report(_line(text, match.start()), ERROR, f"Arabic inside the math `{shown}` cannot be "
+                   "typeset; if the `$` are dollar signs, write \\$")
+        elif PROSE_REGEX.search(math):
+            report(_line(text, match.start()), WARNING, f"the text `{shown}` is set as math; "
+                   "write \\$ for a dollar sign")
+
+
+def _check_raw_latex(text, report):
+    for match in COMMAND_REGEX.finditer(text):
+        argument = _arguments(text, match.end())
+        if argument is None or match.group(1) in URL_COMMANDS:
+            continue
+        special = RAW_SPECIAL_REGEX.search(argument)
+        if special:
+            report(_line(text, match.start()), ERROR, f"`{special.group()}` in the raw LaTeX "
+                   f"`\\{match.group(1)}{{...}}` reaches LaTeX unescaped; write \\{special.group()}")
+
+
+def _check_parentheses(text, report):
+    # One warning of each kind per line is enough.
+    for regex, message in (
+        (NESTED_PAREN_REGEX, "nested parentheses: italicize.py would close the italics at the first `)`"),
+        (UNCLOSED_PAREN_REGEX, "`(` not closed on the same line; italicize.py only pairs them within a line"),
+    ):
+        reported = set()
+        for match in regex.finditer(text):
+            number = _line(text, match.start())
+            if number not in reported:
+                reported.add(number)
+                report(number, WARNING, message)
+
+
+def check_text(text, path, search_dirs=()):
+    """
+    Diagnostics for one note. Also returns the (line, target) of its
+    ![[embeds]], which are looked up in the vault by the caller.
+
+    Each check is a regular expression over the whole note, and what the
+    later checks must not see (code, math, links) is blanked out in turn,
+    keeping the line breaks. A line number is only worked out for a match.
+    """
+    diagnostics = []
+    embeds = []
+
+    def report(number, severity, message):
+        diagnostics.append(Diagnostic(path, number, severity, message))
+
+    if text.startswith("---\n"):
+        text = FRONTMATTER_REGEX.sub(_blank, text, count=1)
+    if "```" in text or "~~~" in text or "\\begin{" in text:
+        text = SKIPPED_BLOCK_REGEX.sub(_blank, text)
+    if "`" in text:
+        text = INLINE_CODE_REGEX.sub(" ", text)
+    if "$" in text:
+        text = DISPLAY_MATH_REGEX.sub(" ", text)
+        _check_math(text, report)
+        text = INLINE_MATH_REGEX.sub(" ", text)
+    if "[[" in text:
+        for match in EMBED_REGEX.finditer(text):
+            target = match.group(1).strip()
+            if target:
+                embeds.append((_line(text, match.start()), target))
+        text = WIKILINK_REGEX.sub(" ", text)
+    if "\\" in text:
+        _check_raw_latex(text, report)
+    if "](" in text:
+        for match in IMAGE_REGEX.finditer(text):
+            url = match.group(1).strip("<>")
+            if "://" in url or url.startswith(("data:", "#")):
+                continue
+            if locate(url, search_dirs) is None and locate(unquote(url), search_dirs) is None:
+                report(_line(text, match.start()), ERROR, f"image not found: {url}")
+        text = LINK_TARGET_REGEX.sub(" ", text)
+    if "(" in text:
+        _check_parentheses(text, report)
+    diagnostics.sort(key=lambda d: d.line)
+    return diagnostics, embeds
+
+
+def _frontmatter_line(frontmatter, key):
+    """
+    The file line of `key` in `frontmatter`, or 1. The frontmatter is the
+    text after the opening `---`, so it starts on file line 1.
+    """
+    match = re.search(rf"^{re.escape(key)}\s*:", frontmatter, re.MULTILINE)
+    return frontmatter[: match.start()].count("\n") + 1 if match else 1
+
+
+def check_overview(text, path):
+    """Diagnostics for the '00' overview, read as study-notes.py reads it."""
+    diagnostics = []
+
+    def report(number, severity, message):
+        diagnostics.append(Diagnostic(path, number, severity, message))
+
+    parts = text.split("---", 2)
+    if len(parts) < 3 or parts[0].strip():
+        report(1, ERROR, "no YAML frontmatter (--- ... ---) at the top, which study-notes.py needs")
+        return diagnostics
+    try:
+        import yaml
+    except ImportError:
+        report(1, WARNING, "frontmatter not checked: PyYAML is not installed")
+        return diagnostics
+    try:
+        metadata = yaml.safe_load(parts[1])
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        problem = getattr(e, "problem", None) or str(e).splitlines()[0]
+        report(mark.line + 1 if mark else 1, ERROR, f"the frontmatter is not valid YAML: {problem}")
+        return diagnostics
+    if not isinstance(metadata, dict):
+        report(1, ERROR, "the frontmatter is not a list of `key: value` lines")
+        return diagnostics
+
+    for key in OVERVIEW_KEYS:
+        if metadata.get(key) in (None, ""):
+            shown = "Untitled Course" if key == "course_name" else "N/A"
+            report(1, WARNING, f"no `{key}` in the frontmatter; the title page shows {shown}")
+    created = str(metadata.get("created", ""))
+    try:
+        datetime.strptime(created, "%Y-%m-%d")
+    except ValueError:
+        if not created:
+            report(1, WARNING, "no `created` in the frontmatter; the title page leaves the date empty")
+        else:
+            report(
+                _frontmatter_line(parts[1], "created"),
+                WARNING,
+                f"`created: {created}` is not a YYYY-MM-DD date; it is printed as it is",
+            )
+    matn = str(metadata.get("matn", ""))
+    special = RAW_SPECIAL_REGEX.search(matn)
+    if special or _arguments(matn + "}", 0) != matn:
+        problem = f"`{special.group()}`" if special else "an unbalanced brace"
+        report(
+            _frontmatter_line(parts[1], "matn"),
+            ERROR,
+            f"`matn` has {problem}, and goes into \\textit{{}} unescaped",
+        )
+    return diagnostics
+
+
+def _check_file(job):
+    path, search_dirs, overview = job
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        return [Diagnostic(path, 1, ERROR, f"cannot be read: {e}")], []
+    diagnostics, embeds = check_text(text, path, [os.path.dirname(path)] + list(search_dirs))
+    if overview:
+        diagnostics = check_overview(text, path) + diagnostics
+    return diagnostics, embeds
+
+
+def lint(paths, search_dirs=(), overviews=(), workers=None):
+    """
+    Checks the notes at `paths`, and those also in `overviews` as course
+    overviews, in parallel when there are many. Images are looked for next to each note,
+    then in `search_dirs`. Returns the diagnostics, in file and line order.
+    """
+    workers = workers or os.cpu_count() or 1
+    search_dirs = [os.path.abspath(d) for d in search_dirs]
+    overviews = set(overviews)
+    jobs = [(path, search_dirs, path in overviews) for path in paths]
+    if workers > 1 and len(jobs) >= PARALLEL_MIN_FILES:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_check_file, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+    else:
+        results = [_check_file(job) for job in jobs]
+
+    diagnostics = []
+    indexes = {}
+    for (path, _, _), (found, embeds) in zip(jobs, results):
+        diagnostics.extend(found)
+        if not embeds:
+            continue
+        # The vault index is cached on disk, so only the first lookup pays for it.
+        vault_root = find_vault_root(path)
+        if vault_root not in indexes:
+            indexes[vault_root] = VaultIndex(vault_root)
+        for number, target in embeds:
+            if indexes[vault_root].lookup(target) is None:
+                kind = "image" if os.path.splitext(target)[1].lower() in IMAGE_EXTENSIONS else "note"
+                diagnostics.append(
+                    Diagnostic(path, number, WARNING, f"embedded {kind} not found in the vault: {target}")
+                )
+    order = {path: index for index, path in enumerate(paths)}
+    diagnostics.sort(key=lambda d: (order.get(d.path, -1), d.line))
+    return diagnostics
+
+
+def report(diagnostics, limit=None, relative=False):
+    """
+    Prints diagnostics as `note:line: message`, at most `limit` of them. The
+    note is shown by name, or with `relative` by its path from the current
+    folder (the full path for notes outside it).
+    """
+    for diagnostic in diagnostics[:limit]:
+        icon = "❌" if diagnostic.severity == ERROR else "⚠️ "
+        path = os.path.basename(diagnostic.path)
+        if relative:
+            path = os.path.relpath(diagnostic.path)
+            if path.startswith(".."):
+                path = diagnostic.path
+        print(f"{icon} {path}:{diagnostic.line}: {diagnostic.message}")
+    if limit is not None and len(diagnostics) > limit:
+        print(f"   ... and {len(diagnostics) - limit} more (scriptorium lint shows them all).")
+
+
+def summary(diagnostics):
+    """(errors, warnings) in `diagnostics`."""
+    errors = sum(1 for d in diagnostics if d.severity == ERROR)
+    return errors, len(diagnostics) - errors
+
+
+def gate(paths, search_dirs=(), overviews=(), flag=False):
+    """
+    Lints the notes of a build if it asked for it (--lint, SCRIPTORIUM_LINT).
+    Returns False if an error means the build should stop.
+    """
+    if not enabled(flag):
+        return True
+    started = time.perf_counter()
+    diagnostics = lint(paths, search_dirs, overviews)
+    seconds = time.perf_counter() - started
+    report(diagnostics, limit=50)
+    errors, warnings = summary(diagnostics)
+    if errors:
+        print(f"❌ ERROR: The lint found {errors} error(s) and {warnings} warning(s) "
+              f"in {len(paths)} note(s); fix them, or build without --lint.")
+        return False
+    if warnings:
+        print(f"⚠️  Lint: {warnings} warning(s) in {len(paths)} note(s) ({seconds:.2f}s).")
+    else:
+        print(f"✅ Lint: no problems in {len(paths)} note(s) ({seconds:.2f}s).")
+    return True
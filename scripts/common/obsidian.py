@@ -0,0 +1,284 @@
+"""
+Resolves Obsidian-flavoured Markdown into plain Markdown that pandoc handles.
+
+Obsidian notes use `[[wikilinks]]`, `![[embeds]]` (transclusions) and
+`> [!note]` callouts, none of which pandoc understands. This module rewrites
+them before the notes are handed to pandoc:
+
+  [[Note]], [[Note|alias]], [[Note#Heading]]  -> the link text
+  ![[Note]], ![[Note#Heading]], ![[Note^id]] -> the embedded note/section/block
+  ![[image.png]], ![[image.png|300]]          -> a Markdown image
+  > [!note] Title                              -> a blockquote with a bold title
+
+Link targets are looked up in a name-to-path index of the whole vault, which
+is built once and cached on disk until a folder in the vault changes. Embed
+expansions are memoised, so a note embedded fifty times in a compilation is
+read and converted once, and embed cycles are cut with a warning.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from common import BUILD_DIR
+
+# `![[...]]` or `[[...]]`, without crossing line breaks or nested brackets.
+WIKILINK_REGEX = re.compile(r"(!?)\[\[([^\[\]\n]+?)\]\]")
+
+# `> [!type]`, optionally folded (`-`/`+`) and followed by a title.
+CALLOUT_REGEX = re.compile(r"^(\s*>\s*)\[!([\w-]+)\][+-]?\s*(.*)$")
+
+# A block identifier at the end of a paragraph or list item: `... ^my-block`.
+BLOCK_ID_REGEX = re.compile(r"\s\^([\w-]+)\s*$")
+
+HEADING_REGEX = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+
+# What a line is nested in: block quote markers, indentation and a list
+# item's marker (`- `, `1. `). An embed on that line gets the same nesting.
+CONTAINER_REGEX = re.compile(r"^((?:[ \t]*>[ \t]?)*)([ \t]*)((?:[-*+]|\d+[.)])[ \t]+)?")
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".bmp", ".pdf"}
+
+# Folders that belong to Obsidian or git rather than to the notes.
+SKIPPED_DIRS = {".obsidian", ".git", ".trash"}
+
+
+def strip_frontmatter(content):
+    """Returns `content` without a leading YAML frontmatter block."""
+    if content.startswith("---"):
+        parts = content.split("---", 2)
+        if len(parts) >= 3:
+            return parts[2].lstrip()
+    return content
+
+
+def find_vault_root(path):
+    """
+    Returns the nearest enclosing folder that contains `.obsidian/`, or the
+    folder of `path` itself when it is not inside a vault.
+    """
+    start = os.path.abspath(path if os.path.isdir(path) else os.path.dirname(path))
+    current = start
+    while True:
+        if os.path.isdir(os.path.join(current, ".obsidian")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return start
+        current = parent
+
+
+class VaultIndex:
+    """
+    Maps link targets to files: by vault-relative path (without `.md`) and by
+    bare file name, both lowercased as Obsidian matches case-insensitively.
+    """
+
+    def __init__(self, vault_root):
+        self.vault_root = os.path.abspath(vault_root)
+        digest = hashlib.sha1(self.vault_root.encode("utf-8")).hexdigest()[:16]
+        self.cache_file = os.path.join(BUILD_DIR, f"vault-index-{digest}.json")
+        self.entries = self._load_cached()
+        if self.entries is None:
+            self.entries, dir_mtimes = self._scan()
+            self._save(dir_mtimes)
+
+    def _load_cached(self):
+        """Returns the cached entries, or None if any vault folder changed since."""
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Adding, removing or renaming a file updates its folder's mtime, so
+        # checking folders (not files) is enough to know the index is current.
+        for directory, mtime_ns in cached["dirs"].items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime_ns:
+                    return None
+            except OSError:
+                return None
+        return cached["entries"]
+
+    def _scan(self):
+        entries = {}
+        dir_mtimes = {}
+        for directory, dirnames, filenames in os.walk(self.vault_root):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIPPED_DIRS)
+            dir_mtimes[directory] = os.stat(directory).st_mtime_ns
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                relative = os.path.relpath(path, self.vault_root).replace(os.sep, "/")
+                stem, ext = os.path.splitext(relative)
+                keys = [relative.lower(), filename.lower()]
+                if ext.lower() == ".md":
+                    keys += [stem.lower(), os.path.splitext(filename)[0].lower()]
+                for key in keys:
+                    # The first match wins, like Obsidian's shortest-path rule
+                    # for duplicate names (the walk visits shallow folders first).
+                    entries.setdefault(key, path)
+        return entries, dir_mtimes
+
+    def _save(self, dir_mtimes):
+        os.makedirs(BUILD_DIR, exist_ok=True)
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"dirs": dir_mtimes, "entries": self.entries}, f)
+        os.replace(tmp_path, self.cache_file)
+
+    def lookup(self, target):
+        """Returns the file a link target points to, or None."""
+        return self.entries.get(target.strip().lower())
+
+
+class Resolver:
+    """Rewrites wikilinks, embeds and callouts for the notes of one vault."""
+
+    def __init__(self, vault_root):
+        self.index = VaultIndex(vault_root)
+        self._expanded = {}  # (path, fragment) -> resolved Markdown
+        self._stack = []  # embeds currently being expanded, for cycle detection
+        self.warnings = []
+
+    def resolve(self, content):
+        """Returns `content` with all Obsidian syntax rewritten."""
+        lines = []
+        in_fence = False
+        for line in content.split("\n"):
+            if line.lstrip().startswith(("```", "~~~")):
+                in_fence = not in_fence
+            if not in_fence:
+                prefix = _continuation_prefix(line)
+                line = BLOCK_ID_REGEX.sub("", line)
+                line = self._resolve_callout(line)
+                line = WIKILINK_REGEX.sub(lambda m: self._resolve_link(m, prefix), line)
+            lines.append(line)
+        return "\n".join(lines)
+
+    def resolve_file(self, path):
+        """Reads a note and resolves it, memoised like any other embed."""
+        return self._expand(os.path.abspath(path), "")
+
+    def _resolve_callout(self, line):
+        match = CALLOUT_REGEX.match(line)
+        if not match:
+            return line
+        prefix, kind, title = match.groups()
+        title = title or kind.replace("-", " ").capitalize()
+        return f"{prefix}**{title}**\n{prefix.rstrip()}"
+
+    def _resolve_link(self, match, prefix=""):
+        is_embed, inner = match.groups()
+        target, _, alias = inner.partition("|")
+        name, fragment = re.match(r"([^#^]*)(.*)", target.strip()).groups()
+
+        if not is_embed:
+            if alias:
+                return alias.strip()
+            # Obsidian displays [[Note#Heading]] as "Note > Heading".
+            parts = [name.strip()] + [p for p in re.split(r"[#^]", fragment) if p]
+            return " > ".join(p for p in parts if p)
+
+        path = self.index.lookup(name) if name else (self._stack[-1][0] if self._stack else None)
+        if path is None:
+            self.warnings.append(f"Embed target not found: {inner}")
+            return f"*{inner}*"
+
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+            # `![[image.png|300]]` sets the display width in pixels.
+            width = alias.strip()
+            attributes = f"{{width={width}px}}" if width.isdigit() else ""
+            return f"![](<{path}>){attributes}"
+
+        # Embedded notes are block content; blank lines keep them from being
+        # glued onto the surrounding paragraph. Every line is nested like the
+        # embed, so one inside a quote or list item stays inside it.
+        blank = prefix.rstrip()
+        content = "\n".join(
+            prefix + line if line.strip() else blank
+            for line in self._expand(path, fragment).split("\n")
+        )
+        before = match.string[: match.start()]
+        container = CONTAINER_REGEX.match(before)
+        if container.group(3) and container.end() == len(before):
+            # The embed starts a list item: its first line stays on the
+            # marker's line, since an item cannot start with blank lines.
+            return f"{content[len(prefix):]}\n{blank}\n{prefix}"
+        return f"\n{blank}\n{content}\n{blank}\n{prefix}"
+
+    def _expand(self, path, fragment):
+        key = (path, fragment)
+        if key in self._expanded:
+            return self._expanded[key]
+        if key in self._stack:
+            cycle = " -> ".join(os.path.basename(p) + f for p, f in self._stack + [key])
+            self.warnings.append(f"Embed cycle cut: {cycle}")
+            return f"*{os.path.splitext(os.path.basename(path))[0]}{fragment}*"
+
+        self._stack.append(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                content = strip_frontmatter(f.read())
+            resolved = self.resolve(_select_fragment(content, fragment)).strip("\n")
+        except OSError as e:
+            self.warnings.append(f"Could not read embedded note '{path}': {e}")
+            resolved = ""
+        finally:
+            self._stack.pop()
+
+        self._expanded[key] = resolved
+        return resolved
+
+
+def _continuation_prefix(line):
+    """The prefix that continues `line`'s quote or list item on a new line."""
+    quote, indent, marker = CONTAINER_REGEX.match(line).groups()
+    return quote + indent + " " * len(marker or "")
+
+
+def _select_fragment(content, fragment):
+    """Returns the part of a note that `#Heading` or `^block-id` refers to."""
+    if not fragment:
+        return content
+
+    lines = content.split("\n")
+    if fragment.startswith("^"):
+        block_id = fragment[1:]
+        for i, line in enumerate(lines):
+            match = BLOCK_ID_REGEX.search(line)
+            if match and match.group(1) == block_id:
+                # The block is the paragraph that ends with the identifier.
+                start = i
+                while start > 0 and lines[start - 1].strip():
+                    start -= 1
+                block = lines[start : i + 1]
+                block[-1] = BLOCK_ID_REGEX.sub("", block[-1])
+                return "\n".join(block)
+        return ""
+
+    # `#Heading#Subheading`: the last heading is the one that is embedded.
+    heading = fragment.split("#")[-1].strip().lower()
+    for i, line in enumerate(lines):
+        match = HEADING_REGEX.match(line)
+        if match and match.group(2).strip().lower() == heading:
+            level = len(match.group(1))
+            end = i + 1
+            while end < len(lines):
+                next_match = HEADING_REGEX.match(lines[end])
+                if next_match and len(next_match.group(1)) <= level:
+                    break
+                end += 1
+            return "\n".join(lines[i:end])
+    return ""
+
+
+_resolvers = {}
+
+
+def resolver_for(path):
+    """Returns the (shared, memoising) Resolver of the vault containing `path`."""
+    vault_root = find_vault_root(path)
+    if vault_root not in _resolvers:
+        _resolvers[vault_root] = Resolver(vault_root)
+    return _resolvers[vault_root]
@@ -0,0 +1,223 @@
+"""
+Conversions through a long-lived `pandoc server` instead of a fresh pandoc.
+
+Every `pandoc` process pays its startup before converting anything, which
+dominates batch runs of small documents. `pandoc server` (pandoc 3.x) keeps
+one process running and takes conversion requests as JSON over HTTP:
+
+  pandoc server --port 3030
+
+When a server answers at SCRIPTORIUM_PANDOC_SERVER (default
+http://127.0.0.1:3030), convert() sends the request there over a small pool
+of keep-alive connections. At most SCRIPTORIUM_PANDOC_POOL (default 4)
+requests are in flight per process; further callers wait for a free slot.
+When no server answers, convert() runs pandoc as a subprocess, so callers
+never have to check.
+
+The server is pure: it reads no files and runs no filters or PDF engines.
+So the template is sent as text, the Python filters (common.warm_filter)
+are applied here to the JSON AST between two requests, and the engine is
+run by common.latex.compile_pdf().
+"""
+
+import json
+import os
+import sys
+import threading
+
+from common import limits, warm_filter
+
+SERVER_URL = os.environ.get("SCRIPTORIUM_PANDOC_SERVER", "http://127.0.0.1:3030")
+
+# Concurrent requests (and kept-alive connections) per process.
+POOL_SIZE = int(os.environ.get("SCRIPTORIUM_PANDOC_POOL", "4"))
+
+# How long to wait for the server to accept a connection, and for an answer.
+CONNECT_TIMEOUT = 0.5
+REQUEST_TIMEOUT = 300
+
+
+class PandocError(Exception):
+    """A conversion the server (or the pandoc subprocess) rejected."""
+
+
+class ConnectionPool:
+    """A bounded pool of keep-alive HTTP connections to one server."""
+
+    def __init__(self, url, size):
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 3030
+        self.base_path = parts.path.rstrip("/")
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import http.client
+
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=CONNECT_TIMEOUT)
+        conn.connect()
+        # Only the connect is short; a large book may take a while to convert.
+        conn.sock.settimeout(REQUEST_TIMEOUT)
+        return conn
+
+    def _send(self, conn, method, path, body):
+        headers = {"Accept": "application/json"}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        conn.request(method, self.base_path + path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    def request(self, method, path, body=None):
+        """Sends one request and returns (status, body bytes)."""
+        import http.client
+
+        with self._slots:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            try:
+                try:
+                    status, data = self._send(conn, method, path, body)
+                except (http.client.HTTPException, ConnectionError):
+                    # The server may have closed an idle keep-alive connection;
+                    # conversions are idempotent, so retry once on a fresh one.
+                    conn.close()
+                    if not reused:
+                        raise
+                    conn = self._connect()
+                    status, data = self._send(conn, method, path, body)
+            except BaseException:
+                conn.close()
+                raise
+            with self._lock:
+                self._idle.append(conn)
+            return status, data
+
+
+_pool = None
+_available = None
+_state_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _state_lock:
+        if _pool is None:
+            _pool = ConnectionPool(SERVER_URL, POOL_SIZE)
+        return _pool
+
+
+def available():
+    """Returns True if a pandoc server answers at SERVER_URL (checked once per process)."""
+    import http.client
+
+    global _available
+    if _available is None:
+        try:
+            status, _ = _get_pool().request("GET", "/version")
+            _available = status == 200
+        except (OSError, http.client.HTTPException, ValueError):
+            # Nothing there, or something that does not speak HTTP like pandoc.
+            _available = False
+    return _available
+
+
+def _server_convert(text, from_format, to_format, standalone=False, template=None, variables=None):
+    request = {"text": text, "from": from_format, "to": to_format, "standalone": standalone}
+    if template is not None:
+        request["template"] = template
+    if variables:
+        request["variables"] = variables
+    status, data = _get_pool().request("POST", "/", json.dumps(request).encode("utf-8"))
+    if status != 200:
+        raise PandocError(data.decode("utf-8", "replace").strip())
+    result = json.loads(data)
+    if "error" in result:
+        raise PandocError(result["error"])
+    return result["output"]
+
+
+_filter_modules = {}
+_filter_lock = threading.Lock()
+
+
+def _apply_filters(ast_text, filters, output_format, metadata):
+    for name in filters:
+        with _filter_lock:
+            if name not in _filter_modules:
+                _filter_modules[name] = warm_filter.load_filter(name)
+        ast_text = warm_filter.apply_filter(
+            _filter_modules[name], ast_text, output_format, metadata
+        )
+    return ast_text
+
+
+def _subprocess_convert(
+    text, from_format, to_format, standalone, template_path, variables, filters, metadata
+):
+    command = ["pandoc", "--from", from_format, "--to", to_format]
+    if standalone:
+        command.append("--standalone")
+    if template_path:
+        command.append(f"--template={template_path}")
+    for key, value in (variables or {}).items():
+        command.append(f"--variable={key}:{value}")
+    for key, value in (metadata or {}).items():
+        command.append(f"--metadata={key}:{value}")
+    for name in filters:
+        command.append(f"--filter={warm_filter.CLIENTS.get(name, warm_filter.FILTERS[name])}")
+    result = limits.run(command, input=text, capture_output=True, text=True, encoding="utf-8")
+    if result.returncode != 0:
+        raise PandocError(result.stderr.strip())
+    # Warnings and the filters' reports (e.g. what normalize-arabic changed).
+    if result.stderr:
+        sys.stderr.write(result.stderr)
+    return result.stdout
+
+
+def convert(
+    text,
+    from_format="markdown",
+    to_format="latex",
+    standalone=False,
+    template_path=None,
+    variables=None,
+    filters=(),
+    metadata=None,
+):
+    """
+    Converts `text` and returns the output as a string.
+
+    `filters` are names from common.warm_filter.FILTERS, applied in order.
+    `variables` are template variables with string values, and `metadata`
+    string metadata for the filters (e.g. image-search-path).
+    """
+    import http.client
+
+    global _available
+    if available():
+        template = None
+        if template_path:
+            with open(template_path, "r", encoding="utf-8") as f:
+                template = f.read()
+        try:
+            if filters:
+                ast_text = _server_convert(text, from_format, "json")
+                ast_text = _apply_filters(ast_text, filters, to_format, metadata)
+                return _server_convert(ast_text, "json", to_format, standalone, template, variables)
+            return _server_convert(text, from_format, to_format, standalone, template, variables)
+        except (OSError, http.client.HTTPException, ValueError):
+            # The server went away mid-run, or sent a truncated or garbled
+            # answer; finish the batch without it.
+            _available = False
+    return _subprocess_convert(
+        text, from_format, to_format, standalone, template_path, variables, filters, metadata
+    )
+
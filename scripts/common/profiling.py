@@ -0,0 +1,199 @@
+"""
+Opt-in profiling of LuaLaTeX runs, page by page and font by font.
+
+When a book is slow to typeset, the engine's total time does not say whether
+the cost is Arabic shaping on some pages, one huge longtable, or font
+loading. With `--profile`, compile_pdf() instruments the generated LaTeX:
+
+  * scripts/latex/profile.lua is loaded before \\documentclass. Its callbacks
+    record the CPU time, node and glyph counts and Lua memory of every
+    shipped page, and the time of every font load.
+  * Each source marker (see common/latex.py) gets a \\directlua call in
+    front of it, so every record knows the note and line being typeset.
+
+This works with any template (article.tex, litany.tex, or pandoc's default
+template for the tafsir) because it goes into the generated LaTeX rather
+than into the templates. Profile.report() merges the records of the last
+pass by note, and save() keeps them as JSON in build/profiles/.
+"""
+
+import json
+import os
+import shutil
+
+from common import BUILD_DIR, SCRIPTS_DIR
+from common.latex import MARKER_PREFIX
+
+LUA_FILE = os.path.join(SCRIPTS_DIR, "latex", "profile.lua")
+# Names in the build's workspace, where the engine runs; profile.lua knows them too.
+LUA_NAME = "scriptorium-profile.lua"
+LOG_NAME = "scriptorium-profile.log"
+PROFILES_DIR = os.path.join(BUILD_DIR, "profiles")
+
+# Loads the hooks first, and marks the end of the preamble.
+SETUP = (
+    f'\\directlua{{dofile("{LUA_NAME}")}}\n'
+    "\\AddToHook{begindocument/end}{\\directlua{scriptorium_profile.begin_document()}}\n"
+)
+
+# Rows shown in each part of the report.
+TOP = 10
+
+
+def _font_size(size):
+    """define_font's size: scaled points, or a negative 'scaled' factor."""
+    return f"scaled {-size / 1000:g}" if size < 0 else f"{size / 65536:g}pt"
+
+
+class Profile:
+    """Profiling data for one document, filled in by compile_pdf()."""
+
+    def __init__(self, document):
+        self.document = document
+        # Marker index -> (note, line); index 0 is the material before any marker.
+        self.sources = [("(before the first note)", 0)]
+        self.pass_seconds = []
+        self.preamble = 0.0
+        self.pages = []
+        self.fonts = []
+
+    def instrument(self, latex_text, workdir):
+        """Returns `latex_text` with the profiling hooks, copying them into `workdir`."""
+        shutil.copyfile(LUA_FILE, os.path.join(workdir, LUA_NAME))
+        # A new document (e.g. a retry with another font) starts a new profile.
+        self.sources = self.sources[:1]
+        self.pass_seconds = []
+        lines = []
+        for line in latex_text.split("\n"):
+            if line.startswith(MARKER_PREFIX):
+                note, _, number = line[len(MARKER_PREFIX) :].strip().rpartition(":")
+                self.sources.append((note, int(number) if number.isdigit() else 0))
+                lines.append(f"\\directlua{{scriptorium_profile.source({len(self.sources) - 1})}}")
+            lines.append(line)
+        return SETUP + "\n".join(lines)
+
+    def read_pass(self, workdir, seconds):
+        """Reads the records of a pass that ran in `workdir`. Only the last pass is reported."""
+        self.pass_seconds.append(seconds)
+        self.preamble, self.pages, self.fonts = 0.0, [], []
+        try:
+            with open(os.path.join(workdir, LOG_NAME), "r", encoding="utf-8", errors="replace") as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return
+        for line in lines:
+            fields = line.split("\t")
+            try:
+                if fields[0] == "preamble":
+                    self.preamble = float(fields[1])
+                elif fields[0] == "page":
+                    page, source, spent, nodes, glyphs, lua_kb = fields[1:7]
+                    self.pages.append(
+                        {
+                            "page": int(page),
+                            "source": self._source(source),
+                            "seconds": float(spent),
+                            "nodes": int(nodes),
+                            "glyphs": int(glyphs),
+                            "lua_kb": float(lua_kb),
+                        }
+                    )
+                elif fields[0] == "font":
+                    source, spent, size, name = fields[1], fields[2], fields[3], "\t".join(fields[4:])
+                    self.fonts.append(
+                        {
+                            "font": name,
+                            "size": _font_size(int(size)),
+                            "source": self._source(source),
+                            "seconds": float(spent),
+                        }
+                    )
+            except (ValueError, IndexError):
+                continue  # A line cut short by a crash.
+
+    def _source(self, index):
+        index = int(index)
+        return self.sources[index] if 0 <= index < len(self.sources) else self.sources[0]
+
+    def chapters(self):
+        """Per-note totals, slowest first."""
+        totals = {}
+        for page in self.pages:
+            entry = totals.setdefault(
+                page["source"][0], {"pages": 0, "seconds": 0.0, "fonts": 0.0, "nodes": 0}
+            )
+            entry["pages"] += 1
+            entry["seconds"] += page["seconds"]
+            entry["nodes"] += page["nodes"]
+        for font in self.fonts:
+            entry = totals.setdefault(
+                font["source"][0], {"pages": 0, "seconds": 0.0, "fonts": 0.0, "nodes": 0}
+            )
+            entry["fonts"] += font["seconds"]
+        return sorted(totals.items(), key=lambda item: -(item[1]["seconds"] + item[1]["fonts"]))
+
+    def report(self):
+        """The report, as lines of text."""
+        passes = len(self.pass_seconds)
+        lines = [
+            f"🔬 Profile of '{self.document}' (last of {passes} pass(es), "
+            f"{self.pass_seconds[-1] if passes else 0:.1f}s)"
+        ]
+        if not self.pages and not self.fonts:
+            lines.append("   No profiling records; is the engine LuaLaTeX?")
+            return lines
+        font_total = sum(f["seconds"] for f in self.fonts)
+        lines.append(
+            f"   Preamble {self.preamble:.2f}s, {len(self.pages)} pages "
+            f"{sum(p['seconds'] for p in self.pages):.2f}s, "
+            f"{len(self.fonts)} font loads {font_total:.2f}s"
+        )
+        lines.append(f"   {'Note':<40} {'Pages':>5} {'Pages s':>8} {'Fonts s':>8} {'Nodes/page':>11}")
+        for note, entry in self.chapters()[:TOP]:
+            per_page = entry["nodes"] // entry["pages"] if entry["pages"] else 0
+            lines.append(
+                f"   {note[:40]:<40} {entry['pages']:>5} {entry['seconds']:>8.2f} "
+                f"{entry['fonts']:>8.2f} {per_page:>11,}"
+            )
+        slowest = sorted(self.pages, key=lambda p: -p["seconds"])[:TOP]
+        if slowest:
+            lines.append("   Slowest pages:")
+            for page in slowest:
+                note, line = page["source"]
+                lines.append(
+                    f"     p. {page['page']:<5} {page['seconds']:.3f}s  {page['nodes']:,} nodes, "
+                    f"{page['glyphs']:,} glyphs  ({note}:{line})"
+                )
+        slow_fonts = sorted(self.fonts, key=lambda f: -f["seconds"])[:TOP]
+        if slow_fonts:
+            lines.append("   Slowest font loads:")
+            for font in slow_fonts:
+                note, line = font["source"]
+                lines.append(
+                    f"     {font['seconds']:.3f}s  {font['font'][:50]} at {font['size']}  ({note}:{line})"
+                )
+        return lines
+
+    def save(self):
+        """Writes the records to build/profiles/<document>.json and returns the path."""
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        path = os.path.join(PROFILES_DIR, f"{self.document}.json")
+        data = {
+            "document": self.document,
+            "pass_seconds": self.pass_seconds,
+            "preamble_seconds": self.preamble,
+            "chapters": dict(self.chapters()),
+            "pages": self.pages,
+            "fonts": self.fonts,
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+        return path
+
+
+def report(profile):
+    """Prints a profile and saves it, the way the builders report one."""
+    print("\n".join(profile.report()))
+    print(f"   Full profile saved to: {profile.save()}")
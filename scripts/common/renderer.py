@@ -0,0 +1,78 @@
+"""
+Chooses the luaotfload renderer that shapes the Arabic fonts.
+
+luaotfload can shape text itself ("node" mode) or hand it to HarfBuzz.
+Speed and correctness differ with the font. Node mode is usually faster on
+simple Naskh, while HarfBuzz handles the mark stacking of the Uthmani
+Quranic fonts and the deep contextual forms of Thuluth better. The choice is
+made in two places:
+
+  * per template, in the options of its Arabic font families, e.g.
+    \\newfontfamily\\arabicfont[Script=Arabic, Renderer=Node]{...};
+  * per build, with `--renderer node|harfbuzz`. For templates, this
+    redeclares those families in the header with the other renderer. For
+    the tafsir and study notes, which set everything in the main font, it
+    goes into pandoc's `mainfontoptions`.
+
+scripts/bench-shaping.py times each renderer on each font, to pick the
+fastest setup that shapes correctly for each kind of publication.
+"""
+
+import re
+
+# --renderer value -> fontspec's Renderer= value.
+RENDERERS = {"node": "Node", "harfbuzz": "HarfBuzz"}
+
+# \newfontfamily\name[options]{font}, as the templates declare Arabic fonts.
+FAMILY_REGEX = re.compile(r"^\\newfontfamily\\(\w+)\[([^\]]*)\]\{([^}]+)\}", re.MULTILINE)
+RENDERER_OPTION_REGEX = re.compile(r"\s*Renderer\s*=\s*([^,]*)")
+
+
+def add_argument(parser):
+    """Adds the builders' --renderer option to an argparse parser."""
+    parser.add_argument(
+        "--renderer",
+        choices=sorted(RENDERERS),
+        help="Shape Arabic with luaotfload's node mode or with HarfBuzz,\n"
+        "instead of the template's choice (see common/renderer.py).",
+    )
+
+
+def arabic_families(template_path):
+    """(command, options, font) of each Arabic font family a template declares."""
+    with open(template_path, "r", encoding="utf-8") as f:
+        tex = f.read()
+    return [
+        (name, options, font)
+        for name, options, font in FAMILY_REGEX.findall(tex)
+        if re.search(r"Script\s*=\s*Arabic", options)
+    ]
+
+
+def template_renderer(template_path):
+    """The renderer a template chooses for its Arabic fonts, or None (luaotfload's default)."""
+    for _, options, _ in arabic_families(template_path):
+        match = RENDERER_OPTION_REGEX.search(options)
+        if match:
+            for name, value in RENDERERS.items():
+                if value.lower() == match.group(1).strip().lower():
+                    return name
+    return None
+
+
+def with_renderer(options, renderer):
+    """fontspec `options` with their Renderer set to `renderer` (if any)."""
+    if not renderer:
+        return options
+    kept = [o for o in options.split(",") if o.strip() and not RENDERER_OPTION_REGEX.match(o)]
+    return ", ".join([o.strip() for o in kept] + [f"Renderer={RENDERERS[renderer]}"])
+
+
+def latex_header(template_path, renderer):
+    """LaTeX redeclaring the template's Arabic fonts with `renderer`, or ""."""
+    if not renderer:
+        return ""
+    return "\n".join(
+        rf"\renewfontfamily\{name}[{with_renderer(options, renderer)}]{{{font}}}"
+        for name, options, font in arabic_families(template_path)
+    )
@@ -0,0 +1,101 @@
+"""
+Reproducible (byte-stable) builds.
+
+Left alone, every build stamps the current date into the document, and
+LuaTeX writes the creation time, the temporary file name pandoc compiled in,
+and a time-derived /ID into the PDF. Identical sources then give different
+bytes on every run.
+
+In reproducible mode:
+  * the build date is SOURCE_DATE_EPOCH when it is set, otherwise the last
+    git commit touching the sources, otherwise their newest mtime;
+  * the engines get SOURCE_DATE_EPOCH and FORCE_SOURCE_DATE=1, which pins the
+    PDF dates and \\today in TeX Live;
+  * the PDF /ID is derived from the source contents, and the file name entry
+    (a random temporary path under pandoc) is suppressed.
+
+Reproducible mode is on with `--reproducible`, or whenever SOURCE_DATE_EPOCH
+is already set in the environment.
+"""
+
+import hashlib
+import os
+import subprocess
+from datetime import datetime, timezone
+
+from common import write_header_file
+
+
+def enabled(flag=False):
+    """Returns True if this build should be reproducible."""
+    return flag or "SOURCE_DATE_EPOCH" in os.environ
+
+
+def source_date_epoch(source_paths):
+    """Returns the pinned build timestamp (seconds since the epoch) for the sources."""
+    if "SOURCE_DATE_EPOCH" in os.environ:
+        return int(os.environ["SOURCE_DATE_EPOCH"])
+
+    source_paths = [os.path.abspath(p) for p in source_paths]
+    if source_paths:
+        try:
+            result = subprocess.run(
+                ["git", "log", "-1", "--format=%ct", "--"] + source_paths,
+                cwd=os.path.dirname(source_paths[0]),
+                capture_output=True,
+                check=True,
+                text=True,
+            )
+            # Empty output means the sources are in a repository but not committed.
+            if result.stdout.strip():
+                return int(result.stdout.strip())
+        except (subprocess.CalledProcessError, OSError, ValueError):
+            pass
+
+    mtimes = [os.stat(p).st_mtime for p in source_paths if os.path.exists(p)]
+    return int(max(mtimes)) if mtimes else 0
+
+
+def build_date(source_paths):
+    """Returns the pinned build date as a `date` (UTC)."""
+    epoch = source_date_epoch(source_paths)
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).date()
+
+
+def environment(source_paths):
+    """Returns a copy of os.environ that pins dates for pandoc and the engines."""
+    env = dict(os.environ)
+    env["SOURCE_DATE_EPOCH"] = str(source_date_epoch(source_paths))
+    env["FORCE_SOURCE_DATE"] = "1"
+    env["TZ"] = "UTC"
+    return env
+
+
+def document_id(source_paths):
+    """Returns a 32-digit hex identifier derived from the source contents."""
+    digest = hashlib.md5()
+    for path in sorted(os.path.abspath(p) for p in source_paths):
+        digest.update(os.path.basename(path).encode("utf-8"))
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest().upper()
+
+
+def latex_header(source_paths):
+    """
+    Returns LaTeX for the preamble that makes the PDF trailer deterministic.
+    It is a no-op outside LuaTeX (xdvipdfmx honours SOURCE_DATE_EPOCH itself).
+    """
+    doc_id = document_id(source_paths)
+    return (
+        r"\ifdefined\pdfvariable"
+        # Bit 2 drops /PTEX.FileName, the random temporary path pandoc compiles in.
+        r"\pdfvariable suppressoptionalinfo 2 "
+        r"\pdfvariable trailerid {[<" + doc_id + r"> <" + doc_id + r">]}"
+        r"\fi"
+    )
+
+
+def write_latex_header(source_paths):
+    """Writes latex_header() to build/ for pandoc's --include-in-header."""
+    return write_header_file("reproducible", latex_header(source_paths))
@@ -0,0 +1,98 @@
+"""
+Reuses the table of contents of the previous build, to save LaTeX passes.
+
+\\tableofcontents (pandoc's `toc: true`, litany.tex) prints what the previous
+pass wrote to the .toc file. A cold build therefore needs a pass to write the
+contents, and a second one because printing them moves every page number.
+Often it also needs a third to confirm that nothing moved again.
+
+compile_pdf() instead starts from the .aux, .toc and .out files of the last
+successful build of the same document, cached in build/toc/. When the
+headings and their pages have not changed, the first pass writes exactly
+what it read and the build is done in one pass. That pass also validates the
+cache: if anything moved, its output differs, and compile_pdf() runs again as
+it always did. A cached state is only used with the same preamble, since an
+.aux written under other packages may not even load.
+
+The heading structure is read from the generated LaTeX, to tell in the log
+whether a build reused its contents as they were or only as a starting point.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from common import BUILD_DIR
+
+CACHE_DIR = os.path.join(BUILD_DIR, "toc")
+
+# The files LaTeX reads back on the next pass: cross-references, contents,
+# PDF bookmarks (hyperref), lists of figures and tables.
+EXTENSIONS = (".aux", ".toc", ".out", ".lof", ".lot")
+
+HEADING_REGEX = re.compile(
+    r"\\(?:part|chapter|section|subsection|subsubsection|paragraph)\*?\s*[\[{].*"
+)
+
+
+def _split(latex_text):
+    """(preamble, body); all body when there is no \\begin{document}."""
+    preamble, marker, body = latex_text.partition("\\begin{document}")
+    return (preamble, body) if marker else ("", preamble)
+
+
+def structure(latex_text):
+    """The document's headings (their LaTeX lines), in order."""
+    return HEADING_REGEX.findall(_split(latex_text)[1])
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def _cache_path(output_pdf, engine):
+    key = _digest(f"{os.path.abspath(output_pdf)}:{engine}")[:24]
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def seed(workdir, jobname, latex_text, output_pdf, engine):
+    """
+    Copies the cached state of the last build into `workdir`. Returns
+    "unchanged" or "changed" (the headings since that build), or None when
+    there is nothing to reuse.
+    """
+    try:
+        with open(_cache_path(output_pdf, engine), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("preamble") != _digest(_split(latex_text)[0]):
+        return None
+    for extension, content in cached["files"].items():
+        with open(os.path.join(workdir, jobname + extension), "wb") as f:
+            f.write(content.encode("utf-8", "surrogateescape"))
+    headings = _digest("\n".join(structure(latex_text)))
+    return "unchanged" if cached.get("headings") == headings else "changed"
+
+
+def store(workdir, jobname, latex_text, output_pdf, engine):
+    """Caches the state a successful build ended with."""
+    files = {}
+    for extension in EXTENSIONS:
+        path = os.path.join(workdir, jobname + extension)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                files[extension] = f.read().decode("utf-8", "surrogateescape")
+    cached = {
+        "preamble": _digest(_split(latex_text)[0]),
+        "headings": _digest("\n".join(structure(latex_text))),
+        "files": files,
+    }
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _cache_path(output_pdf, engine)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        # ASCII, so undecodable bytes survive as escaped surrogates.
+        json.dump(cached, f)
+    os.replace(tmp_path, path)
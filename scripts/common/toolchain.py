@@ -0,0 +1,81 @@
+"""
+Cached probing of the external toolchain (pandoc, lualatex, weasyprint, ...).
+
+Finding a binary on the PATH is cheap, but asking it for `--version` forks a
+process, and for the TeX engines that means loading a format file. The answer
+only changes when the binary itself changes, so probe results are cached on
+disk keyed by the path found on the PATH, the resolved path and its
+modification time. The found path is part of the key because one binary can
+answer to several names (symlinked or multi-call installs, the fake
+toolchain), and what it reports depends on the name it was invoked by.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+
+from common import BUILD_DIR
+
+CACHE_FILE = os.path.join(BUILD_DIR, "toolchain-cache.json")
+
+_cache = None
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(CACHE_FILE, "r", encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache():
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(_cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, CACHE_FILE)
+
+
+def probe(binary):
+    """
+    Returns a dict describing `binary` ({"path", "mtime_ns", "version"}), or
+    None if it is not on the PATH or does not answer `--version`.
+
+    Only a cache miss (new binary, or the binary was upgraded in place) runs
+    the `--version` subprocess.
+    """
+    path = shutil.which(binary)
+    if path is None:
+        return None
+
+    real_path = os.path.realpath(path)
+    try:
+        mtime_ns = os.stat(real_path).st_mtime_ns
+    except OSError:
+        return None
+
+    key = f"{path}:{real_path}@{mtime_ns}"
+    cache = _load_cache()
+    if key not in cache:
+        try:
+            result = subprocess.run(
+                [path, "--version"], capture_output=True, check=True, text=True
+            )
+            lines = result.stdout.strip().splitlines()
+            version = lines[0] if lines else ""
+            cache[key] = {"path": real_path, "mtime_ns": mtime_ns, "version": version}
+        except (subprocess.CalledProcessError, OSError):
+            cache[key] = None
+        _save_cache()
+
+    return cache[key]
+
+
+def missing(*binaries):
+    """Returns the subset of `binaries` that are unavailable, in order."""
+    return [binary for binary in binaries if probe(binary) is None]
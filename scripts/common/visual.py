@@ -0,0 +1,127 @@
+"""
+Perceptual page hashes for visual regression checks of the published PDFs.
+
+Each page is rasterized in greyscale at a low resolution with pdftoppm
+(poppler), and reduced to a difference hash (dHash). The page is averaged
+down to a grid of HASH_ROWS x (HASH_COLS + 1) cells, and each bit records
+whether a cell is darker than its right-hand neighbour. Rerendering an
+unchanged page gives the same hash. A moved line, another font or a new
+margin flips many bits. The Hamming distance between two hashes says how
+far apart two renderings of a page are.
+
+Page hashes are cached in build/visual/ by the SHA-256 of the PDF, so a
+document whose bytes did not change is never rasterized again.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+
+from common import BUILD_DIR
+
+CACHE_DIR = os.path.join(BUILD_DIR, "visual")
+
+# 16 x 16 comparisons: 256-bit hashes.
+HASH_ROWS = 16
+HASH_COLS = 16
+
+# Low enough to rasterize a page in a few milliseconds, high enough that a
+# line of text is a few pixels tall.
+DEFAULT_DPI = 30
+
+PGM_HEADER_REGEX = re.compile(rb"^P5\s+(\d+)\s+(\d+)\s+(\d+)\s")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def page_count(pdf_path):
+    from pypdf import PdfReader
+
+    return len(PdfReader(pdf_path).pages)
+
+
+def read_pgm(path):
+    """Returns (width, height, pixels) of an 8-bit binary PGM."""
+    with open(path, "rb") as f:
+        data = f.read()
+    match = PGM_HEADER_REGEX.match(data)
+    if not match or int(match.group(3)) > 255:
+        raise ValueError(f"'{path}' is not an 8-bit binary PGM")
+    width, height = int(match.group(1)), int(match.group(2))
+    return width, height, data[match.end() : match.end() + width * height]
+
+
+def dhash(width, height, pixels):
+    """The difference hash of a greyscale image, as a hex string."""
+    columns = HASH_COLS + 1
+    col_edges = [round(c * width / columns) for c in range(columns + 1)]
+    row_edges = [round(r * height / HASH_ROWS) for r in range(HASH_ROWS + 1)]
+    bits = 0
+    for r in range(HASH_ROWS):
+        sums = [0] * columns
+        for y in range(row_edges[r], max(row_edges[r + 1], row_edges[r] + 1)):
+            row = pixels[y * width : (y + 1) * width]
+            for c in range(columns):
+                # sum() over a bytes slice runs in C; this loop is 17 calls a row.
+                sums[c] += sum(row[col_edges[c] : max(col_edges[c + 1], col_edges[c] + 1)])
+        cell_widths = [max(col_edges[c + 1] - col_edges[c], 1) for c in range(columns)]
+        means = [s / w for s, w in zip(sums, cell_widths)]
+        for c in range(HASH_COLS):
+            bits = (bits << 1) | (means[c] < means[c + 1])
+    return f"{bits:0{HASH_ROWS * HASH_COLS // 4}x}"
+
+
+def distance(hash_a, hash_b):
+    """Number of differing bits between two page hashes."""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def hash_pages(pdf_path, first, last, dpi=DEFAULT_DPI):
+    """
+    Rasterizes pages first..last (1-based, inclusive) with one pdftoppm run
+    and returns their hashes. Runs in a worker process.
+    """
+    with tempfile.TemporaryDirectory(prefix="scriptorium-visual-") as tmp:
+        root = os.path.join(tmp, "page")
+        subprocess.run(
+            ["pdftoppm", "-gray", "-r", str(dpi), "-f", str(first), "-l", str(last), pdf_path, root],
+            check=True,
+            capture_output=True,
+        )
+        # pdftoppm pads the page numbers to the width of the page count.
+        images = {}
+        for path in glob.glob(root + "-*.pgm"):
+            images[int(path[len(root) + 1 : -4])] = path
+        return [dhash(*read_pgm(images[n])) for n in range(first, last + 1)]
+
+
+def cache_path(sha256, dpi):
+    return os.path.join(CACHE_DIR, f"{sha256}-{dpi}-{HASH_ROWS}x{HASH_COLS}.json")
+
+
+def cached_hashes(sha256, dpi):
+    """The page hashes of a PDF with this SHA-256, or None if not cached."""
+    try:
+        with open(cache_path(sha256, dpi), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_hashes(sha256, dpi, hashes):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = cache_path(sha256, dpi)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(hashes, f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,168 @@
+"""
+Shared plumbing for the warm pandoc filter server and its clients.
+
+pandoc starts a fresh interpreter for every `--filter`, which then imports
+panflute and compiles the filter's regexes before doing any work. The filter
+server (scripts/pandoc/filter-server.py) keeps the filters loaded, and each
+filter gets a tiny client script that pandoc invokes instead. The client only
+forwards the JSON AST over a Unix socket, and runs the filter in-process when
+no server is listening.
+
+Wire protocol, one request per connection:
+  client -> server: one JSON header line {"filter": ..., "format": ...},
+                    then the AST, then a write shutdown
+  server -> client: "ok\\n" followed by the filtered AST,
+                    or "error <message>\\n"
+"""
+
+import os
+import socket
+
+from common import SCRIPTS_DIR, ast_stream
+
+# Unix socket paths are limited to ~100 bytes, so this lives in the temp dir
+# rather than under the (possibly deep) repository path.
+SOCKET_PATH = os.environ.get(
+    "SCRIPTORIUM_FILTER_SOCKET",
+    os.path.join(os.environ.get("TMPDIR", "/tmp"), f"scriptorium-filter-{os.getuid()}.sock"),
+)
+
+# The filters the server can host: name -> panflute filter script.
+FILTERS = {
+    "normalize-arabic": os.path.join(SCRIPTS_DIR, "pandoc", "normalize-arabic.py"),
+    "autotag-arabic": os.path.join(SCRIPTS_DIR, "pandoc", "autotag-arabic.py"),
+    "image-derivatives": os.path.join(SCRIPTS_DIR, "pandoc", "image-derivatives.py"),
+}
+
+# The client script to hand pandoc in place of each filter.
+CLIENTS = {
+    "normalize-arabic": os.path.join(SCRIPTS_DIR, "pandoc", "normalize-arabic-client.py"),
+    "autotag-arabic": os.path.join(SCRIPTS_DIR, "pandoc", "autotag-arabic-client.py"),
+    "image-derivatives": os.path.join(SCRIPTS_DIR, "pandoc", "image-derivatives-client.py"),
+}
+
+# How long a client waits for the server before giving up on it.
+CONNECT_TIMEOUT = 0.5
+
+
+def load_filter(name):
+    """Imports the filter script behind `name` as a module."""
+    import importlib.util
+
+    path = FILTERS[name]
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def apply_filter(module, ast_text, output_format, metadata=None):
+    """
+    Runs a loaded panflute filter over a JSON AST string and returns the result.
+    `metadata` (string values) is set on the document first, as `--metadata` would.
+    """
+    import io
+
+    import panflute as pf
+
+    if ast_stream.enabled():
+        output = io.StringIO()
+        stream_filter(module, io.StringIO(ast_text), output, output_format, metadata)
+        return output.getvalue()
+
+    doc = pf.load(io.StringIO(ast_text))
+    doc.format = output_format
+    for key, value in (metadata or {}).items():
+        doc.metadata[key] = pf.MetaString(value)
+    doc = module.main(doc)
+    output = io.StringIO()
+    pf.dump(doc, output)
+    return output.getvalue()
+
+
+def stream_filter(module, input_stream, output_stream, output_format, metadata=None):
+    """Runs a loaded filter block by block (see common/ast_stream.py)."""
+    ast_stream.run_filter(
+        module.action,
+        prepare=getattr(module, "prepare", None),
+        finalize=getattr(module, "finalize", None),
+        input_stream=input_stream,
+        output_stream=output_stream,
+        output_format=output_format,
+        metadata=metadata,
+    )
+
+
+def is_listening(socket_path=SOCKET_PATH):
+    """Returns True if a filter server accepts connections on `socket_path`."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def forward(name, output_format, ast_bytes, socket_path=SOCKET_PATH):
+    """
+    Sends the AST to the filter server and returns the filtered AST as bytes,
+    or None if the server is not running or could not handle the request.
+    """
+    import json
+
+    header = json.dumps({"filter": name, "format": output_format}) + "\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(socket_path)
+            # Filtering a large book can take a while; only the connect is bounded.
+            sock.settimeout(None)
+            sock.sendall(header.encode("utf-8"))
+            sock.sendall(ast_bytes)
+            sock.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        return None
+
+    response = b"".join(chunks)
+    status, _, body = response.partition(b"\n")
+    if status != b"ok":
+        return None
+    return body
+
+
+def run_client(name, argv, stdin, stdout):
+    """
+    Entry point for the per-filter client scripts: forwards stdin to the
+    server, falling back to running the filter in this process.
+    """
+    output_format = argv[1] if len(argv) > 1 else "html"
+
+    if ast_stream.enabled():
+        # The server would need the whole document in memory; filter it
+        # here instead, reading and writing one block at a time.
+        import io
+
+        input_stream = io.TextIOWrapper(stdin, encoding="utf-8")
+        output_stream = io.TextIOWrapper(stdout, encoding="utf-8")
+        stream_filter(load_filter(name), input_stream, output_stream, output_format)
+        input_stream.detach()
+        output_stream.detach()
+        return
+
+    ast_bytes = stdin.read()
+
+    result = forward(name, output_format, ast_bytes)
+    if result is None:
+        module = load_filter(name)
+        result = apply_filter(module, ast_bytes.decode("utf-8"), output_format)
+        result = result.encode("utf-8")
+
+    stdout.write(result)
+    stdout.flush()
@@ -0,0 +1,210 @@
+"""
+Private scratch workspaces for build jobs, in RAM where there is room.
+
+A build writes a lot of intermediates: the combined Markdown, resolved
+copies of the notes, the generated LaTeX, and the engine's .aux, .toc and
+.log files on every pass. When they are written next to the sources, two
+builds of the same folder overwrite each other's files. Each pass also
+pays for disk writes that nobody keeps.
+
+Each job instead gets its own folder under the scratch root. That is
+/dev/shm (tmpfs) when it has room for the size budget, or the temp
+directory otherwise. The budget is not a limit on a running build: nothing
+stops a job from growing past it in RAM. It only steers later builds. A
+job that grew past it is remembered, and its next builds go to the temp
+directory until one of them fits again. The folder holds symlinks to
+templates/, shared/ and fonts/, so relative paths like \\input{shared/publisher-info.tex} resolve
+from the engine's working directory. Tools that honour TMPDIR (pandoc
+among them) are pointed at it as well. Only the final artifact leaves the
+workspace, through publish(): it is copied next to its target and renamed
+over it, so readers of published/ never see half a PDF.
+
+  with workspace.Workspace("Hizb al-Bahr") as ws:
+      ...write ws.file("combined.md"), run the tools with ws.environment()...
+      ws.publish("input.pdf", os.path.join(OUTPUT_DIR, "Hizb al-Bahr.pdf"))
+
+Folders are named after the host and the process that made them, and a
+job sweeps the ones whose process has died. Only this host's folders are
+swept: on a scratch root shared between machines, another host's process
+ids mean nothing here.
+
+Configuration: SCRIPTORIUM_SCRATCH_DIR (the root) and SCRIPTORIUM_SCRATCH_MB
+(the budget, in MB).
+"""
+
+import fcntl
+import json
+import os
+import re
+import shutil
+import socket
+import tempfile
+
+from common import BUILD_DIR, FONTS_DIR, SHARED_DIR, TEMPLATES_DIR
+
+# Where workspaces go when there is room for the budget there.
+RAM_DIR = "/dev/shm"
+
+# The most a job is expected to write. A root with less free space is
+# passed over for the temp directory.
+BUDGET_MB = int(os.environ.get("SCRIPTORIUM_SCRATCH_MB", "512"))
+
+# Linked into every workspace, under these names.
+LINKED_DIRS = {"templates": TEMPLATES_DIR, "shared": SHARED_DIR, "fonts": FONTS_DIR}
+
+# The sizes of jobs that outgrew the budget, in MB, by job name.
+OVERSIZE_FILE = os.path.join(BUILD_DIR, "scratch-oversize.json")
+
+PREFIX = "scriptorium-ws-"
+NAME_REGEX = re.compile(rf"^{PREFIX}([A-Za-z0-9_]+)-(\d+)-")
+
+HOST = re.sub(r"[^A-Za-z0-9]+", "_", socket.gethostname())[:32] or "host"
+
+
+def _load_oversize():
+    try:
+        with open(OVERSIZE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _record_size(job, used_mb, budget_mb):
+    """Remembers `job` if it outgrew the budget, and forgets it once it fits."""
+    if used_mb <= budget_mb and job not in _load_oversize():
+        return
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    # Concurrent builds finish at the same time; without the lock one
+    # build's update would overwrite another's.
+    with open(f"{OVERSIZE_FILE}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        oversize = _load_oversize()
+        if used_mb > budget_mb:
+            oversize[job] = round(used_mb)
+        elif oversize.pop(job, None) is None:
+            return
+        tmp_path = f"{OVERSIZE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(oversize, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, OVERSIZE_FILE)
+
+
+def scratch_root(budget_mb=BUDGET_MB, job=None):
+    """
+    The folder workspaces are created in: RAM when it has room for the
+    budget and `job` has not outgrown it before, the temp directory otherwise.
+    """
+    configured = os.environ.get("SCRIPTORIUM_SCRATCH_DIR")
+    if configured:
+        os.makedirs(configured, exist_ok=True)
+        return configured
+    if job is not None and _load_oversize().get(job, 0) > budget_mb:
+        return tempfile.gettempdir()
+    if os.path.isdir(RAM_DIR) and os.access(RAM_DIR, os.W_OK):
+        if shutil.disk_usage(RAM_DIR).free >= budget_mb * 1024 * 1024:
+            return RAM_DIR
+    return tempfile.gettempdir()
+
+
+def _sweep(root):
+    """Removes this host's workspaces whose processes no longer exist."""
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    for name in names:
+        match = NAME_REGEX.match(name)
+        if not match or match.group(1) != HOST:
+            continue
+        try:
+            os.kill(int(match.group(2)), 0)
+        except ProcessLookupError:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        except PermissionError:
+            pass  # Alive, and someone else's.
+
+
+def _size(path):
+    total = 0
+    for folder, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(folder, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class Workspace:
+    """A scratch folder for one build job, removed when the job is done."""
+
+    def __init__(self, job, budget_mb=BUDGET_MB):
+        self.job = job
+        self.budget_mb = budget_mb
+        self.path = None
+
+    def open(self):
+        root = scratch_root(self.budget_mb, self.job)
+        _sweep(root)
+        label = re.sub(r"[^A-Za-z0-9]+", "-", self.job).strip("-")[:40] or "job"
+        self.path = tempfile.mkdtemp(prefix=f"{PREFIX}{HOST}-{os.getpid()}-{label}-", dir=root)
+        for name, target in LINKED_DIRS.items():
+            if os.path.isdir(target):
+                os.symlink(target, os.path.join(self.path, name))
+        os.mkdir(os.path.join(self.path, "tmp"))
+        return self
+
+    def close(self):
+        used_mb = _size(self.path) / (1024 * 1024)
+        if used_mb > self.budget_mb:
+            print(
+                f"ℹ️  The scratch workspace for '{self.job}' grew to {used_mb:.0f} MB, over the "
+                f"{self.budget_mb} MB budget; its next builds use {tempfile.gettempdir()} instead "
+                "(raise SCRIPTORIUM_SCRATCH_MB to keep jobs this size in RAM)."
+            )
+        try:
+            _record_size(self.job, used_mb, self.budget_mb)
+        except OSError:
+            pass  # Only costs the fallback next time.
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def file(self, *parts):
+        """A path inside the workspace; its folder is created."""
+        path = os.path.join(self.path, *parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def environment(self, env=None):
+        """`env` (default: this process's) with TMPDIR inside the workspace."""
+        from common import warm_filter
+
+        env = dict(os.environ if env is None else env)
+        # The filter server's socket is found through TMPDIR; keep it found.
+        env.setdefault("SCRIPTORIUM_FILTER_SOCKET", warm_filter.SOCKET_PATH)
+        env["TMPDIR"] = os.path.join(self.path, "tmp")
+        return env
+
+    def publish(self, name, target):
+        """
+        Moves the workspace file `name` to `target` atomically. The workspace
+        is usually on another filesystem, so the file is copied next to the
+        target first and then renamed over it.
+        """
+        source = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        tmp_target = f"{target}.{os.getpid()}.tmp"
+        try:
+            shutil.copyfile(source, tmp_target)
+            os.replace(tmp_target, target)
+        finally:
+            if os.path.exists(tmp_target):
+                os.remove(tmp_target)
+        os.remove(source)
+        return target
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+A stand-in for pandoc, lualatex, xelatex, latexmk, weasyprint and pdftoppm.
+
+The executables in this folder are symlinks to this script; which tool it
+pretends to be is taken from the name it was invoked under. Put the folder
+first on the PATH and the scriptorium scripts run their normal orchestration
+(argument building, fallbacks, caching, scheduling) without a real toolchain:
+
+  PATH="$PWD/scripts/fake-toolchain:$PATH" python3 scripts/scriptorium.py tafsir notes/
+
+Each stub accepts the arguments the scripts pass, writes an output file of
+the expected kind where the real tool would, and behaves according to these
+environment variables (all optional):
+
+  FAKE_TOOLCHAIN_LATENCY       seconds per run, either "0.2" or a range "0.1-0.5"
+  FAKE_<TOOL>_LATENCY          the same, for one tool (e.g. FAKE_LUALATEX_LATENCY)
+  FAKE_TOOLCHAIN_FAIL_RATE     probability (0-1) that a run fails with a LaTeX error
+  FAKE_TOOLCHAIN_MISSING_FONTS comma-separated fonts that fail with fontspec's
+                               "font-not-found" error when a document asks for them
+  FAKE_TOOLCHAIN_OUTPUT_SIZE   size of generated PDFs in bytes (default 4096),
+                               or "input" to match the size of the inputs
+  FAKE_TOOLCHAIN_RUN_FILTERS   "1" to run --filter scripts over a rough AST of
+                               the input, as pandoc would (Lua filters are ignored)
+  FAKE_TOOLCHAIN_LOG           file to append one JSON line per invocation to
+  FAKE_TOOLCHAIN_SEED          seed for latency and failure randomness
+
+`pandoc server [--port N]` starts a fake conversion server (HTTP/1.1 with
+keep-alive, default port 3030) that applies the same latency and failures
+per request; the log gets one line per request with "tool": "pandoc-server".
+
+lualatex writes the records of scripts/latex/profile.lua for `--profile`
+builds, with one page per \\newpage.
+
+`pdftoppm -gray` writes one PGM per page (pypdf is needed to read the PDF).
+Each page is drawn as "lines of text" derived from a hash of its content
+stream, so identical pages rasterize identically and edited pages do not.
+"""
+
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+TOOL = os.path.basename(sys.argv[0])
+
+VERSIONS = {
+    "pandoc": "pandoc 3.1.11 (fake-toolchain)",
+    "lualatex": "This is LuaHBTeX, Version 1.17.0 (TeX Live 2023) (fake-toolchain)",
+    "xelatex": "XeTeX 3.141592653-2.6-0.999995 (TeX Live 2023) (fake-toolchain)",
+    "latexmk": "Latexmk, John Collins, 7 Apr. 2023. Version 4.80 (fake-toolchain)",
+    "weasyprint": "WeasyPrint version 60.2 (fake-toolchain)",
+    "pdftoppm": "pdftoppm version 24.02.0 (fake-toolchain)",
+}
+
+FONT_NOT_FOUND = (
+    "! Package fontspec Error: The font \"{font}\" cannot be found.\n\n"
+    "For immediate help type H <return>.\n ...\n\n"
+    "l.12 \\setmainfont{{{font}}}\n\n"
+    'Error producing PDF.\nfontspec error: "font-not-found"\n'
+)
+
+LATEX_ERROR = (
+    "! Undefined control sequence.\n"
+    "l.{line} \\fakeerror\n\n"
+    "Error producing PDF.\n"
+)
+
+_random = random.Random(os.environ.get("FAKE_TOOLCHAIN_SEED"))
+
+
+def _latency():
+    value = os.environ.get(f"FAKE_{TOOL.upper()}_LATENCY") or os.environ.get(
+        "FAKE_TOOLCHAIN_LATENCY", "0"
+    )
+    low, _, high = value.partition("-")
+    return _random.uniform(float(low), float(high)) if high else float(low)
+
+
+def _read_text(paths):
+    text = []
+    for path in paths:
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                text.append(f.read())
+        except OSError:
+            pass
+    return "\n".join(text)
+
+
+def _fake_pdf(path, inputs):
+    """Writes a small but structurally valid PDF of the configured size."""
+    size_setting = os.environ.get("FAKE_TOOLCHAIN_OUTPUT_SIZE", "4096")
+    if size_setting == "input":
+        size = sum(os.path.getsize(p) for p in inputs if os.path.isfile(p))
+    else:
+        size = int(size_setting)
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>",
+    ]
+    body = bytearray(b"%PDF-1.5\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    # Comment padding up to the requested size; readers skip it.
+    padding = max(0, size - len(body) - 200)
+    body += b"%" + b"x" * max(0, padding - 2) + b"\n" if padding else b""
+    xref = len(body)
+    body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        body += b"%010d 00000 n \n" % offset
+    body += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        xref,
+    )
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(bytes(body))
+
+
+def _requested_fonts(args, text):
+    """Fonts the document asks for, via -V/--variable, metadata or \\setmainfont."""
+    fonts = []
+    for i, arg in enumerate(args):
+        for prefix in ("mainfont:", "mainfont="):
+            value = None
+            if arg.startswith(("--variable=" + prefix, "-V" + prefix)):
+                value = arg.split(prefix, 1)[1]
+            elif arg in ("-V", "--variable") and i + 1 < len(args) and args[i + 1].startswith(prefix):
+                value = args[i + 1][len(prefix) :]
+            if value:
+                fonts.append(value)
+    fonts += re.findall(r"^mainfont:\s*['\"]?([^'\"\n]+?)['\"]?\s*$", text, re.MULTILINE)
+    fonts += re.findall(r"\\(?:setmainfont|newfontfamily\\\w+)(?:\[[^\]]*\])?\{([^}]+)\}", text)
+    return fonts
+
+
+def _maybe_fail(args, text):
+    """Returns an error message if this run should fail, else None."""
+    missing = [f.strip() for f in os.environ.get("FAKE_TOOLCHAIN_MISSING_FONTS", "").split(",") if f.strip()]
+    for font in _requested_fonts(args, text):
+        if font.strip() in missing:
+            return FONT_NOT_FOUND.format(font=font.strip())
+
+    if _random.random() < float(os.environ.get("FAKE_TOOLCHAIN_FAIL_RATE", "0")):
+        return LATEX_ERROR.format(line=_random.randint(1, max(1, text.count("\n"))))
+    return None
+
+
+def _rough_ast(text):
+    """A crude pandoc JSON AST (headers and paragraphs of words) for running filters."""
+    blocks = []
+    for chunk in re.split(r"\n\s*\n", text):
+        chunk = chunk.strip()
+        if not chunk or chunk == "---":
+            continue
+        inlines = []
+        for word in chunk.lstrip("#").split():
+            if inlines:
+                inlines.append({"t": "Space"})
+            inlines.append({"t": "Str", "c": word})
+        header = re.match(r"^(#{1,6})\s", chunk)
+        if header:
+            blocks.append({"t": "Header", "c": [len(header.group(1)), ["", [], []], inlines]})
+        else:
+            blocks.append({"t": "Para", "c": inlines})
+    return {"pandoc-api-version": [1, 23], "meta": {}, "blocks": blocks}
+
+
+def _run_filters(args, text, output_format):
+    filters = []
+    for i, arg in enumerate(args):
+        if arg in ("--filter", "-F") and i + 1 < len(args):
+            filters.append(args[i + 1])
+        elif arg.startswith("--filter="):
+            filters.append(arg.split("=", 1)[1])
+    ast = json.dumps(_rough_ast(text)).encode("utf-8")
+    for filter_path in filters:
+        command = [sys.executable, filter_path, output_format]
+        result = subprocess.run(command, input=ast, capture_output=True)
+        if result.returncode != 0:
+            return f"Error running filter {filter_path}:\n{result.stderr.decode('utf-8', 'replace')}"
+        ast = result.stdout
+    return None
+
+
+def _option(args, *names):
+    """Value of the last `--name value` or `--name=value` option."""
+    value = None
+    for i, arg in enumerate(args):
+        for name in names:
+            if arg == name and i + 1 < len(args):
+                value = args[i + 1]
+            elif arg.startswith(name + "="):
+                value = arg.split("=", 1)[1]
+    return value
+
+
+# Options that take a separate value argument, so that value is not an input file.
+PANDOC_VALUE_OPTIONS = {
+    "-o", "--output", "-t", "--to", "-w", "--write", "-f", "--from", "-r", "--read",
+    "-V", "--variable", "-M", "--metadata", "--template", "--pdf-engine",
+    "--pdf-engine-opt", "--filter", "-F", "--lua-filter", "-L", "--css", "-c",
+    "--bibliography", "--resource-path", "--include-in-header", "-H",
+    "--include-before-body", "-B", "--include-after-body", "-A", "--toc-depth",
+    "--metadata-file", "--data-dir", "--csl", "--citation-abbreviations",
+}
+
+
+def run_pandoc(args):
+    inputs = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in PANDOC_VALUE_OPTIONS:
+            skip = True
+        elif not arg.startswith("-"):
+            inputs.append(arg)
+
+    text = _read_text(inputs) if inputs else sys.stdin.read()
+    output = _option(args, "-o", "--output")
+    output_format = _option(args, "-t", "--to", "-w", "--write") or (
+        os.path.splitext(output)[1].lstrip(".") if output else "html"
+    )
+
+    if os.environ.get("FAKE_TOOLCHAIN_RUN_FILTERS") == "1":
+        error = _run_filters(args, text, "latex" if output_format == "pdf" else output_format)
+        if error:
+            return error, 83
+
+    if output_format == "pdf" or (output and output.endswith(".pdf")):
+        error = _maybe_fail(args, text)
+        if error:
+            return error, 43
+        _fake_pdf(output, inputs)
+        return None, 0
+
+    rendered = f"<!-- fake pandoc {output_format} output -->\n{text}"
+    template = _option(args, "--template")
+    if template and os.path.isfile(template):
+        # Enough of the template for the fake engines to see its fonts.
+        rendered = _read_text([template]).replace("$body$", rendered)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(rendered)
+    else:
+        sys.stdout.write(rendered)
+    return None, 0
+
+
+def _log(entry):
+    log_path = os.environ.get("FAKE_TOOLCHAIN_LOG")
+    if log_path:
+        # A single short write with O_APPEND does not interleave between processes.
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+def run_pandoc_server(args):
+    """Serves pandoc-server style JSON conversion requests until interrupted."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, body, content_type="application/json"):
+            data = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/version"):
+                self._reply(200, VERSIONS["pandoc"].split()[1], "text/plain")
+            else:
+                self._reply(404, "not found", "text/plain")
+
+        def do_POST(self):
+            started = time.time()
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(_latency())
+            text = request.get("text", "")
+            if request.get("from") == "json":
+                text = " ".join(re.findall(r'"t":\s*"Str",\s*"c":\s*"((?:[^"\\]|\\.)*)"', text))
+            output_format = request.get("to", "html")
+            if output_format == "json":
+                output = json.dumps(_rough_ast(text))
+            else:
+                output = f"<!-- fake pandoc {output_format} output -->\n{text}"
+                if request.get("standalone") and request.get("template"):
+                    output = request["template"].replace("$body$", output)
+            error = _maybe_fail([], output) if output_format != "json" else None
+            if error:
+                self._reply(500, error, "text/plain")
+            else:
+                self._reply(200, json.dumps({"output": output, "base64": False, "messages": []}))
+            _log({
+                "tool": "pandoc-server",
+                "pid": os.getpid(),
+                "start": started,
+                "duration": time.time() - started,
+                "exit": 1 if error else 0,
+                "args": [request.get("from", "markdown"), output_format],
+            })
+
+        def log_message(self, *args):
+            pass
+
+    port = int(_option(args, "--port") or 3030)
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    print(f"Starting fake pandoc server on port {port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return None, 0
+
+
+def _fake_profile(text):
+    """
+    Writes the records scripts/latex/profile.lua would, for `--profile`
+    builds: one page per \\newpage or \\clearpage, costing time in proportion
+    to its length, and one font load for the main font.
+    """
+    font = (_requested_fonts([], text) or ["Latin Modern Roman"])[0]
+    current = 0
+    with open("scriptorium-profile.log", "w", encoding="utf-8") as log:
+        log.write("preamble\t0.050000\n")
+        log.write(f"font\t0\t0.120000\t{12 * 65536}\tname:{font}:mode=harf;script=arab\n")
+        segments = re.split(r"\\(?:newpage|clearpage)\b", text.split("\\begin{document}")[-1])
+        for page, segment in enumerate(segments, start=1):
+            for index in re.findall(r"scriptorium_profile\.source\((\d+)\)", segment):
+                current = int(index)
+            log.write(
+                f"page\t{page}\t{current}\t{len(segment) / 200000:.6f}\t"
+                f"{len(segment) * 3}\t{len(segment)}\t{1024 + page}\n"
+            )
+
+
+def run_tex(args):
+    inputs = [a for a in args if not a.startswith("-")]
+    if not inputs:
+        return "! Emergency stop.\n*** (job aborted, no legal \\end found)\n", 1
+    tex_file = inputs[-1]
+    text = _read_text([tex_file])
+    output_dir = _option(args, "-output-directory", "--output-directory", "-outdir") or "."
+    jobname = _option(args, "-jobname", "--jobname") or os.path.splitext(os.path.basename(tex_file))[0]
+
+    print(f"{VERSIONS.get(TOOL, TOOL)}\n({tex_file}")
+    error = _maybe_fail(args, text)
+    if error:
+        print(error)
+        return None, 1
+
+    _fake_pdf(os.path.join(output_dir, f"{jobname}.pdf"), [tex_file])
+    if "scriptorium_profile" in text:
+        _fake_profile(text)
+    with open(os.path.join(output_dir, f"{jobname}.aux"), "w", encoding="utf-8") as f:
+        f.write("\\relax\n")
+    print(f"Output written on {jobname}.pdf (1 page).")
+    return None, 0
+
+
+def run_weasyprint(args):
+    positional = [a for a in args if not a.startswith("-")]
+    if len(positional) < 2:
+        return "usage: weasyprint [options] <input> <output>\n", 2
+    source, output = positional[0], positional[1]
+    text = sys.stdin.read() if source == "-" else _read_text([source])
+    error = _maybe_fail(args, text)
+    if error:
+        return error, 1
+    _fake_pdf(output, [] if source == "-" else [source])
+    return None, 0
+
+
+def run_pdftoppm(args):
+    import hashlib
+
+    from pypdf import PdfReader
+
+    positional = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in ("-r", "-f", "-l", "-scale-to", "-x", "-y", "-W", "-H"):
+            skip = True
+        elif not arg.startswith("-"):
+            positional.append(arg)
+    if len(positional) < 2:
+        return "Usage: pdftoppm [options] <PDF-file> <PPM-root>\n", 99
+    pdf_path, root = positional[0], positional[1]
+    dpi = float(_option(args, "-r") or 150)
+    pages = PdfReader(pdf_path).pages
+    first = int(_option(args, "-f") or 1)
+    last = min(int(_option(args, "-l") or len(pages)), len(pages))
+    digits = len(str(len(pages)))
+
+    for number in range(first, last + 1):
+        page = pages[number - 1]
+        contents = page.get_contents()
+        digest = hashlib.sha256(contents.get_data() if contents else b"").digest()
+        width = max(1, round(float(page.mediabox.width) / 72 * dpi))
+        height = max(1, round(float(page.mediabox.height) / 72 * dpi))
+        pixels = bytearray(b"\xff" * width * height)
+        # Twelve "lines of text" whose lengths come from the content hash.
+        line_height = max(1, height // 26)
+        for line in range(12):
+            top = (2 * line + 1) * line_height
+            length = width * (40 + digest[line] % 50) // 100
+            for y in range(top, min(height, top + line_height)):
+                pixels[y * width + width // 10 : y * width + width // 10 + length] = b"\x20" * length
+        with open(f"{root}-{number:0{digits}d}.pgm", "wb") as f:
+            f.write(b"P5\n%d %d\n255\n" % (width, height))
+            f.write(bytes(pixels[: width * height]))
+    return None, 0
+
+
+RUNNERS = {
+    "pandoc": run_pandoc,
+    "lualatex": run_tex,
+    "xelatex": run_tex,
+    "latexmk": run_tex,
+    "weasyprint": run_weasyprint,
+    "pdftoppm": run_pdftoppm,
+}
+
+
+def main():
+    args = sys.argv[1:]
+    started = time.time()
+
+    if "--version" in args:
+        print(VERSIONS.get(TOOL, f"{TOOL} (fake-toolchain)"))
+        return 0
+    if TOOL == "pandoc" and args[:1] == ["server"]:
+        return run_pandoc_server(args[1:])[1]
+
+    time.sleep(_latency())
+    error, code = RUNNERS.get(TOOL, run_pandoc)(args)
+    if error:
+        sys.stderr.write(error)
+
+    _log({
+        "tool": TOOL,
+        "pid": os.getpid(),
+        "start": started,
+        "duration": time.time() - started,
+        "exit": code,
+        "args": args,
+    })
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
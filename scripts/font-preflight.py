@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checks, before any compile, that every character in the given notes has a
+glyph in the font that will typeset it, using the fonts under fonts/.
+
+Arabic runs are checked against the template's Arabic font and everything
+else against its main font, with the same Arabic detection as
+autotag-arabic.py. Exits with status 1 if any glyph is missing.
+
+How to run this script:
+  python3 scripts/font-preflight.py "path/to/note.md" --template article.tex
+  python3 scripts/font-preflight.py "path/to/notes/" --main-font "EB Garamond" --arabic-font "Scheherazade New"
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import TEMPLATES_DIR, fonts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report characters that the chosen fonts cannot display.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("paths", nargs="+", help="Markdown files or folders of notes.")
+    parser.add_argument(
+        "-t",
+        "--template",
+        default="article.tex",
+        help="Template in templates/tex/ whose fonts to check against.\nDefault: 'article.tex'.",
+    )
+    parser.add_argument("--main-font", help="Check against this main font instead.")
+    parser.add_argument("--arabic-font", help="Check Arabic runs against this font instead.")
+    args = parser.parse_args()
+
+    main_font, arabic_font, _ = fonts.template_fonts(
+        os.path.join(TEMPLATES_DIR, "tex", args.template)
+    )
+    main_font = args.main_font or main_font
+    arabic_font = args.arabic_font or arabic_font
+
+    files = []
+    for path in args.paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.md"))))
+        else:
+            files.append(path)
+
+    print(f"🔎 Checking {len(files)} file(s) against '{main_font}' / '{arabic_font}'")
+    failed = False
+    unchecked = set()
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        problems, skipped = fonts.check_coverage(text, main_font, arabic_font)
+        unchecked.update(skipped)
+        if problems:
+            failed = True
+            print(f"\n📄 {path}")
+            fonts.report(problems)
+
+    for font in sorted(unchecked):
+        print(f"ℹ️  '{font}' is not under fonts/, so it was not checked.")
+
+    if not failed:
+        print("✅ All characters are covered.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,8 +16,13 @@ import os
 import subprocess
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import images, limits, reproducible, workspace
 
-def convert_to_pdf(input_file, output_file=None, css_file=None, filter_script=None):
+
+def convert_to_pdf(
+    input_file, output_file=None, css_file=None, filter_script=None, reproducible_build=False
+):
     """
     Constructs and executes the Pandoc command to convert a file to PDF.
     """
@@ -32,53 +37,75 @@ def convert_to_pdf(input_file, output_file=None, css_file=None, filter_script=No
         output_file = f"{base_name}.pdf"
 
     # --- 3. Build the Pandoc Command ---
-    command = [
-        "pandoc",
-        input_file,
-        "--pdf-engine=weasyprint",
-        "--toc",
-        "-o",
-        output_file,
-    ]
-
-    # --- 4. Add Filter if Provided (NEW) ---
-    if filter_script:
-        if os.path.exists(filter_script):
-            command.extend(["--filter", filter_script])
-        else:
-            print(
-                f"⚠️ Warning: Filter not found at '{filter_script}'. Proceeding without it."
+    # The PDF is written in a private scratch workspace and moved into place
+    # when complete, so builds running side by side never collide.
+    scratch_pdf_name = os.path.basename(output_file)
+    with workspace.Workspace(scratch_pdf_name) as job_workspace:
+        command = [
+            "pandoc",
+            input_file,
+            "--pdf-engine=weasyprint",
+            "--toc",
+            "-o",
+            job_workspace.file(scratch_pdf_name),
+        ]
+
+        # --- 4. Add Filter if Provided (NEW) ---
+        if filter_script:
+            if os.path.exists(filter_script):
+                command.extend(["--filter", filter_script])
+            else:
+                print(
+                    f"⚠️ Warning: Filter not found at '{filter_script}'. Proceeding without it."
+                )
+
+        # --- 5. Use Cached Screen-Sized Derivatives of the Images ---
+        command.extend(images.pandoc_args([os.path.dirname(os.path.abspath(input_file))], "screen"))
+
+        # --- 6. Add CSS Stylesheet if Provided ---
+        if css_file:
+            if os.path.exists(css_file):
+                command.extend(["--css", css_file])
+            else:
+                print(
+                    f"⚠️ Warning: CSS file not found at '{css_file}'. Proceeding without it."
+                )
+
+        # --- 7. Pin Dates and the PDF Identifier for Reproducible Builds ---
+        env = None
+        if reproducible.enabled(reproducible_build):
+            sources = [input_file] + ([css_file] if css_file and os.path.exists(css_file) else [])
+            command.append(
+                f"--pdf-engine-opt=--pdf-identifier={reproducible.document_id(sources)}"
             )
+            env = reproducible.environment(sources)
+        env = job_workspace.environment(env)
 
-    # --- 5. Add CSS Stylesheet if Provided ---
-    if css_file:
-        if os.path.exists(css_file):
-            command.extend(["--css", css_file])
-        else:
-            print(
-                f"⚠️ Warning: CSS file not found at '{css_file}'. Proceeding without it."
-            )
+        # --- 8. Execute the Command ---
+        print(f"🔄 Generating PDF from '{input_file}'...")
+        print(f"   Running command: {' '.join(command)}")
 
-    # --- 6. Execute the Command ---
-    print(f"🔄 Generating PDF from '{input_file}'...")
-    print(f"   Running command: {' '.join(command)}")
-
-    try:
-        result = subprocess.run(
-            command, check=True, capture_output=True, text=True, encoding="utf-8"
-        )
-        print(f"\n✅ Success! PDF created at: {output_file}")
-        if result.stderr:
-            print(f"\nℹ️ Conversion Log:\n{result.stderr}")
-
-    except FileNotFoundError:
-        print("\n❌ Error: 'pandoc' command not found.")
-        print("   Please ensure Pandoc is installed and in your system's PATH.")
-        sys.exit(1)
-    except subprocess.CalledProcessError as e:
-        print(f"\n❌ Error: Pandoc failed with exit code {e.returncode}.")
-        print("\nPandoc Error Output:\n" + e.stderr)
-        sys.exit(1)
+        try:
+            # Pandoc runs WeasyPrint itself, so the limits bound both.
+            result = limits.run(
+                command, check=True, capture_output=True, text=True, encoding="utf-8", env=env
+            )
+            job_workspace.publish(scratch_pdf_name, output_file)
+            print(f"\n✅ Success! PDF created at: {output_file}")
+            if result.stderr:
+                print(f"\nℹ️ Conversion Log:\n{result.stderr}")
+
+        except FileNotFoundError:
+            print("\n❌ Error: 'pandoc' command not found.")
+            print("   Please ensure Pandoc is installed and in your system's PATH.")
+            sys.exit(1)
+        except limits.ResourceLimitError as e:
+            limits.report(e)
+            sys.exit(limits.EXIT_CODE)
+        except subprocess.CalledProcessError as e:
+            print(f"\n❌ Error: Pandoc failed with exit code {e.returncode}.")
+            print("\nPandoc Error Output:\n" + e.stderr)
+            sys.exit(1)
 
 
 def main():
@@ -117,8 +144,21 @@ Examples:
         help="Path to an optional Pandoc filter script.",
     )
 
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Pin dates and the PDF identifier so identical sources give identical bytes.\n"
+        "Also enabled when SOURCE_DATE_EPOCH is set.",
+    )
+
     args = parser.parse_args()
-    convert_to_pdf(args.input_file, args.output_file, args.css_file, args.filter_script)
+    convert_to_pdf(
+        args.input_file,
+        args.output_file,
+        args.css_file,
+        args.filter_script,
+        args.reproducible,
+    )
 
 
 if __name__ == "__main__":
@@ -1,65 +1,77 @@
+import argparse
 import subprocess
 import sys
 import os
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import (
+    REPO_ROOT,
+    OUTPUT_DIR,
+    SHARED_DIR,
+    TEMPLATES_DIR,
+    fonts,
+    images,
+    limits,
+    lint,
+    renderer,
+    reproducible,
+    toolchain,
+    workspace,
+    write_header_file,
+)
+
 # --- Configuration ---
 # Input Markdown file (your main article)
 MD_FILE = "Introduction to The Ten Essentials (المبادئ العشرة) Poem copy.md"
 
-# Directory where the final PDF will be stored
-OUTPUT_DIR = "published"
-
 # Location of the LaTeX template
-TEMPLATE_FILE = os.path.join("templates", "article.tex")
+TEMPLATE_FILE = os.path.join(TEMPLATES_DIR, "tex", "article.tex")
 
 # Location of your bibliography file
-BIB_FILE = "references.bib"
+BIB_FILE = os.path.join(REPO_ROOT, "references.bib")
 
 # Directories where Pandoc should look for resource files (e.g., images, included .tex files)
 # The script will automatically add the 'shared' directory.
-RESOURCE_DIRS = [".", "templates", "shared"]
+RESOURCE_DIRS = [".", REPO_ROOT, TEMPLATES_DIR, SHARED_DIR]
 
 # The specific publisher file we need to ensure exists
-PUBLISHER_INFO_FILE = os.path.join("shared", "publisher-info.tex")
+PUBLISHER_INFO_FILE = os.path.join(SHARED_DIR, "publisher-info.tex")
 # ---------------------
 
 
 def check_dependencies():
-    """Checks if pandoc and lualatex are in the system's PATH."""
-    try:
-        subprocess.run(
-            ["pandoc", "--version"], capture_output=True, check=True, text=True
-        )
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    """Checks if pandoc and lualatex are in the system's PATH (cached per binary)."""
+    if toolchain.probe("pandoc") is None:
         print("Error: pandoc is not installed or not in your system's PATH.")
         sys.exit(1)
 
-    try:
-        subprocess.run(
-            ["lualatex", "--version"], capture_output=True, check=True, text=True
-        )
-    except (subprocess.CalledProcessError, FileNotFoundError):
+    if toolchain.probe("lualatex") is None:
         print("Error: lualatex is not installed or not in your system's PATH.")
         print("Please install a TeX distribution like TeX Live, MiKTeX, or MacTeX.")
         sys.exit(1)
 
 
-def build_pdf():
-    """Constructs and runs the pandoc command to build the PDF."""
-    print(f"Starting compilation of '{MD_FILE}'...")
+def build_pdf(md_file=MD_FILE, reproducible_build=False, font_fallback=False, arabic_renderer=None, lint_notes=False):
+    """
+    Constructs and runs the pandoc command to build the PDF. `arabic_renderer`
+    ("node" or "harfbuzz") overrides the template's (common/renderer.py).
+    With `lint_notes` (or SCRIPTORIUM_LINT), the note is checked first and
+    the build stops on content that would break it (common/lint.py).
+    """
+    print(f"Starting compilation of '{md_file}'...")
 
     # --- 1. Set up dynamic output path ---
     # Create the output directory if it doesn't exist
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
     # Get the base name of the markdown file (e.g., "my-article")
-    pdf_basename = os.path.splitext(os.path.basename(MD_FILE))[0]
+    pdf_basename = os.path.splitext(os.path.basename(md_file))[0]
 
     # Create the full output path (e.g., "published/my-article.pdf")
     output_pdf_path = os.path.join(OUTPUT_DIR, f"{pdf_basename}.pdf")
 
     # --- 2. Check if all required files exist before attempting to build ---
-    required_files = [MD_FILE, TEMPLATE_FILE, PUBLISHER_INFO_FILE]
+    required_files = [md_file, TEMPLATE_FILE, PUBLISHER_INFO_FILE]
     if os.path.exists(BIB_FILE):
         required_files.append(BIB_FILE)
 
@@ -71,6 +83,9 @@ def build_pdf():
             )
             sys.exit(1)
 
+    if not lint.gate([md_file], RESOURCE_DIRS, flag=lint_notes):
+        sys.exit(lint.EXIT_CODE)
+
     # --- 3. Construct and run the Pandoc command ---
 
     # Build the resource path string in an OS-agnostic way
@@ -79,50 +94,117 @@ def build_pdf():
 
     print(f"Using resource path: {resource_path_str}")
 
-    command = [
-        "pandoc",
-        MD_FILE,
-        "--output",
-        output_pdf_path,
-        "--from",
-        "markdown+citations",
-        "--template",
-        TEMPLATE_FILE,
-        "--pdf-engine",
-        "lualatex",
-        "--biblatex",
-        "--bibliography",
-        BIB_FILE,
-        "--resource-path",
-        resource_path_str,  # Use the new, OS-agnostic resource path
-    ]
-
-    try:
-        # The 'text=True' argument is good practice for cleaner output
-        result = subprocess.run(
-            command, check=True, capture_output=True, text=True, encoding="utf-8"
+    # pandoc writes the PDF, and LaTeX its intermediates (through TMPDIR), in
+    # a private scratch workspace; only the finished PDF is moved to published/.
+    with workspace.Workspace(pdf_basename) as job_workspace:
+        scratch_pdf_name = f"{pdf_basename}.pdf"
+
+        command = [
+            "pandoc",
+            md_file,
+            "--output",
+            job_workspace.file(scratch_pdf_name),
+            "--from",
+            "markdown+citations",
+            "--template",
+            TEMPLATE_FILE,
+            "--pdf-engine",
+            "lualatex",
+            "--biblatex",
+            "--bibliography",
+            BIB_FILE,
+            "--resource-path",
+            resource_path_str,  # Use the new, OS-agnostic resource path
+        ]
+
+        # Images (the shared logo included) go in as cached print-sized derivatives.
+        command.extend(images.pandoc_args([os.path.dirname(os.path.abspath(md_file))] + RESOURCE_DIRS))
+
+        # Catch characters the template's fonts cannot display before compiling.
+        with open(md_file, "r", encoding="utf-8") as f:
+            source_text = f.read()
+        main_font, arabic_font, arabic_options = fonts.template_fonts(TEMPLATE_FILE)
+        if arabic_renderer:
+            command.extend(
+                [
+                    "--include-in-header",
+                    write_header_file("renderer", renderer.latex_header(TEMPLATE_FILE, arabic_renderer)),
+                ]
+            )
+            arabic_options = renderer.with_renderer(arabic_options, arabic_renderer)
+        fallback_header = fonts.preflight(
+            source_text, main_font, arabic_font, arabic_options, fallback=font_fallback
         )
-        print(f"\nSuccess! PDF created at '{output_pdf_path}'.")
-        # Uncomment the line below if you want to see pandoc's detailed output
-        # print(result.stdout)
-
-    except subprocess.CalledProcessError as e:
-        print("--- Pandoc Compilation Failed ---", file=sys.stderr)
-        print(f"Pandoc returned a non-zero exit code: {e.returncode}", file=sys.stderr)
-        print("\n--- Pandoc Error Output ---", file=sys.stderr)
-        # Pandoc's stderr often contains the specific LaTeX error message
-        print(e.stderr, file=sys.stderr)
-        sys.exit(1)
+        if fallback_header:
+            command.extend(
+                ["--include-in-header", write_header_file("font-fallback", fallback_header)]
+            )
 
-    except FileNotFoundError:
-        print("Error: 'pandoc' command not found.", file=sys.stderr)
-        print(
-            "Please ensure Pandoc is installed and in your system's PATH.",
-            file=sys.stderr,
-        )
-        sys.exit(1)
+        # Pin dates and the PDF /ID so identical sources give identical bytes.
+        env = None
+        if reproducible.enabled(reproducible_build):
+            sources = [md_file, TEMPLATE_FILE]
+            command.extend(
+                ["--include-in-header", reproducible.write_latex_header(sources)]
+            )
+            env = reproducible.environment(sources)
+        env = job_workspace.environment(env)
+
+        try:
+            # The 'text=True' argument is good practice for cleaner output.
+            # Pandoc runs the engine itself, so the limits bound both.
+            result = limits.run(
+                command, check=True, capture_output=True, text=True, encoding="utf-8", env=env
+            )
+            job_workspace.publish(scratch_pdf_name, output_pdf_path)
+            print(f"\nSuccess! PDF created at '{output_pdf_path}'.")
+            # Uncomment the line below if you want to see pandoc's detailed output
+            # print(result.stdout)
+
+        except limits.ResourceLimitError as e:
+            limits.report(e)
+            sys.exit(limits.EXIT_CODE)
+
+        except subprocess.CalledProcessError as e:
+            print("--- Pandoc Compilation Failed ---", file=sys.stderr)
+            print(f"Pandoc returned a non-zero exit code: {e.returncode}", file=sys.stderr)
+            print("\n--- Pandoc Error Output ---", file=sys.stderr)
+            # Pandoc's stderr often contains the specific LaTeX error message
+            print(e.stderr, file=sys.stderr)
+            sys.exit(1)
+
+        except FileNotFoundError:
+            print("Error: 'pandoc' command not found.", file=sys.stderr)
+            print(
+                "Please ensure Pandoc is installed and in your system's PATH.",
+                file=sys.stderr,
+            )
+            sys.exit(1)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build an article PDF from Markdown with the article template."
+    )
+    parser.add_argument(
+        "md_file",
+        nargs="?",
+        default=MD_FILE,
+        help="The Markdown file to build. Default: the configured MD_FILE.",
+    )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Pin dates and PDF metadata so identical sources give identical PDF bytes.",
+    )
+    parser.add_argument(
+        "--font-fallback",
+        action="store_true",
+        help="Fill glyphs missing from the template's fonts from other fonts under fonts/.",
+    )
+    renderer.add_argument(parser)
+    lint.add_argument(parser)
+    args = parser.parse_args()
+
     check_dependencies()
-    build_pdf()
+    build_pdf(args.md_file, args.reproducible, args.font_fallback, args.renderer, args.lint)
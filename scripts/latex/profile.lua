@@ -0,0 +1,80 @@
+-- Per-page and per-font-load profiling for `--profile` builds.
+--
+-- common/profiling.py copies this file into the build's workspace and loads
+-- it before \documentclass. The builders' source markers become calls to
+-- scriptorium_profile.source(n), so every record carries the note and line
+-- being typeset. Records go to scriptorium-profile.log, one per line,
+-- tab-separated:
+--
+--   preamble  <seconds>
+--   page      <page> <source> <seconds> <nodes> <glyphs> <lua KB>
+--   font      <source> <seconds> <size> <name>
+--
+-- A page's seconds are the CPU time since the previous page was shipped,
+-- less the font loads in between, which are reported separately.
+
+scriptorium_profile = {}
+local profile = scriptorium_profile
+
+local log = io.open("scriptorium-profile.log", "w")
+local started = os.clock()
+local last = started
+local font_time = 0
+local current = 0
+
+local glyph_id = node.id("glyph")
+
+function profile.source(index)
+  current = index
+end
+
+function profile.begin_document()
+  local now = os.clock()
+  log:write(string.format("preamble\t%.6f\n", now - started - font_time))
+  log:flush()
+  last = now
+  font_time = 0
+end
+
+local function count(head)
+  local nodes, glyphs = 0, 0
+  for n in node.traverse(head) do
+    nodes = nodes + 1
+    if n.id == glyph_id then
+      glyphs = glyphs + 1
+    elseif n.list then
+      local inner_nodes, inner_glyphs = count(n.list)
+      nodes = nodes + inner_nodes
+      glyphs = glyphs + inner_glyphs
+    end
+  end
+  return nodes, glyphs
+end
+
+luatexbase.add_to_callback("pre_shipout_filter", function(head)
+  local spent = os.clock() - last - font_time
+  local nodes, glyphs = count(head)
+  log:write(string.format("page\t%d\t%d\t%.6f\t%d\t%d\t%.0f\n",
+    tex.count[0], current, spent, nodes, glyphs, collectgarbage("count")))
+  log:flush()
+  -- Counting is not the page's cost; restart the clock after it.
+  last = os.clock()
+  font_time = 0
+  return true
+end, "scriptorium.profile")
+
+-- define_font is exclusive and belongs to luaotfload, so its handler is
+-- taken out and put back wrapped, under the same description.
+for _, description in ipairs(luatexbase.callback_descriptions("define_font")) do
+  local define = luatexbase.remove_from_callback("define_font", description)
+  luatexbase.add_to_callback("define_font", function(name, size, id)
+    local start = os.clock()
+    local font = define(name, size, id)
+    local spent = os.clock() - start
+    font_time = font_time + spent
+    log:write(string.format("font\t%d\t%.6f\t%d\t%s\n",
+      current, spent, size, (tostring(name):gsub("[\t\n]", " "))))
+    log:flush()
+    return font
+  end, description)
+end
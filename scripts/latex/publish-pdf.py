@@ -2,25 +2,95 @@
 # flake8: noqa
 
 import os
-import subprocess
 import sys
 import argparse
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import OUTPUT_DIR, TEMPLATES_DIR as TEMPLATES_ROOT, fonts, latex, limits, lint, pandoc_server, profiling, renderer, reproducible, toolchain, write_header_file
+
 # --- Configuration ---
 # Set the base paths for your project structure.
 # This script is now configured for a flat template directory.
-TEMPLATES_DIR = "/Users/viz1er/Codebase/silsilah-sacra-scriptorium/templates"
-FILTER_PATH = "/Users/viz1er/Codebase/silsilah-sacra-scriptorium/scripts/autotag-arabic.py"
-OUTPUT_DIR = "/Users/viz1er/Codebase/silsilah-sacra-scriptorium/published"
+TEMPLATES_DIR = os.path.join(TEMPLATES_ROOT, "tex")
+# The filters by name, in order (see common/warm_filter.py). Through `pandoc server`
+# they run in this process; otherwise pandoc runs their clients, which hand the AST
+# to the warm filter server (scripts/pandoc/filter-server.py) when that is running.
+# Arabic text is normalized first, so that the tagging sees only the Arabic block,
+# and images are swapped for cached print-sized derivatives (common/images.py).
+FILTER_NAMES = ["normalize-arabic", "autotag-arabic", "image-derivatives"]
 
 def check_dependencies(pdf_engine):
     """Check if pandoc and the specified PDF engine are in the system's PATH."""
     dependencies = ['pandoc', pdf_engine]
-    for dep in dependencies:
-        if subprocess.run(['which', dep], capture_output=True, text=True).returncode != 0:
-            print(f"Error: '{dep}' not found in your system's PATH.")
-            print("Please ensure Pandoc and your chosen LaTeX engine are installed and accessible.")
-            sys.exit(1)
+    for dep in toolchain.missing(*dependencies):
+        print(f"Error: '{dep}' not found in your system's PATH.")
+        print("Please ensure Pandoc and your chosen LaTeX engine are installed and accessible.")
+        sys.exit(1)
+
+def prepare_job(md_file_path, template_path, args):
+    """
+    Works out everything one conversion needs: the output path, the source
+    (with markers for error reports), the header files and the environment.
+    """
+    if not os.path.isfile(md_file_path):
+        print(f"Error: Input file not found at '{md_file_path}'")
+        sys.exit(1)
+
+    # Construct the output PDF path
+    base_name = os.path.basename(md_file_path)
+    file_name_without_ext = os.path.splitext(base_name)[0]
+    output_pdf_path = os.path.join(OUTPUT_DIR, f"{file_name_without_ext}.pdf")
+
+    # Catch characters the template's fonts cannot display before compiling.
+    with open(md_file_path, 'r', encoding='utf-8') as f:
+        source_text = f.read()
+    header_files = []
+    main_font, arabic_font, arabic_options = fonts.template_fonts(template_path)
+    if args.renderer:
+        renderer_header = renderer.latex_header(template_path, args.renderer)
+        header_files.append(write_header_file("renderer", renderer_header))
+        arabic_options = renderer.with_renderer(arabic_options, args.renderer)
+    fallback_header = fonts.preflight(
+        source_text, main_font, arabic_font, arabic_options, fallback=args.font_fallback
+    )
+    if fallback_header:
+        header_files.append(write_header_file("font-fallback", fallback_header))
+
+    # Pin dates and the PDF /ID so identical sources give identical bytes.
+    env = None
+    if reproducible.enabled(args.reproducible):
+        sources = [md_file_path, template_path]
+        header_files.append(reproducible.write_latex_header(sources))
+        env = reproducible.environment(sources)
+
+    return {
+        "input": md_file_path,
+        # LaTeX errors are traced back to the note and line through these markers.
+        "source": latex.mark_sources(source_text, base_name),
+        "output": output_pdf_path,
+        "headers": header_files,
+        "env": env,
+    }
+
+def to_latex(job, template_path):
+    """Converts one job's Markdown to a standalone LaTeX document."""
+    header_includes = []
+    for path in job["headers"]:
+        with open(path, 'r', encoding='utf-8') as f:
+            header_includes.append(f.read())
+    variables = {"header-includes": "\n".join(header_includes)} if header_includes else None
+    return pandoc_server.convert(
+        job["source"],
+        to_format="latex",
+        standalone=True,
+        template_path=template_path,
+        variables=variables,
+        filters=FILTER_NAMES,
+        metadata={
+            "image-search-path": os.path.dirname(os.path.abspath(job["input"])),
+            "image-profile": "print",
+        },
+    )
 
 def main():
     """
@@ -28,17 +98,20 @@ def main():
     """
     # 1. Set up the argument parser
     parser = argparse.ArgumentParser(
-        description="A Pandoc wrapper to convert Markdown files to PDF using LaTeX templates.",
+        description="A Pandoc wrapper to convert Markdown files to PDF using LaTeX templates.\n"
+                    "When a `pandoc server` is running (see common/pandoc_server.py), the\n"
+                    "Markdown-to-LaTeX step goes through it instead of a new pandoc per file.",
         formatter_class=argparse.RawTextHelpFormatter
     )
     parser.add_argument(
-        'input_file',
-        help="Path to the input Markdown file."
+        'input_files',
+        nargs='+',
+        help="Path to the input Markdown file(s)."
     )
     parser.add_argument(
         '-t', '--template',
-        default='old-article.tex',  # Default template is now a specific file
-        help="Name of the template file in the templates directory (e.g., 'article.tex').\nDefault: 'old-article.tex'."
+        default='article.tex',  # Default template is now a specific file
+        help="Name of the template file in the templates directory (e.g., 'litany.tex').\nDefault: 'article.tex'."
     )
     parser.add_argument(
         '-e', '--engine',
@@ -46,79 +119,110 @@ def main():
         choices=['lualatex', 'xelatex'],
         help="The PDF engine to use.\nDefault: 'lualatex'."
     )
+    parser.add_argument(
+        '--reproducible',
+        action='store_true',
+        help="Pin dates and PDF metadata so identical sources give identical PDF bytes.\n"
+             "Also enabled when SOURCE_DATE_EPOCH is set."
+    )
+    parser.add_argument(
+        '--font-fallback',
+        action='store_true',
+        help="Fill glyphs missing from the template's fonts from other fonts under fonts/."
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help="Time every page and font load (LuaLaTeX only) and report them by note.\n"
+             "The full records are saved in build/profiles/."
+    )
+    renderer.add_argument(parser)
+    parser.add_argument(
+        '--fresh-toc',
+        action='store_true',
+        help="Build the table of contents from scratch instead of starting\n"
+             "from the last build's (see common/toc.py)."
+    )
+    lint.add_argument(parser)
     args = parser.parse_args()
 
     print("--- Pandoc PDF Generator ---")
+    if args.profile and args.engine != 'lualatex':
+        print("Error: --profile needs the lualatex engine.")
+        sys.exit(1)
 
     # 2. Check for required command-line tools
     check_dependencies(args.engine)
 
     # 3. Construct paths from arguments and configuration
-    md_file_path = args.input_file
     # UPDATED: The path is now constructed by joining the base dir and the template filename directly.
     template_path = os.path.join(TEMPLATES_DIR, args.template)
 
     # 4. Ensure all required paths exist
-    if not os.path.isfile(md_file_path):
-        print(f"Error: Input file not found at '{md_file_path}'")
-        sys.exit(1)
     if not os.path.isfile(template_path):
         print(f"Error: Template file not found at '{template_path}'")
         print(f"(Searched for template file named '{args.template}')")
         sys.exit(1)
-    if not os.path.isfile(FILTER_PATH):
-        print(f"Error: Filter script not found at '{FILTER_PATH}'")
-        sys.exit(1)
     if not os.path.isdir(OUTPUT_DIR):
         print(f"Creating output directory: '{OUTPUT_DIR}'")
         os.makedirs(OUTPUT_DIR)
 
-    # 5. Construct the output PDF path
-    base_name = os.path.basename(md_file_path)
-    file_name_without_ext = os.path.splitext(base_name)[0]
-    output_pdf_path = os.path.join(OUTPUT_DIR, f"{file_name_without_ext}.pdf")
+    # 5. Check the notes for content that would break the build (--lint)
+    if not lint.gate(args.input_files, flag=args.lint):
+        sys.exit(lint.EXIT_CODE)
 
-    # 6. Build the Pandoc command dynamically
-    pandoc_command = [
-        'pandoc',
-        md_file_path,
-        '-o', output_pdf_path,
-        f'--template={template_path}',
-        f'--pdf-engine={args.engine}',
-        f'--filter={FILTER_PATH}'
-    ]
-
-    print("\nRunning command:")
-    print(' '.join(pandoc_command))
-    print("...")
-
-    # 7. Execute the command
-    try:
-        process = subprocess.run(
-            pandoc_command,
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        print("\n✅ Success!")
-        print(f"PDF created at: {output_pdf_path}")
-        if process.stdout:
-            print("\nPandoc Output:")
-            print(process.stdout)
+    # 6. Prepare every conversion
+    jobs = [prepare_job(path, template_path, args) for path in args.input_files]
+
+    # 7. Convert all the Markdown to LaTeX. Through a pandoc server this runs
+    #    concurrently (bounded by its connection pool); otherwise it runs pandoc.
+    from concurrent.futures import ThreadPoolExecutor
 
+    if pandoc_server.available():
+        print(f"\nUsing pandoc server at {pandoc_server.SERVER_URL}")
+    try:
+        with ThreadPoolExecutor(max_workers=pandoc_server.POOL_SIZE) as executor:
+            latex_sources = list(executor.map(lambda job: to_latex(job, template_path), jobs))
     except FileNotFoundError:
         print(f"\n❌ Error: The 'pandoc' command was not found.")
         print("Please ensure Pandoc is installed and in your system's PATH.")
         sys.exit(1)
-
-    except subprocess.CalledProcessError as e:
-        print("\n❌ Error: Pandoc failed to execute.")
-        print(f"Return Code: {e.returncode}")
-        print("\n--- Pandoc Stderr ---")
-        print(e.stderr)
-        print("\n--- Pandoc Stdout ---")
-        print(e.stdout)
+    except limits.ResourceLimitError as e:
+        limits.report(e)
+        sys.exit(limits.EXIT_CODE)
+    except pandoc_server.PandocError as e:
+        print("\n❌ Error: Pandoc failed to convert the document.")
+        print("\n--- Pandoc Error ---")
+        print(e)
         sys.exit(1)
 
+    # 8. Run the engine on each, stopping at the first LaTeX error
+    for job, latex_source in zip(jobs, latex_sources):
+        print(f"\nRunning {args.engine} on '{job['input']}'...")
+        profile = None
+        if args.profile:
+            profile = profiling.Profile(os.path.splitext(os.path.basename(job["output"]))[0])
+        try:
+            latex.compile_pdf(
+                latex_source,
+                job["output"],
+                engine=args.engine,
+                resource_dirs=[os.path.dirname(os.path.abspath(job["input"]))],
+                env=job["env"],
+                profile=profile,
+                reuse_toc=not args.fresh_toc,
+            )
+        except limits.ResourceLimitError as e:
+            limits.report(e)
+            sys.exit(limits.EXIT_CODE)
+        except latex.EngineError as e:
+            print("\n❌ Error: LaTeX failed to compile the document.")
+            latex.report(e)
+            sys.exit(1)
+        print("\n✅ Success!")
+        print(f"PDF created at: {job['output']}")
+        if profile:
+            profiling.report(profile)
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
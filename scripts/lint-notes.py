@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checks notes for content that would break a build: `$`, `#`, `&` or `%`
+that reach LaTeX unescaped, parentheses that italicize.py would pair wrongly,
+images that are not found and, with --study-notes, the '00' overview's
+frontmatter. See common/lint.py for the checks. The builders run the same
+checks before pandoc with --lint.
+
+Exits with 1 if there are errors, or with --strict if there are warnings.
+
+How to run this script:
+  python3 scripts/scriptorium.py lint ~/Documents/Yasin_Tafsir
+  python3 scripts/scriptorium.py lint "path/to/Course Folder" --study-notes
+  python3 scripts/scriptorium.py lint notes/ more-notes/ --errors-only
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import lint
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "*.md"), recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check notes for content that would break a build.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("paths", nargs="+", help="Markdown files or folders of notes.")
+    parser.add_argument(
+        "--study-notes",
+        action="store_true",
+        help="Also check the '00' overview of each folder the way study-notes needs it.",
+    )
+    parser.add_argument(
+        "--errors-only", action="store_true", help="Only show errors, not warnings."
+    )
+    parser.add_argument(
+        "--strict", action="store_true", help="Exit with 1 on warnings too."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Checking processes. Default: the number of CPUs.",
+    )
+    args = parser.parse_args()
+
+    missing = [p for p in args.paths if not os.path.exists(p)]
+    if missing:
+        print(f"❌ Error: Not found: {', '.join(missing)}")
+        return 1
+    files = [os.path.abspath(f) for f in collect_files(args.paths)]
+    if not files:
+        print("❌ Error: No Markdown files found.")
+        return 1
+
+    started = time.perf_counter()
+    diagnostics = []
+    folders = [os.path.abspath(p) for p in args.paths if os.path.isdir(p)]
+    overviews = []
+    for folder in folders if args.study_notes else []:
+        overview = next(
+            (f for f in sorted(glob.glob(os.path.join(folder, "*.md")))
+             if os.path.basename(f).startswith("00")),
+            None,
+        )
+        if overview is None:
+            diagnostics.append(lint.Diagnostic(folder, 0, lint.ERROR, "no overview note starting with '00'"))
+        else:
+            overviews.append(overview)
+    diagnostics.extend(lint.lint(files, folders, overviews, workers=args.workers))
+    seconds = time.perf_counter() - started
+
+    errors, warnings = lint.summary(diagnostics)
+    shown = [d for d in diagnostics if d.severity == lint.ERROR] if args.errors_only else diagnostics
+    lint.report(shown, relative=True)
+
+    print(f"\n🔎 Checked {len(files)} note(s) in {seconds:.2f}s: {errors} error(s), {warnings} warning(s).")
+    if errors:
+        return 1
+    if warnings and args.strict:
+        return 1
+    print("✅ Nothing here should break a build.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
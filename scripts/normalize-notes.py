@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Reports, and optionally fixes, Arabic text in notes that is not in normal form:
+presentation forms, decorative tatweel, stray ZWJ/ZWNJ and marks out of
+canonical order. The builders normalize on the fly (see common/arabic.py);
+this shows what they change and can fix the sources once and for all.
+
+With --benchmark it times the normalization over the given notes instead,
+with and without the per-run memoization.
+
+How to run this script:
+  python3 scripts/normalize-notes.py ~/Documents/Yasin_Tafsir
+  python3 scripts/normalize-notes.py "path/to/note.md" --write
+  python3 scripts/normalize-notes.py ~/Documents/Yasin_Tafsir --benchmark --repeat 5
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import arabic
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "**", "*.md"), recursive=True)))
+        else:
+            files.append(path)
+    return files
+
+
+def best_time(function, repeat):
+    """The fastest of `repeat` runs of `function`, in seconds."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(texts, repeat):
+    size = sum(len(t.encode("utf-8")) for t in texts)
+    runs = [m.group() for t in texts for m in arabic.NORMALIZE_RUN_REGEX.finditer(t)]
+    print(
+        f"🔎 {len(texts)} file(s), {size / 1024:.0f} KiB, {len(runs)} Arabic runs "
+        f"({len(set(runs))} distinct)"
+    )
+
+    def without_memo():
+        uncached = arabic.normalize_run.__wrapped__
+        for text in texts:
+            arabic.NORMALIZE_RUN_REGEX.sub(lambda m: uncached(m.group())[0], text)
+
+    def cold_cache():
+        arabic.normalize_run.cache_clear()
+        normalizer = arabic.Normalizer()
+        for text in texts:
+            normalizer.normalize(text)
+
+    def warm_cache():
+        normalizer = arabic.Normalizer()
+        for text in texts:
+            normalizer.normalize(text)
+
+    results = [
+        ("tables, no memoization", best_time(without_memo, repeat)),
+        ("memoized, empty cache", best_time(cold_cache, repeat)),
+        ("memoized, warm cache", best_time(warm_cache, repeat)),
+    ]
+    baseline = results[0][1]
+    for label, seconds in results:
+        rate = size / 1024 / 1024 / seconds if seconds else float("inf")
+        print(
+            f"   {label:<24} {seconds * 1000:8.1f} ms  {rate:7.1f} MiB/s  "
+            f"x{baseline / seconds if seconds else float('inf'):.1f}"
+        )
+    info = arabic.normalize_run.cache_info()
+    print(f"   cache: {info.currsize} entries, {info.hits} hits, {info.misses} misses")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report or fix Arabic text that is not in normal form.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("paths", nargs="+", help="Markdown files or folders of notes.")
+    parser.add_argument(
+        "--write", action="store_true", help="Rewrite the files in normal form, in place."
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="store_true",
+        help="Time the normalization over the notes instead of reporting.",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="For --benchmark: runs per measurement. Default: 3."
+    )
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    if not files:
+        print("❌ Error: No Markdown files found.")
+        return 1
+    texts = []
+    for path in files:
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+
+    if args.benchmark:
+        benchmark(texts, args.repeat)
+        return 0
+
+    changed = 0
+    for path, text in zip(files, texts):
+        normalizer = arabic.Normalizer()
+        normalized = normalizer.normalize(text)
+        if normalized == text:
+            continue
+        changed += 1
+        print(f"📄 {path}\n   {normalizer.summary()}")
+        if args.write:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(normalized)
+            os.replace(tmp_path, path)
+
+    if not changed:
+        print(f"✅ All {len(files)} file(s) are already in normal form.")
+    elif args.write:
+        print(f"✅ Normalized {changed} of {len(files)} file(s).")
+    else:
+        print(f"ℹ️  {changed} of {len(files)} file(s) would change; rerun with --write to fix them.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
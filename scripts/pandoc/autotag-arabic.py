@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
 
 import panflute as pf
-import re
+import os
+import sys
 import datetime
 
-ARABIC_CHAR_REGEX = re.compile(r"[\u0600-\u06FF]")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import ast_stream
+from common.arabic import ARABIC_CHAR_REGEX, ARABIC_RUN_REGEX
 
 
 def prepare(doc):
@@ -33,8 +36,8 @@ def prepare(doc):
         else:
             title_md = pf.stringify(title_meta)
 
-        parts = re.split(
-            r"([\u0600-\u06FF\s]+)", title_md
+        parts = ARABIC_RUN_REGEX.split(
+            title_md
         )  # Slightly improved regex to capture spaces
         new_title_parts = []
         for part in parts:
@@ -88,6 +91,8 @@ def action(elem, doc):
 
 
 def main(doc=None):
+    if doc is None and ast_stream.enabled():
+        return ast_stream.run_filter(action, prepare=prepare)
     return pf.run_filter(action, prepare=prepare, doc=doc)
 
 
@@ -3,10 +3,15 @@
 
 import subprocess
 import os
+import sys
 import shutil
 import argparse
 import glob
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import OUTPUT_DIR, draft, fonts, images, latex, limits, lint, obsidian, profiling, renderer, reproducible, workspace
+from common.arabic import Normalizer
+
 
 def check_for_latex():
     """Checks if a LaTeX distribution (like MacTeX) is installed."""
@@ -27,17 +32,37 @@ def check_for_pandoc():
     return True
 
 
-def create_pdf(directory_path):
+def create_pdf(
+    directory_path,
+    reproducible_build=False,
+    font_fallback=False,
+    draft_mode=False,
+    chapters=None,
+    pages=None,
+    profile=False,
+    reuse_toc=True,
+    arabic_renderer=None,
+    lint_notes=False,
+):
     """
     Finds all Markdown files in a given directory, sorts them, and merges
     them into a single PDF with a book-like layout using Pandoc and LuaLaTeX.
+    In draft mode (see common/draft.py) only the selected chapters and pages
+    are built, in a single LaTeX pass, to '<folder>-draft.pdf'. With `profile`,
+    every page and font load is timed and reported by note (common/profiling.py).
+    Unless `reuse_toc` is off, LaTeX starts from the table of contents of the
+    last build, so an unchanged one needs a single pass (common/toc.py).
+    `arabic_renderer` ("node" or "harfbuzz") picks luaotfload's shaper.
+    With `lint_notes` (or SCRIPTORIUM_LINT), the notes are checked first and
+    the build stops on content that would break it (common/lint.py).
     """
+    draft_mode = draft_mode or bool(chapters) or bool(pages)
     if not (check_for_pandoc() and check_for_latex()):
-        return
+        sys.exit(1)
 
     # --- Book Layout Configuration ---
     # MODIFIED: These settings are now tailored for a book feel.
-    output_directory = "/Users/viz1er/Codebase/silsilahsacra-scriptorium/published"
+    output_directory = OUTPUT_DIR
     font_size = "26pt"  # Increased from default 10pt for better readability.
     main_font = "Amiri"  # A good font with Unicode/Arabic support.
 
@@ -55,7 +80,7 @@ def create_pdf(directory_path):
         print(
             f"🔴 ERROR: The provided input path is not a valid directory: {input_path}"
         )
-        return
+        sys.exit(1)
 
     # --- Find and Sort Markdown Files ---
     print(f"🔎 Scanning for Markdown files in: {input_path}")
@@ -63,23 +88,35 @@ def create_pdf(directory_path):
 
     if not input_files:
         print("🔴 ERROR: No Markdown (.md) files were found in this directory.")
-        return
+        sys.exit(1)
+
+    try:
+        input_files = draft.select_chapters(input_files, chapters)
+    except ValueError as e:
+        print(f"🔴 ERROR: {e}.")
+        sys.exit(1)
 
     print(f"Found {len(input_files)} files to combine:")
     for f in input_files:
         print(f"  - {os.path.basename(f)}")
 
+    # --- Check the Notes Before Pandoc Sees Them ---
+    if not lint.gate(input_files, [input_path], flag=lint_notes):
+        sys.exit(lint.EXIT_CODE)
+
     # --- Prepare Output Path ---
     try:
         os.makedirs(output_directory, exist_ok=True)
     except OSError as e:
         print(f"🔴 ERROR: Could not create output directory '{output_directory}'.")
         print(f"Reason: {e}")
-        return
+        sys.exit(1)
 
     folder_name = os.path.basename(input_path)
     file_name = f"{folder_name}.pdf"
     output_pdf_path = os.path.join(output_directory, file_name)
+    if draft_mode:
+        output_pdf_path = draft.output_name(output_pdf_path)
 
     doc_title = folder_name.replace("_", " ").replace("-", " ").title()
 
@@ -100,46 +137,126 @@ def create_pdf(directory_path):
         "--standalone",
     ]
 
-    pandoc_command.extend(input_files)
-
-    pandoc_command.extend(
-        [
-            "--output",
-            output_pdf_path,
-            "--variable",
-            f"title:{doc_title}",
-            "--variable",
-            f"fontsize:{font_size}",  # ADDED: Pass the font size
-            "--variable",
-            f"geometry:{geometry_settings}",  # MODIFIED: Use new margin settings
-            "--variable",
-            f"header-includes:{latex_header_includes}",
-            "--pdf-engine=lualatex",
-            "--variable",
-            f"mainfont:{main_font}",
-        ]
-    )
+    # --- Resolve Obsidian Links and Embeds ---
+    # pandoc does not understand [[wikilinks]], ![[embeds]] or callouts, so each
+    # note is resolved against the vault into a temporary copy first.
+    resolver = obsidian.resolver_for(input_path)
+    # Presentation forms, tatweel and stray joiners only slow LuaLaTeX down
+    # (and can send it to a fallback font), so the text is normalized too.
+    normalizer = Normalizer()
+    # Everything the build writes stays in a private scratch workspace (in
+    # RAM where there is room), so builds running side by side never collide.
+    with workspace.Workspace(folder_name) as job_workspace:
+        resolved_files = []
+        resolved_text = []
+        for f in input_files:
+            resolved_path = job_workspace.file("notes", os.path.basename(f))
+            with open(f, "r", encoding="utf-8") as infile:
+                # Markers first, so LaTeX errors point at the note's own lines.
+                content = resolver.resolve(latex.mark_sources(infile.read(), os.path.basename(f)))
+            content = normalizer.normalize(content)
+            with open(resolved_path, "w", encoding="utf-8") as outfile:
+                outfile.write(content)
+            resolved_files.append(resolved_path)
+            resolved_text.append(content)
+        for warning in resolver.warnings:
+            print(f"⚠️  WARNING: {warning}")
+        if normalizer.summary():
+            print(f"♻️  {normalizer.summary()}")
+
+        # --- Glyph Coverage Preflight ---
+        # The whole book is set in the main font, Arabic included, so that is
+        # the font the renderer applies to (common/renderer.py).
+        main_font_options = renderer.with_renderer("", arabic_renderer)
+        latex_header_includes += fonts.preflight(
+            "\n".join(resolved_text), main_font, fallback=font_fallback, main_options=main_font_options
+        )
 
-    # --- Execute the Command ---
-    print(f"\n📑 Output will be saved to: {output_pdf_path}")
-    print("🚀 Starting PDF generation with Pandoc (using LuaLaTeX)...")
-    print("   This may take a moment.")
+        pandoc_command.extend(resolved_files)
 
-    try:
-        process = subprocess.run(
-            pandoc_command, check=True, capture_output=True, text=True
+        # --- Image Derivatives ---
+        # Images go in as cached derivatives sized for print (common/images.py).
+        pandoc_command.extend(images.pandoc_args([input_path]))
+
+        # --- Draft Preview ---
+        if draft_mode:
+            latex_header_includes += draft.latex_header(pages)
+            pandoc_command.extend(["--variable", "classoption:draft"])
+
+        # --- Reproducible Builds ---
+        # Pin dates and derive the PDF /ID from the resolved notes (embeds included),
+        # so identical sources give identical PDF bytes.
+        env = None
+        if reproducible.enabled(reproducible_build):
+            latex_header_includes += reproducible.latex_header(resolved_files)
+            env = reproducible.environment(input_files)
+        env = job_workspace.environment(env)
+
+        # Pandoc only writes the LaTeX; the engine is run by latex.compile_pdf(),
+        # which stops at the first error and reports the note it came from.
+        pandoc_command.extend(
+            [
+                "--to",
+                "latex",
+                "--variable",
+                f"title:{doc_title}",
+                "--variable",
+                f"fontsize:{font_size}",  # ADDED: Pass the font size
+                "--variable",
+                f"geometry:{geometry_settings}",  # MODIFIED: Use new margin settings
+                "--variable",
+                f"header-includes:{latex_header_includes}",
+                "--variable",
+                f"mainfont:{main_font}",
+            ]
         )
-        print(f"✅ Success! Your PDF has been created:\n   {output_pdf_path}")
-        if process.stdout:
-            print("\n--- Pandoc Output ---")
-            print(process.stdout)
-    except subprocess.CalledProcessError as e:
-        print("🔴 ERROR: Pandoc failed during PDF creation.")
-        print("This is often due to a LaTeX error or a missing font.")
-        print("\n--- Pandoc Error Log ---")
-        print(e.stderr)
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
+        if main_font_options:
+            pandoc_command.extend(["--variable", f"mainfontoptions:{main_font_options}"])
+
+        # --- Execute the Command ---
+        print(f"\n📑 Output will be saved to: {output_pdf_path}")
+        print("🚀 Starting PDF generation with Pandoc (using LuaLaTeX)...")
+        print("   This may take a moment.")
+
+        try:
+            process = limits.run(
+                pandoc_command, check=True, capture_output=True, text=True, env=env
+            )
+            if process.stderr:
+                print("\n--- Pandoc Output ---")
+                print(process.stderr)
+            book_profile = profiling.Profile(folder_name) if profile else None
+            # Relative image paths still point into the original folder.
+            latex.compile_pdf(
+                process.stdout,
+                output_pdf_path,
+                resource_dirs=[input_path],
+                env=env,
+                max_runs=1 if draft_mode else 3,
+                workspace=job_workspace,
+                profile=book_profile,
+                reuse_toc=reuse_toc,
+            )
+            print(f"✅ Success! Your PDF has been created:\n   {output_pdf_path}")
+            if book_profile:
+                profiling.report(book_profile)
+        except limits.ResourceLimitError as e:
+            limits.report(e)
+            sys.exit(limits.EXIT_CODE)
+        except latex.EngineError as e:
+            print("🔴 ERROR: LuaLaTeX failed during PDF creation.")
+            if latex.font_not_found(e.output):
+                print(f"The font '{main_font}' is not installed.")
+            latex.report(e)
+            sys.exit(1)
+        except subprocess.CalledProcessError as e:
+            print("🔴 ERROR: Pandoc failed while converting the notes to LaTeX.")
+            print("\n--- Pandoc Error Log ---")
+            print(e.stderr)
+            sys.exit(1)
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+            sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -154,5 +271,49 @@ if __name__ == "__main__":
         "Example: python3 %(prog)s ~/Documents/Yasin_Tafsir",
     )
 
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Pin dates and PDF metadata so identical sources give identical PDF bytes.\n"
+        "Also enabled when SOURCE_DATE_EPOCH is set.",
+    )
+
+    parser.add_argument(
+        "--font-fallback",
+        action="store_true",
+        help="Fill glyphs missing from the main font from other fonts under fonts/.",
+    )
+
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time every page and font load and report them by note.\n"
+        "The full records are saved in build/profiles/.",
+    )
+
+    renderer.add_argument(parser)
+
+    parser.add_argument(
+        "--fresh-toc",
+        action="store_true",
+        help="Build the table of contents from scratch instead of starting\n"
+        "from the last build's (see common/toc.py).",
+    )
+
+    lint.add_argument(parser)
+
+    draft.add_arguments(parser)
+
     args = parser.parse_args()
-    create_pdf(args.directory_path)
+    create_pdf(
+        args.directory_path,
+        args.reproducible,
+        args.font_fallback,
+        draft_mode=args.draft,
+        chapters=args.chapters,
+        pages=args.pages,
+        profile=args.profile,
+        reuse_toc=not args.fresh_toc,
+        arabic_renderer=args.renderer,
+        lint_notes=args.lint,
+    )
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+A persistent local server that keeps the pandoc filters warm.
+
+panflute and the filter modules are imported once, up front. Each request is
+then handled in a forked child, so documents are filtered in parallel and
+one malformed document cannot take the server down. If a filter script is
+edited while the server runs, it is reloaded before the next request.
+
+pandoc talks to it through the small client scripts (e.g.
+autotag-arabic-client.py), which fall back to running the filter themselves
+when the server is not up.
+
+How to run this script:
+  python3 scripts/pandoc/filter-server.py            # foreground, Ctrl-C to stop
+  pandoc note.md -o note.pdf --filter scripts/pandoc/autotag-arabic-client.py
+"""
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import warm_filter
+
+
+class FilterServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """Forks a warm child per request; the parent only accepts and reloads."""
+
+    def __init__(self, socket_path):
+        self.filters = {}
+        self.mtimes = {}
+        for name in warm_filter.FILTERS:
+            self.refresh(name)
+        super().__init__(socket_path, FilterRequestHandler)
+
+    def refresh(self, name):
+        """(Re)loads a filter module if its script changed since it was loaded."""
+        mtime = os.stat(warm_filter.FILTERS[name]).st_mtime_ns
+        if self.mtimes.get(name) != mtime:
+            self.filters[name] = warm_filter.load_filter(name)
+            self.mtimes[name] = mtime
+            print(f"🔄 Loaded filter '{name}'.")
+
+    def process_request(self, request, client_address):
+        # Reload in the parent, before forking, so the work is done once.
+        for name in warm_filter.FILTERS:
+            try:
+                self.refresh(name)
+            except Exception as e:
+                print(f"⚠️ Warning: Could not reload filter '{name}': {e}")
+        super().process_request(request, client_address)
+
+
+class FilterRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            header = json.loads(self.rfile.readline())
+            module = self.server.filters[header["filter"]]
+            ast_text = self.rfile.read().decode("utf-8")
+            result = warm_filter.apply_filter(module, ast_text, header["format"])
+        except Exception as e:
+            # The client falls back to running the filter itself.
+            message = str(e).replace("\n", " ")
+            self.wfile.write(f"error {message}\n".encode("utf-8"))
+            return
+
+        self.wfile.write(b"ok\n")
+        self.wfile.write(result.encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep the pandoc filters loaded and serve them over a Unix socket."
+    )
+    parser.add_argument(
+        "--socket",
+        default=warm_filter.SOCKET_PATH,
+        help=f"Path of the Unix socket to listen on. Default: '{warm_filter.SOCKET_PATH}'.",
+    )
+    args = parser.parse_args()
+
+    # A socket file left behind by a crashed server would make bind() fail.
+    if os.path.exists(args.socket):
+        if warm_filter.is_listening(args.socket):
+            print(f"❌ Error: A filter server is already listening on '{args.socket}'.")
+            sys.exit(1)
+        os.remove(args.socket)
+
+    # Turn SIGTERM into a normal shutdown so the socket file is cleaned up.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    server = FilterServer(args.socket)
+    print(f"✅ Filter server listening on: {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        print("\n👋 Filter server stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+
+"""
+Drop-in replacement for `--filter image-derivatives.py` that hands the document
+to the warm filter server (filter-server.py) when it is running, and runs the
+filter in-process otherwise. Kept free of heavy imports on purpose.
+
+Usage: pandoc note.md -o note.pdf --filter scripts/pandoc/image-derivatives-client.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.warm_filter import run_client
+
+if __name__ == "__main__":
+    run_client("image-derivatives", sys.argv, sys.stdin.buffer, sys.stdout.buffer)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""
+Pandoc filter that points every local image at a cached derivative sized for
+the output (see common/images.py), so the engines never decode or embed the
+full-size originals.
+
+Relative image paths are looked up in the folders of the `image-search-path`
+metadata field (separated like $PATH; default: the working directory), and
+`image-profile` picks the output profile ("print" or "screen"; default:
+"print").
+
+Usage: pandoc note.md -o note.pdf --filter scripts/pandoc/image-derivatives.py \
+           --metadata image-search-path:notes/ --metadata image-profile:print
+"""
+
+import os
+import sys
+
+import panflute as pf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import ast_stream, images
+
+
+def prepare(doc):
+    doc.image_profile = doc.get_metadata("image-profile", "print")
+    if doc.image_profile not in images.PROFILES:
+        doc.image_profile = "print"
+    search_path = doc.get_metadata("image-search-path", "")
+    doc.image_dirs = [d for d in search_path.split(os.pathsep) if d] or [os.getcwd()]
+
+
+def action(elem, doc):
+    if isinstance(elem, pf.Image):
+        path = images.locate(elem.url, doc.image_dirs)
+        if path:
+            elem.url = images.derivative(path, doc.image_profile, elem.attributes.get("width"))
+
+
+def main(doc=None):
+    if doc is None and ast_stream.enabled():
+        return ast_stream.run_filter(action, prepare=prepare)
+    return pf.run_filter(action, prepare=prepare, doc=doc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""
+Pandoc filter that normalizes Arabic text before anything else looks at it:
+presentation forms become base letters, decorative tatweel and stray joiners
+are dropped, and every run is put in NFC (see common/arabic.py). Run it
+before autotag-arabic.py, whose detection only knows the Arabic block.
+
+What it changed is summarized on stderr, which pandoc passes through.
+
+Usage: pandoc note.md -o note.pdf --filter scripts/pandoc/normalize-arabic.py \
+           --filter scripts/pandoc/autotag-arabic.py
+"""
+
+import os
+import sys
+
+import panflute as pf
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import ast_stream
+from common.arabic import Normalizer
+
+
+def prepare(doc):
+    # One per document: the warm servers filter several documents at once.
+    doc.normalizer = Normalizer()
+
+
+def action(elem, doc):
+    if isinstance(elem, (pf.Str, pf.MetaString)):
+        elem.text = doc.normalizer.normalize(elem.text)
+
+
+def finalize(doc):
+    summary = doc.normalizer.summary()
+    if summary:
+        print(f"♻️  {summary}", file=sys.stderr)
+
+
+def main(doc=None):
+    if doc is None and ast_stream.enabled():
+        return ast_stream.run_filter(action, prepare=prepare, finalize=finalize)
+    return pf.run_filter(action, prepare=prepare, finalize=finalize, doc=doc)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Single entry point for all of the scriptorium tools.
+
+Each subcommand maps onto one of the existing scripts, which is only loaded
+(together with its heavy imports such as panflute or PyYAML) when that
+subcommand is actually run. Everything after the subcommand name is passed
+through to the script unchanged, so each tool keeps its own options.
+
+How to run this script:
+  python3 scripts/scriptorium.py <command> [args...]
+  python3 scripts/scriptorium.py tafsir ~/Documents/Yasin_Tafsir
+  python3 scripts/scriptorium.py doctor
+"""
+
+import argparse
+import os
+import sys
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# --- Subcommands ---
+# name -> (script path relative to scripts/, one-line description)
+COMMANDS = {
+    "build": ("latex/build.py", "Build an article PDF with the article template."),
+    "publish": ("latex/publish-pdf.py", "Convert a Markdown file to PDF with a LaTeX template."),
+    "tafsir": ("pandoc/create-tafsir-pdf.py", "Merge a folder of notes into a book-style PDF."),
+    "study-notes": ("study-notes.py", "Compile a course folder into a study-notes PDF."),
+    "site": ("study-site.py", "Render a course folder as a static HTML site, incrementally."),
+    "html-pdf": ("html-to-pdf.py", "Convert a file to a CSS-styled PDF with WeasyPrint."),
+    "autotag": ("pandoc/autotag-arabic.py", "Pandoc filter that tags Arabic text."),
+    "filter-server": ("pandoc/filter-server.py", "Keep the pandoc filters warm for batch runs."),
+    "anthology": ("anthology.py", "Assemble an anthology from already-built PDFs."),
+    "combine": ("combined-md.py", "Combine a folder of notes into one Markdown file."),
+    "demote": ("demote-headings.py", "Demote every heading in a Markdown file by one level."),
+    "italicize": ("italicize.py", "Italicize text in parentheses in a Markdown file."),
+    "indesign-xml": ("indesign/convert-md-to-xml.py", "Convert Markdown to InDesign XML."),
+    "fonts": ("font-preflight.py", "Check that the fonts cover every character in the notes."),
+    "normalize": ("normalize-notes.py", "Report or fix Arabic text that is not in normal form."),
+    "lint": ("lint-notes.py", "Check notes for content that would break a build."),
+    "verify": ("verify-reproducible.py", "Build twice and assert byte-identical output."),
+    "bench": ("bench-orchestration.py", "Benchmark the builders against the fake toolchain."),
+    "bench-shaping": ("bench-shaping.py", "Time Arabic shaping under each renderer and font."),
+    "batch": ("batch.py", "Run a list of builds, longest expected first."),
+    "plan": ("batch.py --plan", "Predict the wall time of a batch without building."),
+    "queue": ("work-queue.py", "Share a batch between builder processes and hosts."),
+    "visual": ("visual-regression.py", "Compare published PDFs page by page with a baseline."),
+}
+
+# Commands whose runs are recorded in the build history (common/history.py).
+BUILD_COMMANDS = {"build", "publish", "tafsir", "study-notes", "html-pdf", "anthology"}
+
+# The toolchain checked by `doctor`.
+TOOLCHAIN = ["pandoc", "lualatex", "xelatex", "latexmk", "weasyprint"]
+
+
+def run_script(name, args):
+    """Runs the script behind `name` as if it had been invoked directly."""
+    # Imported here so that `scriptorium --help` and `doctor` never pay for it.
+    import runpy
+
+    # An entry may fix some leading arguments, e.g. "batch.py --plan".
+    script, *fixed_args = COMMANDS[name][0].split()
+    script_path = os.path.join(SCRIPTS_DIR, script)
+    sys.argv = [script_path] + fixed_args + list(args)
+    sys.path.insert(0, os.path.dirname(script_path))
+    runpy.run_path(script_path, run_name="__main__")
+
+
+def doctor():
+    """Reports the toolchain, using the cached probe results where possible."""
+    sys.path.insert(0, SCRIPTS_DIR)
+    from common import toolchain
+
+    ok = True
+    for binary in TOOLCHAIN:
+        info = toolchain.probe(binary)
+        if info is None:
+            print(f"❌ {binary:<11} not found")
+            ok = False
+        else:
+            print(f"✅ {binary:<11} {info['version']}")
+            print(f"   {'':<11} {info['path']}")
+
+    from common import pandoc_server
+
+    if pandoc_server.available():
+        print(f"✅ pandoc server at {pandoc_server.SERVER_URL}")
+    else:
+        print(f"ℹ️  no pandoc server at {pandoc_server.SERVER_URL}; conversions run pandoc directly")
+
+    from common import workspace
+
+    root = workspace.scratch_root()
+    kind = "RAM" if root == workspace.RAM_DIR else "disk"
+    print(f"ℹ️  build workspaces in {root} ({kind}, {workspace.BUDGET_MB} MB budget per job)")
+
+    from common import limits
+
+    configured = limits.current()
+    print(
+        "ℹ️  tool limits: "
+        f"{f'{configured.timeout}s' if configured.timeout else 'no'} timeout, "
+        f"{f'{configured.cpu_seconds}s' if configured.cpu_seconds else 'no'} CPU limit, "
+        f"{f'{configured.memory_mb} MB' if configured.memory_mb else 'no'} memory cap per run"
+    )
+    return 0 if ok else 1
+
+
+def main(argv=None):
+    command_help = "\n".join(
+        f"  {name:<14} {description}" for name, (_, description) in COMMANDS.items()
+    )
+    parser = argparse.ArgumentParser(
+        prog="scriptorium",
+        description="Silsilah Sacra Scriptorium publishing tools.",
+        formatter_class=argparse.RawTextHelpFormatter,
+        epilog=f"Commands:\n{command_help}\n"
+        f"  {'doctor':<14} Check that the external toolchain is installed.\n\n"
+        "Run 'scriptorium <command> --help' for the options of each command.",
+    )
+    parser.add_argument(
+        "command", choices=sorted(list(COMMANDS) + ["doctor"]), metavar="command"
+    )
+    parser.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.command == "doctor":
+        return doctor()
+
+    if args.command in BUILD_COMMANDS:
+        sys.path.insert(0, SCRIPTS_DIR)
+        from common import history
+
+        return history.run_recorded(
+            args.command, args.args, lambda: run_script(args.command, args.args)
+        )
+
+    run_script(args.command, args.args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
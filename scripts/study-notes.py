@@ -1,14 +1,20 @@
+import argparse
 import os
+import sys
 import glob
 import subprocess
 import yaml  # You must run 'pip install PyYAML' for this to work
 from datetime import date, datetime  # To get and format dates
 
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import draft, fonts, images, latex, limits, lint, obsidian, profiling, renderer, reproducible, workspace
+from common.arabic import Normalizer
+
 # --- CONFIGURATION ---
 # The folder where your Markdown notes are stored.
 NOTES_FOLDER_PATH = "/Users/viz1er/Codebase/obsidian-vault/02 Literature Notes/SeekersGuidance/Islamic Studies/Level 2/Shurunbulali’s Nur al-Idah Explained"
 
-# The temporary name for the combined Markdown file.
+# The name of the combined Markdown file, in the build's scratch workspace.
 COMBINED_FILENAME = "combined.md"
 
 # The name for the final PDF output file.
@@ -16,14 +22,33 @@ PDF_FILENAME = "combined.pdf"
 # --- END CONFIGURATION ---
 
 
-def combine_and_convert():
+def combine_and_convert(
+    notes_folder_path=NOTES_FOLDER_PATH,
+    reproducible_build=False,
+    draft_mode=False,
+    chapters=None,
+    pages=None,
+    profile=False,
+    reuse_toc=True,
+    arabic_renderer=None,
+    lint_notes=False,
+):
     """
     Finds a '00' overview file, uses its metadata to build a rich title page
     and table of contents with custom headers/footers, and combines all notes into a single PDF.
-    Includes fallback logic for fonts.
+    Includes fallback logic for fonts. In draft mode (see common/draft.py) only
+    the selected lessons and pages are built, in one pass, to 'combined-draft.pdf'.
+    With `profile`, every page and font load is timed and reported by lesson.
+    Unless `reuse_toc` is off, LaTeX starts from the table of contents of the
+    last build, so an unchanged one needs a single pass (common/toc.py).
+    `arabic_renderer` ("node" or "harfbuzz") picks luaotfload's shaper for
+    the main font, which sets the Arabic too. With `lint_notes` (or
+    SCRIPTORIUM_LINT), the overview and lessons are checked first and the
+    build stops on content that would break it (common/lint.py).
     """
+    draft_mode = draft_mode or bool(chapters) or bool(pages)
     # --- Step 1: Find and Parse the Overview Note ---
-    all_md_files = sorted(glob.glob(os.path.join(NOTES_FOLDER_PATH, "*.md")))
+    all_md_files = sorted(glob.glob(os.path.join(notes_folder_path, "*.md")))
     overview_filepath = next(
         (f for f in all_md_files if os.path.basename(f).startswith("00")), None
     )
@@ -32,7 +57,7 @@ def combine_and_convert():
         print(
             "❌ ERROR: Could not find an overview file starting with '00' in the folder."
         )
-        return
+        sys.exit(1)
 
     lesson_files = [
         f
@@ -40,10 +65,23 @@ def combine_and_convert():
         if f != overview_filepath
         and os.path.basename(f) not in [COMBINED_FILENAME, PDF_FILENAME]
     ]
+    try:
+        lesson_files = draft.select_chapters(lesson_files, chapters)
+    except ValueError as e:
+        print(f"❌ ERROR: {e}.")
+        sys.exit(1)
 
     print(f"Found overview file: {os.path.basename(overview_filepath)}")
     print(f"Found {len(lesson_files)} lesson files to combine.")
 
+    if not lint.gate(
+        [overview_filepath] + lesson_files,
+        [notes_folder_path],
+        overviews=[overview_filepath],
+        flag=lint_notes,
+    ):
+        sys.exit(lint.EXIT_CODE)
+
     try:
         with open(overview_filepath, "r", encoding="utf-8") as f:
             content = f.read()
@@ -54,167 +92,293 @@ def combine_and_convert():
             )
         metadata = yaml.safe_load(parts[1])
         overview_content = parts[2]
+        # Line numbers in error reports count from the top of the file.
+        overview_first_line = content[: len(content) - len(overview_content)].count("\n") + 1
     except Exception as e:
         print(f"❌ ERROR: Failed to parse or read the overview file. Details: {e}")
-        return
+        sys.exit(1)
 
     # --- Step 2: Combine Files with Dynamic Metadata ---
-    combined_md_filepath = os.path.join(NOTES_FOLDER_PATH, COMBINED_FILENAME)
-
-    with open(combined_md_filepath, "w", encoding="utf-8") as outfile:
-        # FONT CONFIGURATION
-        preferred_font = "Amiri"
-        fallback_font = "Times New Roman"
-
-        # Date formatting
-        today_date = date.today().strftime("%B %d, %Y")
-        created_date_str = str(metadata.get("created", ""))
-        try:
-            parsed_date = datetime.strptime(created_date_str, "%Y-%m-%d")
-            formatted_created_date = parsed_date.strftime("%B %d, %Y")
-        except ValueError:
-            formatted_created_date = created_date_str
-
-        # Metadata block setup
-        author_block = (
-            f"Instructor: {metadata.get('instructor', 'N/A')} \\\\ \n"
-            f"Institute: {metadata.get('institute', 'N/A')}"
-        )
-        matn_italicized = f"\\textit{{{metadata.get('matn', 'N/A')}}}"
-        subtitle_block = (
-            f"Based on {matn_italicized} by {metadata.get('author', 'N/A')}"
-        )
-        date_block = (
-            f"Created: {formatted_created_date} \\\\ \n" f"Updated: {today_date}"
-        )
-
-        header_footer_config = [
-            r"\usepackage{parskip}",
-            r"\usepackage{fancyhdr}",
-            r"\usepackage{titlesec}",
-            r"\titleformat{\section}{\normalfont\Large\bfseries\centering}{}{0em}{}",
-            r"\pagestyle{fancy}",
-            r"\fancyhf{}",
-            r"\fancyhead[C]{\textit{\leftmark}}",
-            r"\fancyfoot[C]{\thepage}",
-            r"\renewcommand{\headrulewidth}{0pt}",
-            r"\renewcommand{\footrulewidth}{0pt}",
-            r"\renewcommand{\sectionmark}[1]{\markboth{#1}{}}",
-        ]
-
-        final_metadata = {
-            "title": metadata.get("course_name", "Untitled Course"),
-            "subtitle": subtitle_block,
-            "author": author_block,
-            "date": date_block,
-            "toc": True,
-            "toc-depth": 3,
-            "mainfont": preferred_font,  # Set the preferred font
-            "geometry": "margin=1in",
-            "fontsize": "12pt",
-            "header-includes": header_footer_config,
-        }
-
-        outfile.write("---\n")
-        yaml.dump(
-            final_metadata,
-            outfile,
-            sort_keys=False,
-            default_flow_style=False,
-            allow_unicode=True,
-        )
-        outfile.write("---\n\n")
-
-        print("✅ Successfully created metadata for the document.")
-
-        outfile.write(overview_content)
-        outfile.write("\n\n\\newpage\n\n")
+    # Resolves [[wikilinks]], ![[embeds]] and callouts against the whole vault.
+    resolver = obsidian.resolver_for(notes_folder_path)
+    # Presentation forms, tatweel and stray joiners only slow LuaLaTeX down.
+    normalizer = Normalizer()
+    # The combined file and LaTeX's intermediates stay in a private scratch
+    # workspace (in RAM where there is room), not in the vault, so builds of
+    # the same course never collide. Only the PDF is moved out.
+    course_folder = os.path.basename(os.path.normpath(notes_folder_path))
+    with workspace.Workspace(course_folder) as job_workspace:
+        combined_md_filepath = job_workspace.file(COMBINED_FILENAME)
+
+        with open(combined_md_filepath, "w", encoding="utf-8") as outfile:
+            # FONT CONFIGURATION
+            preferred_font = "Amiri"
+            fallback_font = "Times New Roman"
+
+            # Date formatting
+            # In reproducible mode "Updated" is pinned to the sources, not today.
+            source_files = [overview_filepath] + lesson_files
+            if reproducible.enabled(reproducible_build):
+                today_date = reproducible.build_date(source_files).strftime("%B %d, %Y")
+            else:
+                today_date = date.today().strftime("%B %d, %Y")
+            created_date_str = str(metadata.get("created", ""))
+            try:
+                parsed_date = datetime.strptime(created_date_str, "%Y-%m-%d")
+                formatted_created_date = parsed_date.strftime("%B %d, %Y")
+            except ValueError:
+                formatted_created_date = created_date_str
+
+            # Metadata block setup
+            author_block = (
+                f"Instructor: {metadata.get('instructor', 'N/A')} \\\\ \n"
+                f"Institute: {metadata.get('institute', 'N/A')}"
+            )
+            matn_italicized = f"\\textit{{{metadata.get('matn', 'N/A')}}}"
+            subtitle_block = (
+                f"Based on {matn_italicized} by {metadata.get('author', 'N/A')}"
+            )
+            date_block = (
+                f"Created: {formatted_created_date} \\\\ \n" f"Updated: {today_date}"
+            )
 
-        for filepath in lesson_files:
-            filename = os.path.basename(filepath)
-            title = os.path.splitext(filename)[0]
-            outfile.write(f"# {title}\n\n")
-            with open(filepath, "r", encoding="utf-8") as infile:
-                outfile.write(infile.read())
+            header_footer_config = [
+                r"\usepackage{parskip}",
+                r"\usepackage{fancyhdr}",
+                r"\usepackage{titlesec}",
+                r"\titleformat{\section}{\normalfont\Large\bfseries\centering}{}{0em}{}",
+                r"\pagestyle{fancy}",
+                r"\fancyhf{}",
+                r"\fancyhead[C]{\textit{\leftmark}}",
+                r"\fancyfoot[C]{\thepage}",
+                r"\renewcommand{\headrulewidth}{0pt}",
+                r"\renewcommand{\footrulewidth}{0pt}",
+                r"\renewcommand{\sectionmark}[1]{\markboth{#1}{}}",
+            ]
+            if reproducible.enabled(reproducible_build):
+                header_footer_config.append(reproducible.latex_header(source_files))
+            if draft_mode:
+                header_footer_config.append(draft.latex_header(pages))
+
+            final_metadata = {
+                "title": metadata.get("course_name", "Untitled Course"),
+                "subtitle": subtitle_block,
+                "author": author_block,
+                "date": date_block,
+                "toc": True,
+                "toc-depth": 3,
+                "mainfont": preferred_font,  # Set the preferred font
+                "geometry": "margin=1in",
+                "fontsize": "12pt",
+                "header-includes": header_footer_config,
+            }
+            if arabic_renderer:
+                final_metadata["mainfontoptions"] = renderer.with_renderer("", arabic_renderer)
+            if draft_mode:
+                # No contents page in a preview: it needs a second pass to fill in.
+                final_metadata["toc"] = False
+                final_metadata["classoption"] = "draft"
+
+            outfile.write("---\n")
+            yaml.dump(
+                final_metadata,
+                outfile,
+                sort_keys=False,
+                default_flow_style=False,
+                allow_unicode=True,
+            )
+            outfile.write("---\n\n")
+
+            print("✅ Successfully created metadata for the document.")
+
+            # Markers let LaTeX errors be traced back to the note and line.
+            outfile.write(
+                normalizer.normalize(
+                    resolver.resolve(
+                        latex.mark_sources(
+                            overview_content,
+                            os.path.basename(overview_filepath),
+                            first_line=overview_first_line,
+                        )
+                    )
+                )
+            )
             outfile.write("\n\n\\newpage\n\n")
 
-    print("✅ Successfully combined all notes.")
-
-    # --- Step 3: Convert to PDF with Fallback Logic ---
-    pdf_filepath = os.path.join(NOTES_FOLDER_PATH, PDF_FILENAME)
-    print(
-        f"\nConverting '{COMBINED_FILENAME}' to '{PDF_FILENAME}' (Attempt 1: {preferred_font})..."
-    )
-
-    pandoc_command = [
-        "pandoc",
-        combined_md_filepath,
-        "-o",
-        pdf_filepath,
-        "--pdf-engine=lualatex",
-    ]
-
-    try:
-        # First attempt with the preferred font
-        subprocess.run(pandoc_command, check=True, capture_output=True, text=True)
+            for filepath in lesson_files:
+                filename = os.path.basename(filepath)
+                title = os.path.splitext(filename)[0]
+                outfile.write(f"# {title}\n\n")
+                with open(filepath, "r", encoding="utf-8") as infile:
+                    content = resolver.resolve(latex.mark_sources(infile.read(), filename))
+                outfile.write(normalizer.normalize(content))
+                outfile.write("\n\n\\newpage\n\n")
+
+        for warning in resolver.warnings:
+            print(f"⚠️  WARNING: {warning}")
+        if normalizer.summary():
+            print(f"♻️  {normalizer.summary()}")
+        print("✅ Successfully combined all notes.")
+
+        # Report characters the main font cannot display before compiling.
+        with open(combined_md_filepath, "r", encoding="utf-8") as f:
+            fonts.preflight(f.read(), preferred_font)
+
+        # --- Step 3: Convert to PDF with Fallback Logic ---
+        # Unlike the other builders, the PDF stays next to the notes rather
+        # than in published/: it is read from the vault alongside them, and
+        # every course would otherwise publish the same 'combined.pdf'.
+        pdf_filepath = os.path.join(notes_folder_path, PDF_FILENAME)
+        if draft_mode:
+            pdf_filepath = draft.output_name(pdf_filepath)
         print(
-            f"✅ Successfully created PDF file with '{preferred_font}' at: {pdf_filepath}"
+            f"\nConverting '{COMBINED_FILENAME}' to '{os.path.basename(pdf_filepath)}' (Attempt 1: {preferred_font})..."
         )
 
-    except subprocess.CalledProcessError as e:
-        # Check if the error is due to a missing font
-        if 'fontspec error: "font-not-found"' in e.stderr:
-            print(
-                f"⚠️  WARNING: Font '{preferred_font}' not found. Falling back to '{fallback_font}'."
+        pandoc_command = [
+            "pandoc",
+            combined_md_filepath,
+            "--to",
+            "latex",
+            "--standalone",
+        ]
+        # Images go in as cached derivatives sized for print (common/images.py).
+        pandoc_command.extend(images.pandoc_args([notes_folder_path]))
+
+        # Pins the PDF dates in reproducible mode; None inherits the environment.
+        env = None
+        if reproducible.enabled(reproducible_build):
+            env = reproducible.environment([overview_filepath] + lesson_files)
+        env = job_workspace.environment(env)
+        course_profile = profiling.Profile(course_folder) if profile else None
+
+        def convert_to_pdf():
+            # Pandoc only writes the LaTeX; latex.compile_pdf() runs LuaLaTeX,
+            # stopping at the first error and tracing it back to the note.
+            result = limits.run(
+                pandoc_command, check=True, capture_output=True, text=True, env=env
+            )
+            latex.compile_pdf(
+                result.stdout,
+                pdf_filepath,
+                resource_dirs=[notes_folder_path],
+                env=env,
+                max_runs=1 if draft_mode else 3,
+                workspace=job_workspace,
+                profile=course_profile,
+                reuse_toc=reuse_toc,
             )
 
-            with open(combined_md_filepath, "r", encoding="utf-8") as f:
-                content = f.read()
+        def print_error_log(error):
+            if isinstance(error, latex.EngineError):
+                latex.report(error)
+            else:
+                print(
+                    "\n--- LaTeX Error Log ---\n" + error.stderr + "\n-----------------------"
+                )
 
-            # Replace the font and write back to the file
-            modified_content = content.replace(
-                f"mainfont: {preferred_font}", f"mainfont: '{fallback_font}'"
+        try:
+            # First attempt with the preferred font
+            convert_to_pdf()
+            print(
+                f"✅ Successfully created PDF file with '{preferred_font}' at: {pdf_filepath}"
             )
-            with open(combined_md_filepath, "w", encoding="utf-8") as f:
-                f.write(modified_content)
+            if course_profile:
+                profiling.report(course_profile)
 
-            print(f"\nRetrying conversion (Attempt 2: {fallback_font})...")
+        except limits.ResourceLimitError as e:
+            limits.report(e)
+            sys.exit(limits.EXIT_CODE)
 
-            try:
-                # Second attempt with the fallback font
-                subprocess.run(
-                    pandoc_command, check=True, capture_output=True, text=True
-                )
-                print(
-                    f"✅ Successfully created PDF file with fallback font at: {pdf_filepath}"
-                )
-            except subprocess.CalledProcessError as e2:
+        except subprocess.CalledProcessError as e:
+            # Check if the error is due to a missing font
+            if latex.font_not_found(e.stderr):
                 print(
-                    f"❌ ERROR: Pandoc failed even with the fallback font. Error: {e2}"
+                    f"⚠️  WARNING: Font '{preferred_font}' not found. Falling back to '{fallback_font}'."
                 )
-                print(
-                    "\n--- LaTeX Error Log ---\n"
-                    + e2.stderr
-                    + "\n-----------------------"
+
+                with open(combined_md_filepath, "r", encoding="utf-8") as f:
+                    content = f.read()
+
+                # Replace the font and write back to the file
+                modified_content = content.replace(
+                    f"mainfont: {preferred_font}", f"mainfont: '{fallback_font}'"
                 )
-        else:
-            # The error was not about a missing font
-            print(f"❌ ERROR: Pandoc failed to convert the file. Error: {e}")
+                with open(combined_md_filepath, "w", encoding="utf-8") as f:
+                    f.write(modified_content)
+
+                print(f"\nRetrying conversion (Attempt 2: {fallback_font})...")
+
+                try:
+                    # Second attempt with the fallback font
+                    convert_to_pdf()
+                    print(
+                        f"✅ Successfully created PDF file with fallback font at: {pdf_filepath}"
+                    )
+                    if course_profile:
+                        profiling.report(course_profile)
+                except limits.ResourceLimitError as e2:
+                    limits.report(e2)
+                    sys.exit(limits.EXIT_CODE)
+                except subprocess.CalledProcessError as e2:
+                    print(
+                        f"❌ ERROR: Pandoc failed even with the fallback font. Error: {e2}"
+                    )
+                    print_error_log(e2)
+                    sys.exit(1)
+            else:
+                # The error was not about a missing font
+                print(f"❌ ERROR: Pandoc failed to convert the file. Error: {e}")
+                print_error_log(e)
+                sys.exit(1)
+
+        except FileNotFoundError:
             print(
-                "\n--- LaTeX Error Log ---\n" + e.stderr + "\n-----------------------"
+                "❌ ERROR: Pandoc/LaTeX not found. Ensure they are installed and in your system's PATH."
             )
-
-    except FileNotFoundError:
-        print(
-            "❌ ERROR: Pandoc/LaTeX not found. Ensure they are installed and in your system's PATH."
-        )
-
-    # --- Step 4: Clean up the temporary file ---
-    finally:
-        if os.path.exists(combined_md_filepath):
-            os.remove(combined_md_filepath)
-            print(f"\nCleaned up temporary file: {combined_md_filepath}")
+            sys.exit(1)
 
 
 if __name__ == "__main__":
-    combine_and_convert()
+    parser = argparse.ArgumentParser(
+        description="Combine a course folder of notes into a single study-notes PDF."
+    )
+    parser.add_argument(
+        "notes_folder",
+        nargs="?",
+        default=NOTES_FOLDER_PATH,
+        help="The folder containing the '00' overview and lesson notes. "
+        "Default: the configured NOTES_FOLDER_PATH.",
+    )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Pin dates and PDF metadata so identical sources give identical PDF bytes. "
+        "Also enabled when SOURCE_DATE_EPOCH is set.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Time every page and font load and report them by lesson. "
+        "The full records are saved in build/profiles/.",
+    )
+    renderer.add_argument(parser)
+    parser.add_argument(
+        "--fresh-toc",
+        action="store_true",
+        help="Build the table of contents from scratch instead of starting from the last build's.",
+    )
+    lint.add_argument(parser)
+    draft.add_arguments(parser)
+    args = parser.parse_args()
+    combine_and_convert(
+        args.notes_folder,
+        args.reproducible,
+        draft_mode=args.draft,
+        chapters=args.chapters,
+        pages=args.pages,
+        profile=args.profile,
+        reuse_toc=not args.fresh_toc,
+        arabic_renderer=args.renderer,
+        lint_notes=args.lint,
+    )
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Renders a course folder of notes (the same folder study-notes.py turns into
+a PDF) into a static HTML site: one page per lesson, an index page made
+from the '00' overview with the list of lessons, and previous/next links.
+
+Builds are incremental. Each page is keyed by a hash of its resolved source
+(embeds included), its place in the navigation, the CSS and the template,
+and only pages whose key changed are converted again. The conversions run
+in parallel, through a `pandoc server` when one is running (see
+common/pandoc_server.py).
+
+The site folder is self-contained and ready to serve: the stylesheet and
+the images (as cached screen-sized derivatives) are copied into it.
+
+How to run this script:
+  python3 scripts/study-site.py "path/to/course folder"
+  python3 scripts/study-site.py "path/to/course folder" -o ~/Sites/nur-al-idah --jobs 8
+  python3 -m http.server --directory "published/sites/nur-al-idah"
+"""
+
+import argparse
+import glob
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import sys
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml  # You must run 'pip install PyYAML' for this to work
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import BUILD_DIR, OUTPUT_DIR, REPO_ROOT, TEMPLATES_DIR, obsidian, pandoc_server
+from common.arabic import Normalizer
+
+# --- CONFIGURATION ---
+CSS_PATH = os.path.join(REPO_ROOT, "styles", "study-notes.css")
+TEMPLATE_PATH = os.path.join(TEMPLATES_DIR, "html", "site.html")
+
+# Arabic is normalized and tagged (<span lang="ar">) as in the PDFs, and
+# images are swapped for screen-sized derivatives.
+FILTER_NAMES = ["normalize-arabic", "autotag-arabic", "image-derivatives"]
+
+# Bump when the page layout changes in a way the hashed inputs do not show.
+SITE_VERSION = 1
+
+# Files study-notes.py leaves in the folder, which are not lessons.
+SKIPPED_FILES = {"combined.md"}
+# --- END CONFIGURATION ---
+
+# `src="/absolute/path"` in the converted HTML: images to copy into the site.
+SRC_REGEX = re.compile(r'(<img\b[^>]*?\bsrc=")([^"]+)(")')
+
+
+def slugify(name):
+    """'03 Ṭahāra Part 1' -> '03-tahara-part-1': plain ASCII, safe in any URL."""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    slug = re.sub(r"[^a-z0-9]+", "-", ascii_name.lower()).strip("-")
+    # Titles in Arabic only have no ASCII left; name them by their hash.
+    return slug or "page-" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+
+
+def read_overview(path):
+    """Returns (metadata, body) of the overview note."""
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    parts = content.split("---", 2)
+    if content.startswith("---") and len(parts) == 3:
+        return yaml.safe_load(parts[1]) or {}, parts[2]
+    return {}, content
+
+
+def find_pages(notes_folder):
+    """Returns the index page and the lesson pages, in reading order."""
+    all_md_files = sorted(glob.glob(os.path.join(notes_folder, "*.md")))
+    overview = next((f for f in all_md_files if os.path.basename(f).startswith("00")), None)
+    lessons = [
+        f for f in all_md_files if f != overview and os.path.basename(f) not in SKIPPED_FILES
+    ]
+    metadata, overview_body = read_overview(overview) if overview else ({}, "")
+    course = str(metadata.get("course_name") or os.path.basename(os.path.normpath(notes_folder)))
+
+    pages = [{"source": overview, "title": course, "file": "index.html", "text": overview_body}]
+    used = {"index"}
+    for path in lessons:
+        title = os.path.splitext(os.path.basename(path))[0]
+        slug = slugify(title)
+        while slug in used:
+            slug += "-2"
+        used.add(slug)
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        pages.append({"source": path, "title": title, "file": f"{slug}.html", "text": text})
+    return course, pages
+
+
+def navigation(pages, index):
+    """The previous/next links of a page, and the lesson list on the index."""
+    parts = []
+    if index == 0:
+        items = "".join(
+            f'<li><a href="{p["file"]}">{html.escape(p["title"])}</a></li>' for p in pages[1:]
+        )
+        parts.append(f'<ol class="site-lessons">{items}</ol>')
+    previous_page = pages[index - 1] if index > 0 else None
+    next_page = pages[index + 1] if index + 1 < len(pages) else None
+    links = [
+        f'<a rel="prev" href="{previous_page["file"]}">← {html.escape(previous_page["title"])}</a>'
+        if previous_page
+        else "<span></span>",
+        f'<a rel="next" href="{next_page["file"]}">{html.escape(next_page["title"])} →</a>'
+        if next_page
+        else "<span></span>",
+    ]
+    parts.append(f'<nav class="site-nav">{"".join(links)}</nav>')
+    return "\n".join(parts)
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def copy_images(page_html, site_dir):
+    """Copies the images a page uses into images/ and points the page at them."""
+    images_dir = os.path.join(site_dir, "images")
+
+    def replace(match):
+        path = html.unescape(match.group(2))
+        if not os.path.isabs(path) or not os.path.isfile(path):
+            return match.group(0)
+        name = file_hash(path)[:16] + os.path.splitext(path)[1].lower()
+        target = os.path.join(images_dir, name)
+        if not os.path.exists(target):
+            os.makedirs(images_dir, exist_ok=True)
+            tmp_target = f"{target}.{os.getpid()}.tmp"
+            shutil.copyfile(path, tmp_target)
+            os.replace(tmp_target, target)
+        return f"{match.group(1)}images/{name}{match.group(3)}"
+
+    return SRC_REGEX.sub(replace, page_html)
+
+
+def render_page(page, notes_folder, site_dir):
+    """Converts one page and writes it to the site. Returns its file name."""
+    page_html = pandoc_server.convert(
+        page["markdown"],
+        to_format="html5",
+        standalone=True,
+        template_path=TEMPLATE_PATH,
+        variables=page["variables"],
+        filters=FILTER_NAMES,
+        metadata={"image-search-path": notes_folder, "image-profile": "screen"},
+    )
+    page_html = copy_images(page_html, site_dir)
+    target = os.path.join(site_dir, page["file"])
+    tmp_target = f"{target}.{os.getpid()}.tmp"
+    with open(tmp_target, "w", encoding="utf-8") as f:
+        f.write(page_html)
+    os.replace(tmp_target, target)
+    return page["file"]
+
+
+def build_site(notes_folder, site_dir, jobs, force=False):
+    if not os.path.isdir(notes_folder):
+        print(f"❌ ERROR: Notes folder not found: '{notes_folder}'")
+        return 1
+    course, pages = find_pages(notes_folder)
+    print(f"🔎 Found {len(pages) - 1} lessons for '{course}'")
+
+    os.makedirs(site_dir, exist_ok=True)
+    manifest_path = os.path.join(
+        BUILD_DIR,
+        "sites",
+        hashlib.sha1(os.path.abspath(site_dir).encode("utf-8")).hexdigest()[:16] + ".json",
+    )
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    # The stylesheet is named by its hash, so browsers never keep a stale one.
+    css_hash = file_hash(CSS_PATH)
+    css_name = f"study-notes-{css_hash[:12]}.css"
+    if not os.path.exists(os.path.join(site_dir, css_name)):
+        shutil.copyfile(CSS_PATH, os.path.join(site_dir, css_name))
+    shared_key = f"{SITE_VERSION}:{css_hash}:{file_hash(TEMPLATE_PATH)}"
+
+    # Resolving is cheap and memoised, and it has to happen anyway to see
+    # whether an embedded note changed, so every page is resolved here.
+    resolver = obsidian.resolver_for(notes_folder)
+    normalizer = Normalizer()
+    stale = []
+    for index, page in enumerate(pages):
+        page["markdown"] = normalizer.normalize(resolver.resolve(page["text"]))
+        page["variables"] = {
+            "course": html.escape(course),
+            "page-title": html.escape(page["title"]),
+            "css": css_name,
+            "nav": navigation(pages, index),
+        }
+        key = hashlib.sha256(
+            json.dumps([shared_key, page["markdown"], page["variables"]]).encode("utf-8")
+        ).hexdigest()
+        page["key"] = key
+        if manifest.get(page["file"]) != key or not os.path.exists(
+            os.path.join(site_dir, page["file"])
+        ):
+            stale.append(page)
+    for warning in resolver.warnings:
+        print(f"⚠️  WARNING: {warning}")
+    if normalizer.summary():
+        print(f"♻️  {normalizer.summary()}")
+
+    started = time.time()
+    if stale:
+        if pandoc_server.available():
+            print(f"Using pandoc server at {pandoc_server.SERVER_URL}")
+        print(f"🚀 Rendering {len(stale)} of {len(pages)} pages with {jobs} workers...")
+        failed = 0
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = {
+                executor.submit(render_page, page, notes_folder, site_dir): page for page in stale
+            }
+            for future, page in futures.items():
+                try:
+                    future.result()
+                    manifest[page["file"]] = page["key"]
+                except FileNotFoundError:
+                    print("❌ ERROR: Pandoc not found. Ensure it is installed and in your PATH.")
+                    return 1
+                except pandoc_server.PandocError as e:
+                    failed += 1
+                    manifest.pop(page["file"], None)
+                    print(f"❌ ERROR: Could not convert '{page['file']}': {e}")
+        if failed:
+            print(f"🔴 {failed} page(s) failed; the rest of the site is up to date.")
+    else:
+        print("✅ Every page is up to date.")
+
+    # Pages (and stylesheets) that no longer belong to the course.
+    current = {page["file"] for page in pages}
+    for name in os.listdir(site_dir):
+        removable = (name.endswith(".html") and name not in current) or (
+            name.startswith("study-notes-") and name.endswith(".css") and name != css_name
+        )
+        if removable:
+            os.remove(os.path.join(site_dir, name))
+            manifest.pop(name, None)
+
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({name: manifest[name] for name in sorted(manifest) if name in current}, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    if stale:
+        print(f"✅ Rendered {len(stale)} page(s) in {time.time() - started:.1f}s")
+    print(f"🌐 Site ready at: {site_dir}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render a course folder of notes as a static HTML site, incrementally.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("notes_folder", help="The folder with the '00' overview and lesson notes.")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="The site folder. Default: published/sites/<folder name>.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Pages converted at once. Default: the number of CPUs.",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Render every page, even the unchanged ones."
+    )
+    args = parser.parse_args()
+
+    notes_folder = os.path.abspath(args.notes_folder)
+    site_dir = args.output or os.path.join(
+        OUTPUT_DIR, "sites", slugify(os.path.basename(os.path.normpath(notes_folder)))
+    )
+    return build_site(notes_folder, site_dir, max(1, args.jobs), args.force)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
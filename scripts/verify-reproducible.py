@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checks that a build is reproducible: runs the same scriptorium build twice in
+reproducible mode and asserts that both runs produce byte-identical output.
+The builds write to scratch copies of published/, so the published file
+itself is never touched.
+
+How to run this script:
+  python3 scripts/verify-reproducible.py "published/Yasin_Tafsir.pdf" -- tafsir ~/Documents/Yasin_Tafsir
+  python3 scripts/verify-reproducible.py combined.pdf -- study-notes "path/to/course"
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import OUTPUT_DIR
+
+SCRIPTORIUM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scriptorium.py")
+
+# The builders that take --reproducible; others get SOURCE_DATE_EPOCH.
+REPRODUCIBLE_COMMANDS = {"build", "publish", "tafsir", "study-notes", "html-pdf"}
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def first_difference(path_a, path_b):
+    """Returns the offset of the first differing byte of two files."""
+    with open(path_a, "rb") as a, open(path_b, "rb") as b:
+        offset = 0
+        while True:
+            chunk_a, chunk_b = a.read(65536), b.read(65536)
+            if chunk_a != chunk_b:
+                for i, (x, y) in enumerate(zip(chunk_a, chunk_b)):
+                    if x != y:
+                        return offset + i
+                return offset + min(len(chunk_a), len(chunk_b))
+            if not chunk_a:
+                return None
+            offset += len(chunk_a)
+
+
+def build_command(build_args):
+    """The scriptorium command line for one reproducible build, and its environment."""
+    env = dict(os.environ)
+    if build_args[0] in REPRODUCIBLE_COMMANDS:
+        return [sys.executable, SCRIPTORIUM, build_args[0], "--reproducible"] + build_args[1:], env
+    # Other commands have no --reproducible; SOURCE_DATE_EPOCH pins their dates.
+    env.setdefault("SOURCE_DATE_EPOCH", str(int(time.time())))
+    return [sys.executable, SCRIPTORIUM] + build_args, env
+
+
+def run_build(build_args, artifact, output_dir, env):
+    """
+    Runs one reproducible build with its output under `output_dir`, and
+    returns the hash of the artifact it produced, or None on failure.
+    """
+    command, _ = build_command(build_args)
+    env = dict(env, SCRIPTORIUM_OUTPUT_DIR=output_dir)
+    result = subprocess.run(command, capture_output=True, text=True, env=env)
+    if result.returncode != 0 or not os.path.exists(artifact):
+        print("❌ Error: The build failed or did not produce the artifact.")
+        print(result.stdout)
+        print(result.stderr)
+        return None
+    return sha256_of(artifact)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build twice in reproducible mode and assert byte-identical output.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("artifact", help="The output file the build produces.")
+    parser.add_argument(
+        "build",
+        nargs=argparse.REMAINDER,
+        help="'--' followed by the scriptorium command and its arguments.",
+    )
+    args = parser.parse_args()
+
+    build_args = args.build[1:] if args.build[:1] == ["--"] else args.build
+    if not build_args:
+        parser.error("missing the scriptorium build command after '--'")
+
+    artifact = os.path.abspath(args.artifact)
+    _, env = build_command(build_args)  # One SOURCE_DATE_EPOCH for both builds.
+    scratch = tempfile.mkdtemp(prefix="verify-")
+    # Builds that write to published/ write to a scratch copy of it instead, so
+    # the published file is never touched. Others (study-notes writes next to
+    # the notes) write in place; the existing file is kept aside meanwhile
+    # and put back afterwards.
+    output_dir = os.path.abspath(OUTPUT_DIR)
+    in_output_dir = artifact.startswith(output_dir + os.sep)
+    backup = os.path.join(scratch, "original")
+    if not in_output_dir and os.path.exists(artifact):
+        shutil.copy2(artifact, backup)
+
+    try:
+        hashes = []
+        for run in (1, 2):
+            print(f"🔄 Build {run} of 2: scriptorium {' '.join(build_args)}")
+            run_output_dir = os.path.join(scratch, f"published-{run}")
+            if in_output_dir:
+                produced = os.path.join(run_output_dir, os.path.relpath(artifact, output_dir))
+            else:
+                produced = artifact
+                if os.path.exists(artifact):
+                    os.remove(artifact)
+            digest = run_build(build_args, produced, run_output_dir, env)
+            if digest is None:
+                return 1
+            if not in_output_dir:
+                shutil.copy2(artifact, os.path.join(scratch, f"build-{run}"))
+                produced = os.path.join(scratch, f"build-{run}")
+            hashes.append((digest, produced))
+
+        (first_hash, first_copy), (second_hash, second_copy) = hashes
+        if first_hash != second_hash:
+            offset = first_difference(first_copy, second_copy)
+            print("❌ Not reproducible: the two builds differ.")
+            print(f"   Build 1: {first_hash} ({os.path.getsize(first_copy)} bytes)")
+            print(f"   Build 2: {second_hash} ({os.path.getsize(second_copy)} bytes)")
+            print(f"   First difference at byte offset {offset}.")
+            return 1
+
+        print(f"✅ Reproducible: both builds are byte-identical.\n   sha256 {first_hash}")
+        return 0
+    finally:
+        if not in_output_dir:
+            if os.path.exists(backup):
+                tmp_path = f"{artifact}.{os.getpid()}.tmp"
+                shutil.copy2(backup, tmp_path)
+                os.replace(tmp_path, artifact)
+            elif os.path.exists(artifact):
+                os.remove(artifact)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Visual regression checks for the published PDFs.
+
+`baseline` records a perceptual hash of every page of every PDF (see
+common/visual.py). After a change to a template, the CSS or a filter,
+rebuild the books and run `check`: it reports only the pages that no longer
+look the same, and the documents whose page count changed.
+
+PDFs whose bytes match the baseline are skipped outright, and page hashes
+are cached by PDF hash. Everything else is rasterized in chunks of pages,
+in parallel across pages and documents.
+
+How to run this script:
+  python3 scripts/visual-regression.py baseline                 # every PDF in published/
+  python3 scripts/visual-regression.py check
+  python3 scripts/visual-regression.py check "published/Hizb al-Bahr.pdf" --workers 8
+  python3 scripts/visual-regression.py baseline --baseline tests/visual-baseline.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import OUTPUT_DIR, toolchain, visual
+
+DEFAULT_BASELINE = os.path.join(visual.CACHE_DIR, "baseline.json")
+
+# Pages per pdftoppm run: enough to amortize its start-up, few enough that a
+# single long book is still spread over every worker.
+CHUNK_PAGES = 16
+
+
+def collect_pdfs(paths):
+    """The PDFs named, or found under the folders named (skipping hidden ones)."""
+    pdfs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                pdfs.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith(".pdf"))
+        elif os.path.isfile(path):
+            pdfs.append(path)
+        else:
+            print(f"⚠️  WARNING: '{path}' not found; skipped.")
+    return pdfs
+
+
+def document_key(path):
+    """Baseline key: the path relative to published/, or as given elsewhere."""
+    path = os.path.abspath(path)
+    output_dir = os.path.abspath(OUTPUT_DIR)
+    if path.startswith(output_dir + os.sep):
+        return os.path.relpath(path, output_dir)
+    return path
+
+
+def page_ranges(count, chunk):
+    return [(first, min(first + chunk - 1, count)) for first in range(1, count + 1, chunk)]
+
+
+def hash_documents(documents, dpi, workers):
+    """
+    Fills in documents[key]["pages"] for every document without them, from
+    the cache or by rasterizing, and caches the new results.
+    """
+    todo = []
+    for key, doc in documents.items():
+        if doc.get("pages") is None:
+            doc["pages"] = visual.cached_hashes(doc["sha256"], dpi)
+        if doc["pages"] is None:
+            todo.append(key)
+    if not todo:
+        return 0
+
+    # All chunks of all documents go into one pool, longest documents first,
+    # so that a 600-page tafsir does not end up running alone at the end.
+    counts = {key: visual.page_count(documents[key]["path"]) for key in todo}
+    chunks = [
+        (key, first, last)
+        for key in sorted(todo, key=lambda k: -counts[k])
+        for first, last in page_ranges(counts[key], CHUNK_PAGES)
+    ]
+    results = {key: {} for key in todo}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            (key, first, executor.submit(visual.hash_pages, documents[key]["path"], first, last, dpi))
+            for key, first, last in chunks
+        ]
+        for key, first, future in futures:
+            results[key][first] = future.result()
+
+    for key in todo:
+        hashes = [h for first in sorted(results[key]) for h in results[key][first]]
+        documents[key]["pages"] = hashes
+        visual.store_hashes(documents[key]["sha256"], dpi, hashes)
+    return sum(counts.values())
+
+
+def format_pages(numbers):
+    """[3, 4, 5, 9] -> '3-5, 9'."""
+    ranges = []
+    for n in numbers:
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def compare(key, old, new, threshold):
+    """Prints how `new` differs from the baseline `old`. Returns True if it does."""
+    changed = [
+        number
+        for number, (a, b) in enumerate(zip(old["pages"], new["pages"]), start=1)
+        if visual.distance(a, b) > threshold
+    ]
+    old_count, new_count = len(old["pages"]), len(new["pages"])
+    if not changed and old_count == new_count:
+        return False
+    print(f"📄 {key}")
+    if changed:
+        worst = max(visual.distance(old["pages"][n - 1], new["pages"][n - 1]) for n in changed)
+        print(f"   ❌ {len(changed)} page(s) differ: {format_pages(changed)} (up to {worst} bits)")
+    if new_count != old_count:
+        print(f"   ❌ {old_count} page(s) in the baseline, {new_count} now")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record or check perceptual page hashes of published PDFs.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("action", choices=["baseline", "check"])
+    parser.add_argument(
+        "paths", nargs="*", help="PDFs or folders of PDFs. Default: the published/ folder."
+    )
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE,
+        help=f"The baseline file. Default: '{os.path.relpath(DEFAULT_BASELINE)}'.",
+    )
+    parser.add_argument(
+        "--dpi",
+        type=int,
+        default=visual.DEFAULT_DPI,
+        help=f"Rasterization resolution. Default: {visual.DEFAULT_DPI}.",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=2,
+        help="Bits (of 256) a page hash may differ by and still count as the same.\n"
+        "Default: 2, which absorbs anti-aliasing noise.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Rasterizing processes. Default: the number of CPUs.",
+    )
+    args = parser.parse_args()
+
+    if toolchain.probe("pdftoppm") is None:
+        print("❌ Error: 'pdftoppm' (poppler-utils) not found in your PATH.")
+        return 1
+
+    pdfs = collect_pdfs(args.paths or [OUTPUT_DIR])
+    if not pdfs:
+        print("❌ Error: No PDFs found.")
+        return 1
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline and any(doc.get("dpi") != args.dpi for doc in baseline.values()):
+            print(f"❌ Error: The baseline was recorded at another resolution than {args.dpi} dpi.")
+            return 1
+
+    started = time.time()
+    documents = {}
+    for path in pdfs:
+        key = document_key(path)
+        documents[key] = {"path": path, "sha256": visual.file_sha256(path), "dpi": args.dpi}
+        old = baseline.get(key)
+        if old and old["sha256"] == documents[key]["sha256"]:
+            # Same bytes, same pages: nothing to rasterize.
+            documents[key]["pages"] = old["pages"]
+
+    rasterized = hash_documents(documents, args.dpi, max(1, args.workers))
+    elapsed = time.time() - started
+    print(
+        f"🔎 {len(documents)} PDF(s), {sum(len(d['pages']) for d in documents.values())} pages; "
+        f"rasterized {rasterized} in {elapsed:.1f}s"
+    )
+
+    if args.action == "baseline":
+        for key, doc in documents.items():
+            baseline[key] = {"sha256": doc["sha256"], "dpi": args.dpi, "pages": doc["pages"]}
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        tmp_path = f"{args.baseline}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, args.baseline)
+        print(f"✅ Baseline for {len(documents)} PDF(s) written to: {args.baseline}")
+        return 0
+
+    differing = 0
+    for key, doc in documents.items():
+        if key not in baseline:
+            print(f"📄 {key}\n   ℹ️  Not in the baseline ({len(doc['pages'])} pages)")
+            continue
+        if baseline[key]["sha256"] != doc["sha256"]:
+            differing += compare(key, baseline[key], doc, args.threshold)
+    if not args.paths:
+        # Only a full check can tell that a book is no longer published.
+        for key in sorted(set(baseline) - set(documents)):
+            print(f"📄 {key}\n   ❌ In the baseline, but no longer published")
+            differing += 1
+    if differing:
+        print(f"🔴 {differing} of {len(documents)} PDF(s) look different from the baseline.")
+        return 1
+    print(f"✅ No visual changes in {len(documents)} PDF(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Shares a batch of builds between several builder processes, on this machine
+or on every machine that mounts the queue folder (see common/job_queue.py).
+
+Jobs are the same lines as in a batch file for scriptorium batch. Each one is
+run through scriptorium as usual, and what it writes to published/ is
+published atomically, stored by content hash, only once the build succeeds.
+A worker that dies mid-build loses its lease, and another worker picks the
+job up again.
+
+How to run this script:
+  python3 scripts/scriptorium.py queue submit nightly.txt --queue /mnt/shared/queue
+  python3 scripts/scriptorium.py queue worker --queue /mnt/shared/queue --processes 4
+  python3 scripts/scriptorium.py queue status --queue /mnt/shared/queue
+  python3 scripts/scriptorium.py queue retry --queue /mnt/shared/queue
+"""
+
+import argparse
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from batch import read_batch
+from common import BUILD_DIR, OUTPUT_DIR, SCRIPTS_DIR, history, job_queue, limits, lint
+
+SCRIPTORIUM = os.path.join(SCRIPTS_DIR, "scriptorium.py")
+DEFAULT_QUEUE = os.environ.get("SCRIPTORIUM_QUEUE_DIR", os.path.join(BUILD_DIR, "queue"))
+
+# Builders that write their PDF to published/; a run that leaves nothing
+# behind failed even if it exited with 0. The others (study-notes writes next
+# to the notes) are judged by their exit code alone, which every builder sets
+# to non-zero on failure.
+PUBLISHING_COMMANDS = {"build", "publish", "tafsir", "anthology"}
+
+# How often an idle worker looks for new jobs (seconds).
+POLL_INTERVAL = 2
+
+
+def submit(queue, args):
+    # Workers may run elsewhere, so paths are made absolute; the queue folder's
+    # filesystem is expected to be mounted at the same place on every host.
+    jobs = [
+        [os.path.abspath(a) if os.path.exists(a) else a for a in job]
+        for job in read_batch(args.batch_file)
+    ]
+    # Longest expected first, as scriptorium batch does, so that the big
+    # books are claimed before the short sheets.
+    with history.connect() as db:
+        estimates = [history.expected_duration(db, job[0], job[1:])[0] for job in jobs]
+    order, _ = history.schedule(estimates, 1)
+    ids = queue.submit([jobs[i] for i in order])
+    print(f"✅ Submitted {len(ids)} jobs to {queue.root}")
+
+
+def run_job(queue, job, worker, heartbeat_interval):
+    """Builds one claimed job. Returns (ok, message, published)."""
+    staging_dir = os.path.join(queue.root, "staging", f"{job['id']}-{worker}")
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    env = dict(os.environ, SCRIPTORIUM_OUTPUT_DIR=staging_dir)
+
+    process = subprocess.Popen(
+        [sys.executable, SCRIPTORIUM] + job["args"],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        start_new_session=True,
+    )
+    try:
+        while True:
+            try:
+                output, _ = process.communicate(timeout=heartbeat_interval)
+                break
+            except subprocess.TimeoutExpired:
+                if not queue.heartbeat(job):
+                    # Someone else owns the job now; stop building it.
+                    os.killpg(process.pid, signal.SIGTERM)
+                    process.communicate()
+                    return None, "lost the lease", []
+
+        if process.returncode == limits.EXIT_CODE:
+            return False, f"stopped by a resource limit\n{output[-2000:]}", []
+        if process.returncode == lint.EXIT_CODE:
+            return False, f"stopped by the lint\n{output[-2000:]}", []
+        if process.returncode != 0:
+            return False, f"exit code {process.returncode}\n{output[-2000:]}", []
+        produced = os.path.isdir(staging_dir) and any(files for _, _, files in os.walk(staging_dir))
+        if not produced:
+            if job["args"][0] in PUBLISHING_COMMANDS:
+                return False, f"the build wrote no output\n{output[-2000:]}", []
+            return True, "succeeded (this builder does not write to published/)", []
+        if not queue.heartbeat(job):
+            return None, "lost the lease", []
+        return True, "succeeded", job_queue.publish(staging_dir, OUTPUT_DIR)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+def work(queue, args):
+    worker = job_queue.worker_id()
+    # Several heartbeats per lease, so one slow write does not lose the job.
+    heartbeat_interval = min(job_queue.HEARTBEAT_INTERVAL, args.lease / 3)
+    built = 0
+    while True:
+        for job_id in queue.reap(worker, args.lease):
+            print(f"♻️  [{worker}] Took back abandoned job {job_id}", flush=True)
+        job = queue.claim(worker)
+        if job is None:
+            if not args.wait and not queue.counts()["running"]:
+                break
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        label = shlex.join(job["args"])
+        print(f"🚀 [{worker}] {label} (attempt {job['attempts']})", flush=True)
+        started = time.time()
+        ok, message, published = run_job(queue, job, worker, heartbeat_interval)
+        duration = time.time() - started
+        if ok and not queue.complete(job, {"duration": duration, "published": published}):
+            # Reaped while finishing: another worker may build it again.
+            ok, message = None, "lost the lease before it could be marked done"
+        if ok:
+            print(f"✅ [{worker}] {label}: {message} in {duration:.1f}s", flush=True)
+            built += 1
+        elif ok is None:
+            print(f"⚠️  [{worker}] {label}: {message}; another worker has it", flush=True)
+        else:
+            state = queue.fail(job, worker, message)
+            if state is None:
+                print(f"⚠️  [{worker}] {label}: failed, but lost the lease; another worker has it", flush=True)
+                continue
+            verdict = "will retry" if state == "pending" else "giving up"
+            print(f"❌ [{worker}] {label}: {message.splitlines()[0]} ({verdict})", flush=True)
+    print(f"🏁 [{worker}] Queue drained; built {built} jobs.", flush=True)
+
+
+def status(queue, args):
+    counts = queue.counts()
+    print(" | ".join(f"{state}: {count}" for state, count in counts.items()))
+    now = time.time()
+    for job in queue.jobs("running"):
+        # A job caught between its claim and the claim's stamp has no times yet.
+        claimed = job.get("claimed")
+        running = f"running {now - claimed:.0f}s" if claimed else "just claimed"
+        heartbeat = job.get("heartbeat")
+        beat = f"last heartbeat {now - heartbeat:.0f}s ago" if heartbeat else "no heartbeat yet"
+        print(f"  🔄 {shlex.join(job['args'])}  on {job.get('worker')}, {running}, {beat}")
+    for job in queue.jobs("failed"):
+        print(f"  ❌ {shlex.join(job['args'])}  ({job['errors'][-1].splitlines()[0]})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Share a batch of builds between builder processes through a queue folder.",
+        formatter_class=argparse.RawTextHelpFormatter,
+    )
+    parser.add_argument("action", choices=["submit", "worker", "status", "retry"])
+    parser.add_argument("batch_file", nargs="?", help="For 'submit': one scriptorium build per line.")
+    parser.add_argument(
+        "--queue",
+        default=DEFAULT_QUEUE,
+        help="The queue folder, on a filesystem every worker can reach.\n"
+        "Default: $SCRIPTORIUM_QUEUE_DIR or build/queue.",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=1, help="For 'worker': worker processes to start here."
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=job_queue.LEASE_SECONDS,
+        help=f"Seconds without a heartbeat before a job is taken back. Default: {job_queue.LEASE_SECONDS}.",
+    )
+    parser.add_argument(
+        "--wait", action="store_true", help="For 'worker': keep polling when the queue is empty."
+    )
+    args = parser.parse_args()
+
+    queue = job_queue.JobQueue(args.queue)
+    if args.action == "submit":
+        if not args.batch_file or not os.path.isfile(args.batch_file):
+            parser.error("submit needs an existing batch file")
+        submit(queue, args)
+    elif args.action == "status":
+        status(queue, args)
+    elif args.action == "retry":
+        print(f"✅ Moved {len(queue.retry_failed())} failed jobs back to pending.")
+    elif args.processes > 1:
+        # Each process is an independent worker, exactly as on another host.
+        command = [sys.executable, os.path.abspath(__file__), "worker", "--queue", queue.root,
+                   "--lease", str(args.lease)] + (["--wait"] if args.wait else [])
+        # Unless configured, each worker's builds get an equal share of the
+        # memory, so one runaway build cannot starve the others.
+        env = dict(os.environ)
+        if "SCRIPTORIUM_MEMORY_MB" not in env and limits.memory_share(args.processes):
+            env["SCRIPTORIUM_MEMORY_MB"] = str(limits.memory_share(args.processes))
+        workers = [subprocess.Popen(command, env=env) for _ in range(args.processes)]
+        return max(p.wait() for p in workers)
+    else:
+        work(queue, args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())